@@ -10,6 +10,7 @@ from app.core import security
 from app.core.config import settings
 from app.models.all_models import User
 from app.schemas.all_schemas import TokenPayload
+from app.services.warmup import warmup
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -20,6 +21,19 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def require_warm() -> None:
+    """
+    Admits a request once startup warm-up is done. During warm-up the request
+    waits up to WARMUP_QUEUE_SECONDS, then gets 503 with Retry-After.
+    """
+    if warmup.ready or warmup.wait(settings.WARMUP_QUEUE_SECONDS):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The assistant is still starting up. Please retry shortly.",
+        headers={"Retry-After": str(settings.WARMUP_RETRY_AFTER_SECONDS)},
+    )
+
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(reusable_oauth2)
@@ -5,6 +5,10 @@ from sqlalchemy import func
 from app.api import deps
 from app.models.all_models import User, ChatLog, EvaluationMetrics
 from app.evaluation.runner import runner
+from app.core.memory import process_memory
+from app.services.retriever import retriever
+from app.services.chat_orchestrator import orchestrator
+from app.services.llm_engine import llm_engine
 
 router = APIRouter()
 
@@ -20,6 +24,22 @@ def trigger_ingestion(
     # Ingestor().process_and_index()
     return {"status": "Ingestion triggered (Mock)"}
 
+@router.post("/reload-index")
+def reload_index(
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Swaps in the latest published vector store version without a restart.
+    In-flight requests finish on the previous version. Only this worker
+    reloads immediately; the others pick it up within VECTOR_STORE_POLL_SECONDS.
+    """
+    reloaded = retriever.reload()
+    return {
+        "status": "reloaded" if reloaded else "unchanged",
+        "index_version": retriever.index_version,
+        "indexed_chunks": retriever.index.ntotal if retriever.index else 0,
+    }
+
 @router.get("/metrics")
 def get_metrics(
     db: Session = Depends(deps.get_db),
@@ -34,6 +54,37 @@ def get_metrics(
         "system_status": "healthy"
     }
 
+@router.get("/retrieval-stats")
+def get_retrieval_stats(
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    In-process retrieval metrics (embedding batch fill, caches, index size,
+    time to first token of streamed answers).
+    """
+    stats = retriever.stats()
+    stats["answer_cache"] = orchestrator.answer_cache.stats() if orchestrator.answer_cache else None
+    stats["reranker"] = orchestrator.reranker.stats() if orchestrator.reranker else None
+    stats["streaming"] = orchestrator.stream_stats()
+    stats["coalescing"] = orchestrator.coalescer.stats() if orchestrator.coalescer else None
+    stats["llm"] = llm_engine.stats()
+    return stats
+
+@router.get("/memory")
+def get_memory_usage(
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Memory of the worker that served this request. With an mmap-loaded index
+    the vectors show up under rss_file_mb (shared) rather than rss_anon_mb.
+    """
+    return {
+        "process": process_memory(),
+        "index_load_mode": retriever.index_load_mode,
+        "index_type": retriever.index_spec.get("type"),
+        "indexed_chunks": retriever.index.ntotal if retriever.index else 0,
+    }
+
 @router.get("/queries")
 def get_recent_queries(
     skip: int = 0,
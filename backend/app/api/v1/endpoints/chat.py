@@ -1,7 +1,13 @@
-from typing import Any
+import json
+import time
+from typing import Any, AsyncIterator, Dict
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.api import deps
+from app.core.logging import logger
+from app.db.session import SessionLocal
 from app.models.all_models import User, ChatLog
 from app.schemas.all_schemas import ChatRequest, ChatResponse
 from app.services.chat_orchestrator import orchestrator
@@ -9,28 +15,36 @@ from app.services.chat_orchestrator import orchestrator
 router = APIRouter()
 
 @router.post("/", response_model=ChatResponse)
-def chat_interaction(
+async def chat_interaction(
     *,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    _: None = Depends(deps.require_warm),
     chat_in: ChatRequest,
 ) -> Any:
     """
-    RAG-enabled chat endpoint.
+    RAG-enabled chat endpoint. Answers 503 (with Retry-After) while the
+    models are still warming up. Runs on the event loop: retrieval goes to
+    the orchestrator's executor and the LLM call is awaited, so waiting on
+    the provider does not occupy a threadpool slot.
     """
     # 1. Process via Orchestrator
-    result = orchestrator.process_query(chat_in.query, chat_in.history)
+    result = await orchestrator.process_query_async(chat_in.query, chat_in.history)
     
-    # 2. Log to DB
+    # 2. Log to DB (blocking driver, so off the event loop)
     chat_log = ChatLog(
         user_id=current_user.id,
         query=chat_in.query,
         response=result["answer"],
         processing_time_ms=result["processing_time"] * 1000
     )
-    db.add(chat_log)
-    db.commit()
-    db.refresh(chat_log)
+
+    def save():
+        db.add(chat_log)
+        db.commit()
+        db.refresh(chat_log)
+
+    await run_in_threadpool(save)
     
     # 3. Return response
     return {
@@ -41,3 +55,77 @@ def chat_interaction(
         "confidence_score": result["confidence_score"],
         "metadata": result["metadata"]
     }
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _save_chat_log(**fields) -> str:
+    # Own session: the request's get_db session may be closed before a streamed body finishes
+    db = SessionLocal()
+    try:
+        chat_log = ChatLog(**fields)
+        db.add(chat_log)
+        db.commit()
+        return chat_log.id
+    finally:
+        db.close()
+
+@router.post("/stream")
+async def chat_stream(
+    *,
+    current_user: User = Depends(deps.get_current_active_user),
+    _: None = Depends(deps.require_warm),
+    chat_in: ChatRequest,
+) -> StreamingResponse:
+    """
+    Streaming variant of the chat endpoint as server-sent events:
+    `meta` (sources, confidence_score, metadata) first, then `token` events
+    ({"text": ...}) as the model produces them, then `done` (conversation_id,
+    processing_time, time_to_first_token) once the ChatLog is written, or
+    `error` if generation fails part-way. Like the chat endpoint, it runs on
+    the event loop and holds no thread while the model streams.
+    """
+    user_id = current_user.id
+
+    async def events() -> AsyncIterator[str]:
+        start_time = time.time()
+        answer, confidence, sources_count = [], 0.0, 0
+        try:
+            async for event, data in orchestrator.stream_query(chat_in.query, chat_in.history):
+                if event == "meta":
+                    confidence, sources_count = data["confidence_score"], len(data["sources"])
+                elif event == "token":
+                    answer.append(data["text"])
+                elif event == "done":
+                    data["conversation_id"] = await run_in_threadpool(
+                        _save_chat_log,
+                        user_id=user_id,
+                        query=chat_in.query,
+                        response=data.pop("answer"),
+                        processing_time_ms=data["processing_time"] * 1000,
+                        confidence_score=confidence,
+                        sources_count=sources_count,
+                    )
+                yield _sse(event, data)
+        except Exception as e:
+            logger.error(f"Streaming chat failed: {e}")
+            await run_in_threadpool(
+                _save_chat_log,
+                user_id=user_id,
+                query=chat_in.query,
+                response="".join(answer),
+                processing_time_ms=(time.time() - start_time) * 1000,
+                confidence_score=confidence,
+                sources_count=sources_count,
+                has_error=True,
+                error_message=str(e),
+            )
+            yield _sse("error", {"detail": "The answer could not be completed. Please try again."})
+
+    # X-Accel-Buffering: keep reverse proxies from holding back the events
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
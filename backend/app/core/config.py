@@ -20,10 +20,106 @@ class Settings(BaseSettings):
     VECTOR_STORE_PATH: str = os.getenv("VECTOR_STORE_PATH", "../vector_store")
     MODEL_PATH: str = os.getenv("MODEL_PATH", "../models/tinyllama.gguf")
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+
+    # "torch" (sentence-transformers) or "onnx": an int8 ONNX Runtime export of
+    # EMBEDDING_MODEL made with `python -m rag.onnx_embedder`; torch is then not imported
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_MODEL_PATH: str = os.getenv("ONNX_MODEL_PATH", "../models/onnx/all-MiniLM-L6-v2")
+    ONNX_THREADS: Optional[int] = None
+
+    # Shared embedding server (python -m app.services.embedding_server): workers
+    # send queries over this Unix socket instead of each loading the model.
+    # Unset = encode in-process; if the server is down, workers fall back to that.
+    EMBEDDING_SERVER_SOCKET: Optional[str] = os.getenv("EMBEDDING_SERVER_SOCKET")
+    EMBEDDING_SERVER_TIMEOUT_SECONDS: float = 10.0
+
+    # Startup warm-up: chat requests arriving before the models are loaded wait
+    # up to WARMUP_QUEUE_SECONDS, then get 503 with Retry-After
+    WARMUP_QUEUE_SECONDS: float = 5.0
+    WARMUP_RETRY_AFTER_SECONDS: int = 10
+
+    # Seconds between checks for a newly published vector store version (0 disables).
+    # Each worker polls on its own, so a re-ingest reaches every worker.
+    VECTOR_STORE_POLL_SECONDS: float = 30.0
+
+    # Load the FAISS index read-only via mmap when supported (shared across workers)
+    INDEX_MMAP: bool = True
+
+    # ANN search-time knobs; unset means use the values saved with the index
+    INDEX_NPROBE: Optional[int] = None
+    INDEX_EF_SEARCH: Optional[int] = None
+    # PQ indexes re-score k * this many candidates with their exact vectors
+    INDEX_RESCORE_FACTOR: Optional[int] = None
+
+    # Hybrid retrieval: BM25 + dense, fused with reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    # BM25-only hits below either floor are dropped (terms common to most chunks score low)
+    HYBRID_MIN_BM25: float = 1.0
+    HYBRID_MIN_BM25_RATIO: float = 0.3
+
+    # Intent-routed category sub-indexes (global index when intent is unclear)
+    INTENT_ROUTING_ENABLED: bool = True
+    INTENT_ROUTING_MIN_CONFIDENCE: float = 0.6
+
+    # Optional cross-encoder rerank of over-fetched candidates
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20
+    RERANK_TOP_K: int = 3
+    RERANK_BUDGET_MS: float = 150.0
+    RERANK_CACHE_SIZE: int = 4096
+
+    # Query embedding micro-batching (concurrent chat requests share one forward pass)
+    EMBED_BATCHING_ENABLED: bool = True
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Query embedding LRU cache (keyed on normalized query text)
+    QUERY_CACHE_SIZE: int = 2048
+    QUERY_CACHE_SPILL_PATH: Optional[str] = os.getenv("QUERY_CACHE_SPILL_PATH")
+
+    # Semantic answer cache (paraphrases of a recent question skip the LLM)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_MAX_DISTANCE: float = 0.05 # cosine distance
+    ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Identical questions in flight at once (normalized text, same index
+    # version) share one retrieval + LLM call instead of each making their own
+    COALESCE_ENABLED: bool = True
     
     # LLM Provider
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "mistral") # mistral or local
     MISTRAL_API_KEY: Optional[str] = os.getenv("MISTRAL_API_KEY")
+    # Prompt packing: tokens reserved for the answer (sent as max_tokens), prompt
+    # cap for cost, and the share conversation history may take
+    LLM_CONTEXT_WINDOW: int = 131072
+    LLM_MAX_NEW_TOKENS: int = 1024
+    LLM_INPUT_TOKEN_BUDGET: Optional[int] = 3000
+    LLM_HISTORY_TOKEN_BUDGET: int = 512
+    # Async chat path: calls in flight per worker (also the keep-alive pool size),
+    # per-attempt timeout, and jittered exponential retry on 429/5xx/timeouts
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_SECONDS: float = 0.5
+    LLM_RETRY_MAX_SECONDS: float = 8.0
+    # Threads for embedding, search and rerank off the event loop; None -> CPU count + 4 (max 32)
+    RETRIEVAL_WORKERS: Optional[int] = None
+    # Exact-match LLM response cache (same model, temperature and rendered prompt).
+    # "memory" is per worker; "sqlite" (a file on this host) and "redis" (any
+    # Redis-protocol store) share hits between workers
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_BACKEND: str = os.getenv("LLM_CACHE_BACKEND", "memory")
+    LLM_CACHE_SIZE: int = 4096
+    LLM_CACHE_TTL_SECONDS: float = 86400.0
+    LLM_CACHE_SQLITE_PATH: str = os.getenv("LLM_CACHE_SQLITE_PATH", "../data/processed/llm_cache.sqlite3")
+    LLM_CACHE_REDIS_URL: Optional[str] = os.getenv("LLM_CACHE_REDIS_URL")
+    # Provider price per 1k tokens, for the cache's cost-saved metric
+    LLM_COST_PER_1K_INPUT_TOKENS: float = 0.002
+    LLM_COST_PER_1K_OUTPUT_TOKENS: float = 0.006
     
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:3000", "*"]
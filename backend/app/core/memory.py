@@ -0,0 +1,40 @@
+import os
+from typing import Dict, Any
+
+_STATUS_FIELDS = {
+    "VmRSS": "rss_mb",
+    "RssAnon": "rss_anon_mb",
+    "RssFile": "rss_file_mb",
+    "RssShmem": "rss_shmem_mb",
+}
+
+
+def process_memory() -> Dict[str, Any]:
+    """
+    Memory usage of the current worker process.
+
+    `rss_anon_mb` is private heap; `rss_file_mb` is file-backed pages such as a
+    memory-mapped index, which are shared with other workers. `pss_mb` splits
+    shared pages evenly between the processes mapping them, so summing it
+    across workers gives the real node footprint. Linux only; other Unix
+    platforms get peak RSS, Windows just the pid.
+    """
+    usage: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in _STATUS_FIELDS:
+                    usage[_STATUS_FIELDS[key]] = round(int(value.split()[0]) / 1024, 1)
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    usage["pss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        try:
+            import resource  # Unix only
+        except ImportError:
+            return usage
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        usage["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return usage
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Modules the backend shares with the ingestion/CLI side (cag/, rag/, llm/ at
+# the project root) are imported from there rather than kept as copies.
+# Importing this module puts the project root on sys.path; the Docker image
+# copies those packages next to `app` and sets PROJECT_ROOT.
+PROJECT_ROOT = os.getenv("PROJECT_ROOT") or os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
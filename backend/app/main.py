@@ -1,4 +1,7 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
@@ -7,6 +10,7 @@ from app.core.logging import setup_logging
 from app.middlewares.request_id import RequestIDMiddleware
 from app.db.base_class import Base
 from app.db.session import engine
+from app.services.warmup import warmup
 
 # Setup Logging
 logger = setup_logging()
@@ -15,9 +19,21 @@ logger = setup_logging()
 # railway run python -c "from app.db.session import engine; from app.db.base_class import Base; Base.metadata.create_all(bind=engine)"
 # Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models and the index load in the background so the port binds right away
+    warmup.start()
+    yield
+    from app.services.llm_engine import llm_engine
+    from app.services.retriever import retriever
+
+    retriever.stop_watcher()
+    await llm_engine.aclose()
+
 app = FastAPI(
     title=settings.PROJECT_NAME, 
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 # Middlewares
@@ -35,4 +51,15 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up (it may still be warming up; see /ready)."""
     return {"status": "ok"}
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness: 200 once chat can be served, else 503 with per-component warm-up state."""
+    status = warmup.status()
+    if status["ready"]:
+        return status
+    return JSONResponse(
+        status_code=503, content=status, headers={"Retry-After": str(settings.WARMUP_RETRY_AFTER_SECONDS)}
+    )
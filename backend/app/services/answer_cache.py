@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers against the query embedding that produced them.
+
+    A lookup hits when a cached query lies within `max_distance` cosine
+    distance of the new one, was stored under the same index version and
+    is younger than `ttl_seconds`. Entries are evicted least-recently-used
+    once `max_size` is reached, and everything is dropped when the index
+    version changes (i.e. the vector store was rebuilt).
+    """
+
+    def __init__(self, max_size: int = 1024, max_distance: float = 0.05, ttl_seconds: float = 3600.0):
+        self.max_size = max(1, max_size)
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None   # (max_size, dim), rows indexed by slot
+        self._occupied = np.zeros(self.max_size, dtype=bool)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._index_version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, query_vector: np.ndarray, index_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        query_vector = np.asarray(query_vector, dtype="float32").reshape(-1)
+        with self._lock:
+            self._check_version(index_version)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query_vector
+            similarities[~self._occupied] = -np.inf
+            slot = int(np.argmax(similarities))
+            if 1.0 - float(similarities[slot]) > self.max_distance:
+                self.misses += 1
+                return None
+
+            entry = self._entries[slot]
+            if time.time() - entry["created_at"] > self.ttl_seconds:
+                self._release(slot)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return {**entry, "similarity": float(similarities[slot])}
+
+    def store(
+        self,
+        query_vector: np.ndarray,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        confidence: float,
+        doc_count: int,
+        index_version: Optional[str],
+    ):
+        query_vector = np.asarray(query_vector, dtype="float32").reshape(-1)
+        with self._lock:
+            self._check_version(index_version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, query_vector.shape[0]), dtype="float32")
+
+            if len(self._entries) >= self.max_size:
+                oldest = next(iter(self._entries))
+                self._release(oldest)
+                self.evictions += 1
+
+            slot = int(np.argmin(self._occupied))
+            self._vectors[slot] = query_vector
+            self._occupied[slot] = True
+            self._entries[slot] = {
+                "answer": answer,
+                "sources": sources,
+                "confidence": confidence,
+                "doc_count": doc_count,
+                "index_version": index_version,
+                "created_at": time.time(),
+            }
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _check_version(self, index_version: Optional[str]):
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+            self._index_version = index_version
+
+    def _clear(self):
+        self._entries.clear()
+        self._occupied[:] = False
+
+    def _release(self, slot: int):
+        del self._entries[slot]
+        self._occupied[slot] = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "max_distance": self.max_distance,
+                "ttl_seconds": self.ttl_seconds,
+                "index_version": self._index_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -1,23 +1,116 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
 import time
 from app.services.retriever import retriever
 from app.services.llm_engine import llm_engine
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.embedding_cache import normalize_query
+from app.services.intent_router import intent_router
+from app.services.reranker import CrossEncoderReranker
+from app.services.single_flight import SingleFlight
+from app.core.config import settings
 from app.core.logging import logger
 
+SYSTEM_PROMPT = "You are a helpful college assistant. Use the provided documents to answer. If the answer is not in the documents, say so. Cite sources using [1] notation."
+
+# Streams kept for the time-to-first-token percentiles
+TTFT_WINDOW = 1000
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
 class ChatOrchestrator:
-    def process_query(self, query: str, history: List[str] = []) -> Dict[str, Any]:
-        start_time = time.time()
+    def __init__(self):
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                max_size=settings.ANSWER_CACHE_SIZE,
+                max_distance=settings.ANSWER_CACHE_MAX_DISTANCE,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            )
+        self.reranker = None
+        self._reranker_loaded = False
+        self.coalescer = SingleFlight() if settings.COALESCE_ENABLED else None
+        self.streams = 0
+        self._ttft = deque(maxlen=TTFT_WINDOW)
+        self._stats_lock = threading.Lock()
+        # Embedding, search and rerank for the async path, kept apart from the
+        # threadpool FastAPI uses for sync endpoints and dependencies
+        self.executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+    def load_reranker(self) -> bool:
+        """Loads the cross-encoder when enabled (once, normally during warm-up)."""
+        if settings.RERANK_ENABLED and not self._reranker_loaded:
+            self._reranker_loaded = True
+            try:
+                self.reranker = CrossEncoderReranker(
+                    settings.RERANK_MODEL,
+                    budget_ms=settings.RERANK_BUDGET_MS,
+                    cache_size=settings.RERANK_CACHE_SIZE,
+                )
+            except Exception as e:
+                logger.error(f"Rerank model unavailable, using vector order: {e}")
+        return self.reranker is not None
+
+    def _prepare(self, query: str, history: List[str], start_time: float) -> Dict[str, Any]:
+        """
+        Everything before generation: answer cache, routed retrieval, rerank,
+        prompt pieces. Returns {"result": ...} when no LLM call is needed.
+        """
+        # 0. Semantic answer cache. Follow-up turns depend on history, so only
+        # standalone questions are served from (and stored in) the cache.
+        # Read the version once: a reload mid-request must not mix versions.
+        index_version = retriever.index_version
+        query_vector = None
+        use_cache = self.answer_cache is not None and not history and retriever.index is not None
+        if use_cache:
+            query_vector = retriever.embed_query(query)
+            cached = self.answer_cache.lookup(query_vector, index_version)
+            if cached:
+                return {"result": {
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "confidence_score": cached["confidence"],
+                    "processing_time": time.time() - start_time,
+                    "metadata": {
+                        "doc_count": cached["doc_count"],
+                        "engine": "semantic_cache",
+                        "cache_similarity": round(cached["similarity"], 4),
+                    }
+                }}
         
-        # 1. Retrieval
-        docs = retriever.search(query)
+        # 1. Retrieval, routed to the intent's category sub-index when the intent is clear
+        self.load_reranker()
+        categories = []
+        if settings.INTENT_ROUTING_ENABLED:
+            intent, intent_confidence = intent_router.classify(query)
+            categories = intent_router.categories(intent, intent_confidence, settings.INTENT_ROUTING_MIN_CONFIDENCE)
+        if self.reranker:
+            # Over-fetch, rescore with the cross-encoder, keep the best few
+            docs = retriever.search(
+                query, query_vector=query_vector, categories=categories, top_k=settings.RERANK_CANDIDATES
+            )
+            docs, reranked = self.reranker.rerank(query, docs, settings.RERANK_TOP_K, index_version)
+            if not reranked:
+                docs = docs[:retriever.top_k]
+        else:
+            docs = retriever.search(query, query_vector=query_vector, categories=categories)
         
-        # 2. Format Docs
-        doc_text = ""
+        # 2. Pack history and docs (rank order) into the prompt's token budget;
+        # sources list exactly the docs the [n] citations refer to
+        packed = llm_engine.pack_context(
+            SYSTEM_PROMPT, query, history[-5:] if history else [], [doc["content"] for doc in docs]
+        )
         sources = []
         max_score = 0.0
         
-        for i, doc in enumerate(docs):
-            doc_text += f"[{i+1}] {doc['content']}\n\n"
+        for i in packed.used:
+            doc = docs[i]
             sources.append({
                 "source": doc["metadata"].get("source", "Unknown"),
                 "score": doc["score"],
@@ -27,25 +120,164 @@ class ChatOrchestrator:
                 max_score = doc["score"]
         
         # 3. Context (Simple string join for now)
-        context_str = "\n".join(history[-5:]) if history else "No previous context."
+        context_str = "\n".join(packed.history) if packed.history else "No previous context."
         
+        engine = "mistral" if llm_engine.available else "fallback"
+        if not packed.used:
+            return {"result": {
+                "answer": "I couldn't find any specific information about that in my documents.",
+                "sources": sources,
+                "confidence_score": 0.0,
+                "processing_time": time.time() - start_time,
+                "metadata": {"doc_count": 0, "engine": engine, "prompt": packed.report}
+            }}
+        return {
+            "query_vector": query_vector,
+            "use_cache": use_cache,
+            "index_version": index_version,
+            "doc_text": packed.doc_text,
+            "context": context_str,
+            "sources": sources,
+            "confidence_score": max_score, # Simplified confidence metric
+            "metadata": {"doc_count": len(sources), "engine": engine, "prompt": packed.report},
+        }
+
+    def _finish(self, prepared: Dict[str, Any], answer: str, start_time: float) -> Dict[str, Any]:
+        metadata = prepared["metadata"]
+        if prepared["use_cache"] and metadata["engine"] == "mistral" and not llm_engine.is_fallback(answer):
+            self.answer_cache.store(
+                prepared["query_vector"], answer, prepared["sources"], prepared["confidence_score"],
+                metadata["doc_count"], prepared["index_version"],
+            )
+        return {
+            "answer": answer,
+            "sources": prepared["sources"],
+            "confidence_score": prepared["confidence_score"],
+            "processing_time": time.time() - start_time,
+            "metadata": metadata
+        }
+
+    def _coalesce_key(self, query: str, history: List[str]):
+        # Like the answer cache, only standalone questions: follow-ups differ by history
+        if self.coalescer is None or history:
+            return None
+        return normalize_query(query), retriever.index_version
+
+    @staticmethod
+    def _shared_result(result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Another request's result, timed for this one."""
+        return {
+            **result,
+            "processing_time": time.time() - start_time,
+            "metadata": {**result["metadata"], "coalesced": True},
+        }
+
+    def process_query(self, query: str, history: List[str] = []) -> Dict[str, Any]:
+        """
+        Identical standalone questions in flight at the same time (same
+        normalized text and index version) share one retrieval and LLM call;
+        an error in that call is raised to each of them.
+        """
+        start_time = time.time()
+        key = self._coalesce_key(query, history)
+        if key is None:
+            return self._process(query, history, start_time)
+        result, leader = self.coalescer.run(key, lambda: self._process(query, history, start_time))
+        return result if leader else self._shared_result(result, start_time)
+
+    def _process(self, query: str, history: List[str], start_time: float) -> Dict[str, Any]:
+        prepared = self._prepare(query, history, start_time)
+        if "result" in prepared:
+            return prepared["result"]
+
         # 4. Generation
-        if not docs:
-            answer = "I couldn't find any specific information about that in my documents."
-            confidence = 0.0
+        answer = llm_engine.generate(
+            SYSTEM_PROMPT, query, prepared["context"], prepared["doc_text"], prepared["index_version"]
+        )
+        return self._finish(prepared, answer, start_time)
+
+    async def process_query_async(self, query: str, history: List[str] = []) -> Dict[str, Any]:
+        """
+        process_query for async endpoints: retrieval runs on the retrieval
+        executor, generation awaits the async LLM client, so no thread is held
+        while waiting for the model. A caller cancelled while sharing another
+        request's call leaves that call running for the rest.
+        """
+        start_time = time.time()
+        key = self._coalesce_key(query, history)
+        if key is None:
+            return await self._process_async(query, history, start_time)
+        result, leader = await self.coalescer.run_async(key, lambda: self._process_async(query, history, start_time))
+        return result if leader else self._shared_result(result, start_time)
+
+    async def _process_async(self, query: str, history: List[str], start_time: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(self.executor, self._prepare, query, history, start_time)
+        if "result" in prepared:
+            return prepared["result"]
+
+        answer = await llm_engine.generate_async(
+            SYSTEM_PROMPT, query, prepared["context"], prepared["doc_text"], prepared["index_version"]
+        )
+        return self._finish(prepared, answer, start_time)
+
+    async def stream_query(self, query: str, history: List[str] = []) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Same pipeline as process_query_async as (event, data) pairs: "meta"
+        (sources, confidence, metadata) before generation starts, a "token"
+        per piece of the answer, then "done" with the full answer and timings.
+        Errors during generation propagate to the caller after the tokens
+        already sent.
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(self.executor, self._prepare, query, history, start_time)
+        result = prepared.get("result")
+        yield "meta", {key: (result or prepared)[key] for key in ("sources", "confidence_score", "metadata")}
+
+        if result:
+            pieces = _single(result["answer"])
         else:
-            system_prompt = "You are a helpful college assistant. Use the provided documents to answer. If the answer is not in the documents, say so. Cite sources using [1] notation."
-            answer = llm_engine.generate(system_prompt, query, context_str, doc_text)
-            confidence = max_score # Simplified confidence metric
-            
-        processing_time = time.time() - start_time
-        
-        return {
+            pieces = llm_engine.stream(
+                SYSTEM_PROMPT, query, prepared["context"], prepared["doc_text"], prepared["index_version"]
+            )
+        answer = []
+        time_to_first_token = None
+        async for piece in pieces:
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+                self._record_ttft(time_to_first_token)
+            answer.append(piece)
+            yield "token", {"text": piece}
+
+        answer = "".join(answer)
+        if not result:
+            self._finish(prepared, answer, start_time)
+        yield "done", {
             "answer": answer,
-            "sources": sources,
-            "confidence_score": confidence,
-            "processing_time": processing_time,
-            "metadata": {"doc_count": len(docs), "engine": "mistral" if llm_engine.mistral_client else "fallback"}
+            "processing_time": time.time() - start_time,
+            "time_to_first_token": time_to_first_token,
+        }
+
+    def _record_ttft(self, seconds: float):
+        with self._stats_lock:
+            self.streams += 1
+            self._ttft.append(seconds)
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """Time from request to first streamed token over the last TTFT_WINDOW streams."""
+        with self._stats_lock:
+            ttft = sorted(self._ttft)
+        if not ttft:
+            return {"streams": self.streams, "ttft_ms": None}
+        return {
+            "streams": self.streams,
+            "ttft_ms": {
+                "avg": round(sum(ttft) / len(ttft) * 1000, 1),
+                "p50": round(ttft[len(ttft) // 2] * 1000, 1),
+                "p95": round(ttft[min(len(ttft) - 1, int(len(ttft) * 0.95))] * 1000, 1),
+                "window": len(ttft),
+            },
         }
 
 orchestrator = ChatOrchestrator()
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from app.core.logging import logger
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front for a SentenceTransformer model.
+
+    Concurrent callers each submit one query; a single worker thread holds
+    them for at most `max_wait_ms`, encodes them in one forward pass and
+    hands every caller back its own vector.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._encode_seconds = 0.0
+        self._fill_histogram: Dict[int, int] = {}
+
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, text: str) -> np.ndarray:
+        """Blocks until the batch containing `text` is encoded; returns a 1-D float32 vector."""
+        return self.submit(text).result()
+
+    def submit(self, text: str) -> Future:
+        """Queues `text` without waiting; the future resolves to its 1-D float32 vector."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Window closed; still take anything already waiting.
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            try:
+                vectors = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                vectors = np.asarray(vectors, dtype="float32")
+            except Exception as e:
+                logger.error(f"Batched embedding failed for {len(batch)} queries: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            self._record(len(batch), elapsed)
+
+    def _record(self, size: int, elapsed: float):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += size
+            self._encode_seconds += elapsed
+            self._fill_histogram[size] = self._fill_histogram.get(size, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batches = self._batches
+            avg_size = self._requests / batches if batches else 0.0
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "requests": self._requests,
+                "queued": self._queue.qsize(),
+                "avg_batch_size": round(avg_size, 2),
+                "avg_fill_ratio": round(avg_size / self.max_batch_size, 3),
+                "avg_encode_ms": round(self._encode_seconds / batches * 1000.0, 2) if batches else 0.0,
+                "fill_histogram": dict(sorted(self._fill_histogram.items())),
+            }
@@ -0,0 +1,125 @@
+import os
+import socket
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.onnx_embedder import embedder_id, load_embedding_model
+import app.core.shared  # noqa: F401  (project root on sys.path)
+from rag.embedding_client import recv_frame, send_frame
+
+
+def _encode_token_ids(model: Any, token_ids: List[List[int]], batch_size: int = 32) -> np.ndarray:
+    """Forward pass over pre-tokenized inputs (ids without special tokens)."""
+    if hasattr(model, "encode_token_ids"):
+        return model.encode_token_ids(token_ids, batch_size)
+    import torch
+
+    tokenizer = model.tokenizer
+    out = np.zeros((len(token_ids), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+    for i in range(0, len(order), batch_size):
+        rows = order[i : i + batch_size]
+        features = tokenizer.pad(
+            {"input_ids": [tokenizer.build_inputs_with_special_tokens(token_ids[row]) for row in rows]},
+            padding=True,
+            return_tensors="pt",
+        )
+        features = {key: value.to(model.device) for key, value in features.items()}
+        with torch.no_grad():
+            out[rows] = model(features)["sentence_embedding"].float().cpu().numpy()
+    return out
+
+
+class EmbeddingServer:
+    """
+    Owns the one copy of the embedding model on the host and serves every
+    uvicorn worker (and the ingestor) over a Unix socket. Query texts from all
+    connections go through one EmbeddingBatcher, so concurrent requests from
+    different workers share a forward pass; pre-tokenized bulk requests
+    (ingestion) run directly, already batched by the caller.
+
+    Protocol: see rag/embedding_client.py. Ops: "hello", "encode"
+    (texts), "encode_ids" (token ids without special tokens).
+    """
+
+    def __init__(self, model: Any, socket_path: str, hello: Dict[str, Any]):
+        self.model = model
+        self.socket_path = socket_path
+        self.hello = hello
+        self.batcher = EmbeddingBatcher(
+            model, max_batch_size=settings.EMBED_BATCH_MAX_SIZE, max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+        )
+        self._bulk_lock = threading.Lock()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a previous run
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        listener.listen(128)
+        logger.info(f"Embedding server for {self.hello['embedder_id']} listening on {self.socket_path}")
+        try:
+            while True:
+                conn, _ = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), name="embedding-conn", daemon=True).start()
+        finally:
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _serve_connection(self, conn: socket.socket):
+        with conn:
+            while True:
+                try:
+                    request, _ = recv_frame(conn)
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    header, payload = self._handle(request)
+                except Exception as e:
+                    logger.error(f"Embedding server request failed: {e}")
+                    header, payload = {"error": f"{type(e).__name__}: {e}"}, b""
+                try:
+                    send_frame(conn, header, payload)
+                except (ConnectionError, OSError):
+                    return
+
+    def _handle(self, request: Dict[str, Any]):
+        op = request.get("op")
+        if op == "hello":
+            return self.hello, b""
+        if op == "encode":
+            futures = [self.batcher.submit(text) for text in request["texts"]]
+            vectors = np.stack([f.result() for f in futures]) if futures else np.zeros((0, self.hello["dim"]))
+        elif op == "encode_ids":
+            with self._bulk_lock:
+                vectors = _encode_token_ids(self.model, request["token_ids"], request.get("batch_size", 32))
+        else:
+            raise ValueError(f"unknown op {op!r}")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return {"n": len(vectors), "dim": int(vectors.shape[1])}, vectors.tobytes()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared embedding server for all backend workers on this host")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SERVER_SOCKET or "/tmp/askuni-embeddings.sock")
+    args = parser.parse_args()
+
+    model = load_embedding_model(
+        settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND, settings.ONNX_MODEL_PATH, settings.ONNX_THREADS
+    )
+    hello = {
+        "embedder_id": embedder_id(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND),
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.get_max_seq_length(),
+        # Clients load just the tokenizer from here to chunk by tokens
+        "tokenizer": os.path.abspath(settings.ONNX_MODEL_PATH) if settings.EMBEDDING_BACKEND == "onnx" else settings.EMBEDDING_MODEL,
+    }
+    EmbeddingServer(model, args.socket, hello).serve_forever()
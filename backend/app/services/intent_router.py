@@ -0,0 +1,34 @@
+from typing import List, Tuple
+
+import app.core.shared  # noqa: F401  (project root on sys.path)
+from cag.intent import classify_intent
+
+# Intent -> document categories (scraper.utils.get_category_from_url labels).
+# Intents missing here always search the global index.
+INTENT_CATEGORIES = {
+    "fees": ["fees"],
+    "admissions": ["admissions"],
+    "eligibility": ["admissions", "courses"],
+    "courses": ["courses"],
+    "exam": ["exams"],
+    "hostel": ["hostel"],
+    "placement": ["placements"],
+    "rules": ["policies"],
+}
+
+
+class IntentRouter:
+    def classify(self, query: str) -> Tuple[str, float]:
+        """
+        Returns (intent, confidence), confidence being the winning intent's
+        share of all matched keywords.
+        """
+        return classify_intent(query)
+
+    def categories(self, intent: str, confidence: float, min_confidence: float) -> List[str]:
+        if confidence < min_confidence:
+            return []
+        return INTENT_CATEGORIES.get(intent, [])
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.logging import logger
+
+
+def response_key(model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    """Digest of everything that determines a completion: same prompt and sampling -> same key."""
+    payload = json.dumps([model, temperature, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU; each worker has its own."""
+
+    shared = False
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, version: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is not None:
+                self._entries.move_to_end((version, key))
+            return entry
+
+    def set(self, version: str, key: str, entry: Dict[str, Any], ttl_seconds: float):
+        with self._lock:
+            self._entries[(version, key)] = entry
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def prune_versions_before(self, version: str):
+        with self._lock:
+            for stale in [k for k in self._entries if k[0] < version]:
+                del self._entries[stale]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    One SQLite file shared by every worker on the host (WAL, so readers do
+    not block the writer). Rows carry their index version, so workers that
+    are briefly on different versions each read only their own. Least
+    recently read rows beyond `max_size` are deleted on write.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, max_size: int = 4096):
+        self.path = path
+        self.max_size = max(1, max_size)
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")]
+        if columns and "version" not in columns:
+            # Cache file from before versions had a column; its rows are disposable
+            self._conn.execute("DROP TABLE llm_cache")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "version TEXT NOT NULL, key TEXT NOT NULL, entry TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL, "
+            "PRIMARY KEY (version, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_used_at ON llm_cache (used_at)")
+
+    def get(self, version: str, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entry FROM llm_cache WHERE version = ? AND key = ? AND expires_at > ?", (version, key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_cache SET used_at = ? WHERE version = ? AND key = ?", (now, version, key))
+        return json.loads(row[0])
+
+    def set(self, version: str, key: str, entry: Dict[str, Any], ttl_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (version, key, entry, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (version, key, json.dumps(entry), now + ttl_seconds, now),
+            )
+            deleted = self._conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at <= ? OR rowid IN ("
+                "SELECT rowid FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_size),
+            ).rowcount
+            self.evictions += max(deleted, 0)
+
+    def prune_versions_before(self, version: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE version < ?", (version,))
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class DictRedis:
+    """
+    Local stand-in for a Redis client: the get / set-with-`ex` subset that
+    RedisBackend uses, in a dict. For tests and for trying the redis
+    backend without a server; it is not shared between processes.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            value, expires_at = self._values.get(name, (None, None))
+            if expires_at is not None and expires_at <= time.time():
+                del self._values[name]
+                return None
+            return value
+
+    def set(self, name: str, value: Any, ex: Optional[int] = None) -> bool:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            self._values[name] = (value, time.time() + ex if ex is not None else None)
+        return True
+
+
+class RedisBackend:
+    """
+    Any Redis-protocol store (Redis, Valkey, KeyDB) shared by every worker and
+    host. Entries expire by TTL and are evicted by the server's maxmemory
+    policy, so entries of a previous index version simply age out. `client`
+    is anything with redis-py's get/set (DictRedis in tests).
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, namespace: str = "askuni:llm:"):
+        self.client = client
+        self.namespace = namespace
+        self.evictions = 0
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis
+
+        return cls(redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0))
+
+    def get(self, version: str, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(f"{self.namespace}{version}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, version: str, key: str, entry: Dict[str, Any], ttl_seconds: float):
+        self.client.set(f"{self.namespace}{version}:{key}", json.dumps(entry), ex=max(1, int(ttl_seconds)))
+
+    def prune_versions_before(self, version: str):
+        pass
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache of LLM completions keyed on response_key() and the
+    index version, so a rebuilt vector store never serves answers written
+    from the old chunks. Entries record their token counts; a hit adds them
+    to the tokens and cost saved. Backend errors count as misses: the cache
+    must never fail a request.
+
+    Version names sort by build time. Once this worker serves a version,
+    entries of older versions are pruned: CURRENT has moved past them, and
+    workers still on them until their next poll merely miss. Entries of
+    newer versions, and of other workers' current one, are left alone.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        ttl_seconds: float = 86400.0,
+        cost_per_1k_input: float = 0.0,
+        cost_per_1k_output: float = 0.0,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.cost_per_1k_input = cost_per_1k_input
+        self.cost_per_1k_output = cost_per_1k_output
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self.invalidations = 0
+        self.input_tokens_saved = 0
+        self.output_tokens_saved = 0
+
+    def _version(self, index_version: Optional[str]) -> str:
+        # No store loaded: entries are kept apart under "" and nothing is pruned
+        if index_version is None:
+            return ""
+        if self._index_version is None or index_version > self._index_version:
+            with self._lock:
+                if self._index_version is not None and index_version <= self._index_version:
+                    return index_version
+                if self._index_version is not None:
+                    self.invalidations += 1
+                self._index_version = index_version
+            try:
+                self.backend.prune_versions_before(index_version)
+            except Exception as e:
+                logger.warning(f"LLM cache invalidation failed: {e}")
+        return index_version
+
+    def get(self, key: str, index_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        version = self._version(index_version)
+        try:
+            entry = self.backend.get(version, key)
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            entry = None
+            with self._lock:
+                self.errors += 1
+        if entry is not None and time.time() - entry["created_at"] > self.ttl_seconds:
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.input_tokens_saved += entry["input_tokens"]
+            self.output_tokens_saved += entry["output_tokens"]
+        return entry
+
+    def put(self, key: str, index_version: Optional[str], answer: str, input_tokens: int, output_tokens: int):
+        entry = {
+            "answer": answer,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "created_at": time.time(),
+        }
+        try:
+            self.backend.set(self._version(index_version), key, entry, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"LLM cache store failed: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            cost_saved = (
+                self.input_tokens_saved / 1000 * self.cost_per_1k_input
+                + self.output_tokens_saved / 1000 * self.cost_per_1k_output
+            )
+            return {
+                "backend": type(self.backend).__name__,
+                "size": size,
+                "ttl_seconds": self.ttl_seconds,
+                "index_version": self._index_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "errors": self.errors,
+                "evictions": self.backend.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "input_tokens_saved": self.input_tokens_saved,
+                "output_tokens_saved": self.output_tokens_saved,
+                "cost_saved": round(cost_saved, 4),
+            }
+
+
+def make_response_cache(
+    backend: str,
+    max_size: int = 4096,
+    sqlite_path: Optional[str] = None,
+    redis_url: Optional[str] = None,
+    **kwargs,
+) -> LLMResponseCache:
+    """LLMResponseCache on the named backend ("memory", "sqlite", "redis"); in-memory if that one cannot be opened."""
+    try:
+        if backend == "sqlite":
+            store = SQLiteBackend(sqlite_path, max_size)
+        elif backend == "redis":
+            store = RedisBackend.from_url(redis_url)
+        else:
+            store = MemoryBackend(max_size)
+    except Exception as e:
+        logger.error(f"LLM cache backend {backend!r} unavailable, using in-memory: {e}")
+        store = MemoryBackend(max_size)
+    return LLMResponseCache(store, **kwargs)
@@ -1,22 +1,104 @@
+import asyncio
 import os
-from mistralai import Mistral
+import random
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
 from app.core.config import settings
 from app.core.logging import logger
+from app.services.llm_cache import make_response_cache, response_key
+import app.core.shared  # noqa: F401  (project root on sys.path)
+from llm.prompt_budget import PackedContext, PromptBudget, mistral_token_counter
+
+FALLBACK_HEADER = "**I am unable to generate a synthesized answer right now, but here is what I found:**"
+
+MODEL = "mistral-large-latest"
+TEMPERATURE = 0.1
 
 class LLMEngine:
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         self.mistral_client = None
-        
-        if self.provider == "mistral":
-            if settings.MISTRAL_API_KEY:
-                self.mistral_client = Mistral(api_key=settings.MISTRAL_API_KEY)
-                logger.info("Mistral API Client initialized.")
-            else:
-                logger.warning("Mistral Provider selected but no API Key found.")
+        self._async_http = None
+        self._budget = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self.response_cache = None
+        if settings.LLM_CACHE_ENABLED:
+            self.response_cache = make_response_cache(
+                settings.LLM_CACHE_BACKEND,
+                max_size=settings.LLM_CACHE_SIZE,
+                sqlite_path=settings.LLM_CACHE_SQLITE_PATH,
+                redis_url=settings.LLM_CACHE_REDIS_URL,
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                cost_per_1k_input=settings.LLM_COST_PER_1K_INPUT_TOKENS,
+                cost_per_1k_output=settings.LLM_COST_PER_1K_OUTPUT_TOKENS,
+            )
+        # Async path bookkeeping; only touched from the event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.async_calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def warm_up(self) -> bool:
+        """Imports and creates the provider client (once); True if one is available."""
+        with self._init_lock:
+            if not self._initialized:
+                if self.provider == "mistral":
+                    if settings.MISTRAL_API_KEY:
+                        import httpx
+                        from mistralai import Mistral
+
+                        # One keep-alive pool shared by every async call of this worker
+                        self._async_http = httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_connections=settings.LLM_MAX_CONCURRENCY,
+                                max_keepalive_connections=settings.LLM_MAX_CONCURRENCY,
+                            ),
+                            timeout=settings.LLM_TIMEOUT_SECONDS,
+                        )
+                        self.mistral_client = Mistral(api_key=settings.MISTRAL_API_KEY, async_client=self._async_http)
+                        logger.info("Mistral API Client initialized.")
+                    else:
+                        logger.warning("Mistral Provider selected but no API Key found.")
+                self._initialized = True
+            return self.mistral_client is not None
+
+    @property
+    def available(self) -> bool:
+        """Whether answers come from the provider, without creating the client (cheap per request)."""
+        if self._initialized:
+            return self.mistral_client is not None
+        return self.provider == "mistral" and bool(settings.MISTRAL_API_KEY)
 
-    def generate(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
-        full_prompt = f"""
+    def _limiter(self) -> asyncio.Semaphore:
+        # Created on first use, inside the running event loop rather than at import
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        return self._semaphore
+
+    @property
+    def budget(self) -> PromptBudget:
+        # The tokenizer loads on first use, not at import
+        with self._init_lock:
+            if self._budget is None:
+                self._budget = PromptBudget(
+                    mistral_token_counter(MODEL),
+                    settings.LLM_CONTEXT_WINDOW,
+                    settings.LLM_MAX_NEW_TOKENS,
+                    input_budget=settings.LLM_INPUT_TOKEN_BUDGET,
+                    history_budget=settings.LLM_HISTORY_TOKEN_BUDGET,
+                )
+            return self._budget
+
+    def pack_context(self, system_prompt: str, user_query: str, history: List[str], chunks: List[str]) -> PackedContext:
+        """History lines and chunks (in rank order) that fit the input budget next to LLM_MAX_NEW_TOKENS."""
+        return self.budget.pack(self._build_prompt(system_prompt, user_query, "", ""), history, chunks)
+
+    @staticmethod
+    def _build_prompt(system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+        return f"""
 {system_prompt}
 
 CONTEXT_HISTORY:
@@ -30,14 +112,46 @@ USER_QUESTION:
 
 ANSWER:
 """
+
+    def _cache_lookup(self, full_prompt: str, index_version: Optional[str]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        key = response_key(MODEL, TEMPERATURE, settings.LLM_MAX_NEW_TOKENS, full_prompt)
+        entry = self.response_cache.get(key, index_version)
+        return entry["answer"] if entry else None
+
+    def _cache_store(self, full_prompt: str, index_version: Optional[str], answer: str, usage: Any = None):
+        """Stores a provider answer with its token usage (counted locally when the provider reports none)."""
+        if self.response_cache is None or not answer:
+            return
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens or 0
+        else:
+            input_tokens, output_tokens = self.budget.count_tokens(full_prompt), self.budget.count_tokens(answer)
+        key = response_key(MODEL, TEMPERATURE, settings.LLM_MAX_NEW_TOKENS, full_prompt)
+        self.response_cache.put(key, index_version, answer, input_tokens, output_tokens)
+
+    def generate(
+        self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str, index_version: Optional[str] = None
+    ) -> str:
+        """`index_version` scopes the response cache: answers from a previous vector store are never reused."""
+        full_prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
+        if not self._initialized:
+            self.warm_up()
         if self.provider == "mistral" and self.mistral_client:
+            cached = self._cache_lookup(full_prompt, index_version)
+            if cached is not None:
+                return cached
             try:
                 response = self.mistral_client.chat.complete(
-                    model="mistral-large-latest",
+                    model=MODEL,
                     messages=[{"role": "user", "content": full_prompt}],
-                    temperature=0.1
+                    temperature=TEMPERATURE,
+                    max_tokens=settings.LLM_MAX_NEW_TOKENS
                 )
-                return response.choices[0].message.content
+                answer = response.choices[0].message.content
+                self._cache_store(full_prompt, index_version, answer, getattr(response, "usage", None))
+                return answer
             except Exception as e:
                 logger.error(f"Mistral API failed: {e}")
                 return self._fallback_response(retrieved_chunks)
@@ -46,9 +160,169 @@ ANSWER:
         # fallback to retrieval only
         return self._fallback_response(retrieved_chunks)
 
+    async def generate_async(
+        self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str, index_version: Optional[str] = None
+    ) -> str:
+        """
+        `generate` without holding a thread for the round-trip. At most
+        LLM_MAX_CONCURRENCY calls are in flight per worker; each attempt is
+        cut off after LLM_TIMEOUT_SECONDS, and 429/5xx/timeouts are retried
+        with jittered exponential backoff before falling back. Cache hits do
+        not wait for a slot.
+        """
+        full_prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
+        if not self._initialized:
+            await asyncio.to_thread(self.warm_up)
+        if not (self.provider == "mistral" and self.mistral_client):
+            return self._fallback_response(retrieved_chunks)
+
+        # Shared backends do file/network I/O: keep it off the event loop
+        shared_cache = self.response_cache is not None and self.response_cache.backend.shared
+        if shared_cache:
+            cached = await asyncio.to_thread(self._cache_lookup, full_prompt, index_version)
+        else:
+            cached = self._cache_lookup(full_prompt, index_version)
+        if cached is not None:
+            return cached
+
+        async with self._limiter():
+            self.in_flight += 1
+            self.async_calls += 1
+            try:
+                for attempt in range(settings.LLM_MAX_RETRIES + 1):
+                    try:
+                        response = await asyncio.wait_for(
+                            self.mistral_client.chat.complete_async(
+                                model=MODEL,
+                                messages=[{"role": "user", "content": full_prompt}],
+                                temperature=TEMPERATURE,
+                                max_tokens=settings.LLM_MAX_NEW_TOKENS
+                            ),
+                            settings.LLM_TIMEOUT_SECONDS,
+                        )
+                        answer = response.choices[0].message.content
+                        usage = getattr(response, "usage", None)
+                        if shared_cache:
+                            await asyncio.to_thread(self._cache_store, full_prompt, index_version, answer, usage)
+                        else:
+                            self._cache_store(full_prompt, index_version, answer, usage)
+                        return answer
+                    except Exception as e:
+                        if isinstance(e, asyncio.TimeoutError):
+                            self.timeouts += 1
+                        delay = self._retry_delay(e, attempt) if attempt < settings.LLM_MAX_RETRIES else None
+                        if delay is None:
+                            self.failures += 1
+                            logger.error(f"Mistral API failed: {e!r}")
+                            return self._fallback_response(retrieved_chunks)
+                        self.retries += 1
+                        logger.warning(f"Mistral API attempt {attempt + 1} failed ({e!r}); retrying in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+            finally:
+                self.in_flight -= 1
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None if retrying cannot help."""
+        import httpx
+
+        status = getattr(error, "status_code", None)
+        if not (isinstance(error, (asyncio.TimeoutError, httpx.TransportError)) or status == 429 or (status or 0) >= 500):
+            return None
+        headers = getattr(getattr(error, "raw_response", None), "headers", None) or {}
+        try:
+            # Honour the provider's Retry-After when it sends one
+            return min(float(headers.get("retry-after")), settings.LLM_RETRY_MAX_SECONDS)
+        except (TypeError, ValueError):
+            # Full jitter, so workers rate-limited together do not retry together
+            return random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "async_calls": self.async_calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+        }
+
+    async def stream(
+        self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str, index_version: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yields the answer in pieces as the provider streams them, through the
+        async client and within the LLM_MAX_CONCURRENCY limit of
+        generate_async. Without a provider, or if it fails before the first
+        piece, yields the fallback answer whole; a failure mid-answer is
+        raised to the caller. A cached answer is yielded whole.
+        """
+        full_prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
+        if not self._initialized:
+            await asyncio.to_thread(self.warm_up)
+        if self.provider == "mistral" and self.mistral_client:
+            shared_cache = self.response_cache is not None and self.response_cache.backend.shared
+            if shared_cache:
+                cached = await asyncio.to_thread(self._cache_lookup, full_prompt, index_version)
+            else:
+                cached = self._cache_lookup(full_prompt, index_version)
+            if cached is not None:
+                yield cached
+                return
+            pieces = []
+            usage = None
+            async with self._limiter():
+                self.in_flight += 1
+                self.async_calls += 1
+                try:
+                    response = await asyncio.wait_for(
+                        self.mistral_client.chat.stream_async(
+                            model=MODEL,
+                            messages=[{"role": "user", "content": full_prompt}],
+                            temperature=TEMPERATURE,
+                            max_tokens=settings.LLM_MAX_NEW_TOKENS
+                        ),
+                        settings.LLM_TIMEOUT_SECONDS,
+                    )
+                    # async with: a client that disconnects mid-answer closes the provider stream
+                    async with response as events:
+                        async for event in events:
+                            usage = getattr(event.data, "usage", None) or usage
+                            delta = event.data.choices[0].delta.content if event.data.choices else None
+                            if delta:
+                                pieces.append(delta)
+                                yield delta
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timeouts += 1
+                    self.failures += 1
+                    if pieces:
+                        raise
+                    logger.error(f"Mistral streaming API failed: {e!r}")
+                finally:
+                    self.in_flight -= 1
+            if pieces:
+                answer = "".join(pieces)
+                if shared_cache:
+                    await asyncio.to_thread(self._cache_store, full_prompt, index_version, answer, usage)
+                else:
+                    self._cache_store(full_prompt, index_version, answer, usage)
+                return
+
+        yield self._fallback_response(retrieved_chunks)
+
     def _fallback_response(self, retrieved_chunks: str) -> str:
         if not retrieved_chunks:
             return "I'm sorry, I couldn't find any relevant information."
-        return f"**I am unable to generate a synthesized answer right now, but here is what I found:**\n\n{retrieved_chunks}"
+        return f"{FALLBACK_HEADER}\n\n{retrieved_chunks}"
+
+    def is_fallback(self, answer: str) -> bool:
+        return answer.startswith(FALLBACK_HEADER)
 
 llm_engine = LLMEngine()
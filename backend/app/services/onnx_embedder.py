@@ -0,0 +1,119 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from app.core.logging import logger
+
+# Layout of an export made by `python -m rag.onnx_embedder` in the project root:
+# tokenizer files, model.onnx / model.int8.onnx and embedder.json (model name,
+# pooling, normalize, dimension, max_seq_length, served graph, parity result).
+META_FILE = "embedder.json"
+
+
+def embedder_id(model_name: str, backend: str = "torch") -> str:
+    """Identifies the vectors a model/backend pair produces (cache keys)."""
+    return model_name if backend == "torch" else f"{model_name}#onnx"
+
+
+def load_meta(path: str) -> Optional[Dict[str, Any]]:
+    meta_file = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        return json.load(f)
+
+
+class OnnxEmbedder:
+    """
+    Sentence embeddings from an exported ONNX graph run by ONNX Runtime, with
+    the model's pooling and normalization reimplemented in numpy. Provides
+    the parts of the SentenceTransformer interface the retriever and the
+    embedding batcher use, without importing torch.
+    """
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.meta = load_meta(path)
+        if self.meta is None:
+            raise FileNotFoundError(f"No ONNX embedding export at {path}")
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(path, self.meta["file"]), options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def get_max_seq_length(self) -> int:
+        return self.meta["max_seq_length"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Same truncation, pooling and output shape as SentenceTransformer.encode (numpy only)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        window = self.get_max_seq_length() - self.tokenizer.num_special_tokens_to_add(pair=False)
+        token_ids = self.tokenizer(texts, add_special_tokens=False, truncation=True, max_length=window, verbose=False)["input_ids"]
+        out = self.encode_token_ids(token_ids, batch_size)
+        return out[0] if single else out
+
+    def encode_token_ids(self, token_ids: List[List[int]], batch_size: int = 32) -> np.ndarray:
+        """float32[len(token_ids), dim] for pre-tokenized inputs (ids without special tokens)."""
+        out = np.zeros((len(token_ids), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Longest first to keep padding low
+        order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+        for i in range(0, len(order), batch_size):
+            rows = order[i : i + batch_size]
+            features = self.tokenizer.pad(
+                {"input_ids": [self.tokenizer.build_inputs_with_special_tokens(token_ids[row]) for row in rows]},
+                padding=True,
+                return_tensors="np",
+            )
+            out[rows] = self._forward(features)
+        return out
+
+    def _forward(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        mask = features["attention_mask"].astype(np.int64)
+        feed = {}
+        for name in self._input_names:
+            feed[name] = features[name].astype(np.int64) if name in features else np.zeros_like(mask)
+        hidden = self.session.run(None, feed)[0]
+
+        pooling = self.meta["pooling"]
+        if pooling == "cls":
+            pooled = hidden[:, 0]
+        elif pooling == "max":
+            pooled = np.where(mask[:, :, None].astype(bool), hidden, -np.inf).max(axis=1)
+        else:
+            pooled = (hidden * mask[:, :, None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        pooled = pooled.astype(np.float32)
+        if self.meta["normalize"]:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+
+def load_embedding_model(model_name: str, backend: str = "torch", onnx_path: Optional[str] = None, threads: Optional[int] = None) -> Any:
+    """
+    A SentenceTransformer (`torch`, imported only here so the ONNX path never
+    loads torch) or an OnnxEmbedder over an export that passed its parity
+    check against the PyTorch model.
+    """
+    if backend == "onnx":
+        meta = load_meta(onnx_path) if onnx_path else None
+        if meta is None:
+            raise FileNotFoundError(f"No ONNX export at {onnx_path}; create it with `python -m rag.onnx_embedder`")
+        if meta["model"] != model_name:
+            raise ValueError(f"ONNX export at {onnx_path} is of {meta['model']}, not {model_name}")
+        if not meta.get("parity", {}).get("passed"):
+            raise ValueError(f"ONNX export at {onnx_path} did not pass its parity check")
+        logger.info(f"ONNX embedding backend: {meta['file']} (parity min cosine {meta['parity']['min_cosine']})")
+        return OnnxEmbedder(onnx_path, threads=threads)
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.logging import logger
+from app.services.embedding_cache import normalize_query
+
+
+class CrossEncoderReranker:
+    """
+    Rescores retrieved candidates with a small CPU cross-encoder.
+
+    All uncached (query, chunk) pairs go through one batched forward pass and
+    their scores are kept in an LRU keyed on (normalized query, chunk id,
+    index version), so a rebuilt index never reuses stale chunk ids.
+    Before scoring, the expected cost is estimated from a running ms-per-pair
+    average; if it would blow the per-request budget the caller keeps vector
+    order instead.
+    """
+
+    def __init__(self, model_name: str, budget_ms: float = 150.0, cache_size: int = 4096):
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading rerank model: {model_name}")
+        self.model = CrossEncoder(model_name)
+        self.budget_ms = budget_ms
+        self.cache_size = max(1, cache_size)
+
+        self._cache: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ms_per_pair: Optional[float] = None
+        self.reranked = 0
+        self.skipped_over_budget = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def rerank(
+        self, query: str, docs: List[Dict[str, Any]], top_k: int, index_version: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Returns (docs, reranked). Docs are sorted by cross-encoder score and cut
+        to top_k. If reranking would exceed the budget or fails, the input order
+        is returned unchanged (uncut) with reranked=False.
+        """
+        if not docs:
+            return docs, False
+
+        key = f"{index_version}:{normalize_query(query)}"
+        scores: Dict[int, float] = {}
+        missing: List[Dict[str, Any]] = []
+        with self._lock:
+            for doc in docs:
+                cached = self._cache.get((key, doc["id"]))
+                if cached is None:
+                    missing.append(doc)
+                else:
+                    self._cache.move_to_end((key, doc["id"]))
+                    scores[doc["id"]] = cached
+            self.cache_hits += len(scores)
+            self.cache_misses += len(missing)
+            estimate_ms = len(missing) * self._ms_per_pair if self._ms_per_pair else 0.0
+
+        if missing and estimate_ms > self.budget_ms:
+            with self._lock:
+                self.skipped_over_budget += 1
+                # Let the estimate decay so a transient slowdown is eventually retried
+                self._ms_per_pair *= 0.95
+            return docs, False
+
+        if missing:
+            start = time.perf_counter()
+            try:
+                predicted = self.model.predict(
+                    [(query, doc["content"]) for doc in missing], batch_size=len(missing), show_progress_bar=False
+                )
+            except Exception as e:
+                logger.error(f"Reranking failed, keeping vector order: {e}")
+                return docs, False
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+            with self._lock:
+                per_pair = elapsed_ms / len(missing)
+                # Exponential moving average so one slow call doesn't disable reranking for good
+                self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+                for doc, score in zip(missing, predicted):
+                    scores[doc["id"]] = float(score)
+                    self._cache[(key, doc["id"])] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.reranked += 1
+        ranked = sorted(docs, key=lambda d: scores[d["id"]], reverse=True)[:top_k]
+        return [{**doc, "rerank_score": scores[doc["id"]]} for doc in ranked], True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_ms": self.budget_ms,
+                "ms_per_pair": round(self._ms_per_pair, 3) if self._ms_per_pair else None,
+                "reranked": self.reranked,
+                "skipped_over_budget": self.skipped_over_budget,
+                "cache_size": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
@@ -1,11 +1,52 @@
 import os
+import atexit
+import threading
 import faiss
-import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.core.config import settings
 from app.core.logging import logger
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.onnx_embedder import embedder_id, load_embedding_model
+from app.services.vector_store import (
+    INDEX_FILE, load_index_spec, search_params, apply_search_params, read_index, resolve_current, enable_reconstruct, dense_scores,
+    chunk_store_exists, open_chunk_store, load_partitions, search_partitions, Partition
+)
+import app.core.shared  # noqa: F401  (project root on sys.path)
+from rag.embedding_client import EmbeddingClient
+from rag.sparse_index import SparseIndex, reciprocal_rank_fusion
+
+
+class IndexSnapshot:
+    """
+    Everything a search reads, loaded from one vector store version. It is
+    never mutated: a reload builds a new snapshot and swaps the reference, and
+    requests already holding the old one finish on it.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        path: str,
+        index: faiss.Index,
+        spec: Dict[str, Any],
+        load_mode: str,
+        search_params: Dict[str, Any],
+        chunk_store,
+        sparse_index: Optional[SparseIndex],
+        partitions: Dict[str, Partition],
+    ):
+        self.version = version
+        self.path = path
+        self.index = index
+        self.spec = spec
+        self.load_mode = load_mode
+        self.search_params = search_params
+        self.chunk_store = chunk_store
+        self.sparse_index = sparse_index
+        self.partitions = partitions
+
 
 class Retriever:
     _instance = None
@@ -17,57 +58,266 @@ class Retriever:
         return cls._instance
 
     def initialize(self):
+        """
+        Cheap on purpose: importing this module must not load models. The
+        embedding model and the vector store are loaded by the startup warm-up
+        (app.services.warmup) via `load_model` / `reload` / `start_watcher`, or on
+        first use outside the server.
+        """
         self.vector_store_path = settings.VECTOR_STORE_PATH
         self.model_name = settings.EMBEDDING_MODEL
         self.top_k = 5
         self.threshold = 0.6
-        
-        logger.info(f"Loading Embedding Model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
-        
-        self.index = None
-        self.chunks = []
-        self.metadata = []
-        self._load_index()
 
-    def _load_index(self):
-        index_file = os.path.join(self.vector_store_path, "index.faiss")
-        chunks_file = os.path.join(self.vector_store_path, "chunks.pkl")
+        self.model = None
+        self.batcher = None
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        self._model_lock = threading.Lock()
+
+        self.snapshot: Optional[IndexSnapshot] = None
+        self.reloads = 0
+        self.reload_failures = 0
+        self._reload_lock = threading.Lock()
+        self._reload_attempted = False
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    def load_model(self):
+        """Loads the embedding model, its batcher and the query cache (once)."""
+        with self._model_lock:
+            if self.model is not None:
+                return
+
+            def load_local():
+                logger.info(f"Loading Embedding Model: {self.model_name} ({settings.EMBEDDING_BACKEND})")
+                return load_embedding_model(
+                    self.model_name, settings.EMBEDDING_BACKEND, settings.ONNX_MODEL_PATH, settings.ONNX_THREADS
+                )
+
+            if settings.EMBEDDING_SERVER_SOCKET:
+                # The shared server batches across all workers; the local model
+                # is only loaded if the server goes away
+                model = EmbeddingClient(
+                    settings.EMBEDDING_SERVER_SOCKET,
+                    embedder_id(self.model_name, settings.EMBEDDING_BACKEND),
+                    load_local,
+                    timeout=settings.EMBEDDING_SERVER_TIMEOUT_SECONDS,
+                )
+            else:
+                model = load_local()
+            if settings.EMBED_BATCHING_ENABLED and not settings.EMBEDDING_SERVER_SOCKET:
+                self.batcher = EmbeddingBatcher(
+                    model,
+                    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+                )
+            self.query_cache = QueryEmbeddingCache(
+                max_size=settings.QUERY_CACHE_SIZE,
+                spill_path=settings.QUERY_CACHE_SPILL_PATH,
+                model_name=embedder_id(self.model_name, settings.EMBEDDING_BACKEND),
+            )
+            atexit.register(self.query_cache.save)
+            self.model = model
+
+    def start_watcher(self):
+        if settings.VECTOR_STORE_POLL_SECONDS > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="vector-store-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self):
+        """Ends the polling thread (at shutdown); a poll in progress finishes first."""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        snapshot = self.snapshot
+        return snapshot.index if snapshot else None
+
+    @property
+    def index_version(self) -> Optional[str]:
+        snapshot = self.snapshot
+        return snapshot.version if snapshot else None
+
+    @property
+    def index_spec(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return snapshot.spec if snapshot else {}
+
+    @property
+    def index_load_mode(self) -> Optional[str]:
+        snapshot = self.snapshot
+        return snapshot.load_mode if snapshot else None
+
+    def reload(self) -> bool:
+        """
+        Loads the vector store version named by CURRENT (or the legacy flat
+        store) and swaps it in with one reference assignment. Searches are never
+        blocked; on failure the previous snapshot keeps serving. Returns True if
+        a new version went live.
+        """
+        with self._reload_lock:
+            self._reload_attempted = True
+            version, path = resolve_current(self.vector_store_path)
+            if version is None or not chunk_store_exists(path):
+                logger.warning(f"Vector store not found at {self.vector_store_path}. RAG will not work.")
+                return False
+            if self.snapshot and self.snapshot.version == version:
+                return False
 
-        if os.path.exists(index_file) and os.path.exists(chunks_file):
             try:
-                self.index = faiss.read_index(index_file)
-                with open(chunks_file, "rb") as f:
-                    self.chunks, self.metadata = pickle.load(f)
-                logger.info(f"Vector store loaded. {self.index.ntotal} documents indexed.")
+                snapshot = self._load_snapshot(version, path)
             except Exception as e:
-                logger.error(f"Failed to load vector store: {e}")
-                self.index = None
-        else:
-            logger.warning(f"Vector store not found at {self.vector_store_path}. RAG will not work.")
+                self.reload_failures += 1
+                logger.error(f"Failed to load vector store {version}: {e}")
+                return False
+
+            previous = self.snapshot
+            self.snapshot = snapshot
+            self.reloads += 1
+            logger.info(
+                f"Vector store {version} loaded. {snapshot.index.ntotal} documents indexed "
+                f"({snapshot.spec['type']}, {snapshot.spec.get('storage', 'float32')} vectors, {snapshot.load_mode})"
+                + (f", replacing {previous.version}." if previous else ".")
+            )
+            return True
 
-    def search(self, query: str) -> List[Dict]:
-        if not self.index:
+    def _load_snapshot(self, version: str, path: str) -> IndexSnapshot:
+        spec = load_index_spec(path)
+        index, load_mode = read_index(os.path.join(path, INDEX_FILE), spec, mmap=settings.INDEX_MMAP)
+        params = search_params(spec, settings.INDEX_NPROBE, settings.INDEX_EF_SEARCH, settings.INDEX_RESCORE_FACTOR)
+        apply_search_params(index, params)
+        enable_reconstruct(index, spec)
+        sparse_index = SparseIndex.open(path) if settings.HYBRID_SEARCH_ENABLED else None
+        partitions = {}
+        if settings.INTENT_ROUTING_ENABLED:
+            partitions = load_partitions(
+                path, settings.INDEX_MMAP, settings.INDEX_NPROBE, settings.INDEX_EF_SEARCH, settings.INDEX_RESCORE_FACTOR
+            )
+        return IndexSnapshot(version, path, index, spec, load_mode, params, open_chunk_store(path), sparse_index, partitions)
+
+    def _watch(self):
+        while not self._stop_watching.wait(settings.VECTOR_STORE_POLL_SECONDS):
+            try:
+                # Cheap manifest read; only a newly published version triggers a load
+                version, _ = resolve_current(self.vector_store_path)
+                if version is not None and version != self.index_version:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"Vector store watcher error: {e}")
+
+    def search(
+        self,
+        query: str,
+        query_vector: Optional[np.ndarray] = None,
+        categories: Optional[List[str]] = None,
+        top_k: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Searches only the given category sub-indexes when any are available,
+        falling back to the global index if they are not or return nothing.
+        `top_k` overrides the default result count (e.g. to over-fetch for reranking).
+        """
+        if self.snapshot is None and not self._reload_attempted:
+            self.reload()
+        # Read the reference once so a concurrent reload cannot mix two versions
+        snapshot = self.snapshot
+        if not snapshot:
             return []
 
-        query_vector = self.model.encode([query]).astype('float32')
-        faiss.normalize_L2(query_vector)
-        
-        distances, indices = self.index.search(query_vector, self.top_k)
+        if query_vector is None:
+            query_vector = self.embed_query(query)
+
+        top_k = top_k or self.top_k
+        routed = [c for c in (categories or []) if c in snapshot.partitions]
+        if routed:
+            results = self._search(snapshot, query, query_vector, routed, top_k)
+            if results:
+                return results
+        return self._search(snapshot, query, query_vector, [], top_k)
+
+    def _search(
+        self, snapshot: IndexSnapshot, query: str, query_vector: np.ndarray, categories: List[str], top_k: int
+    ) -> List[Dict]:
+        # Over-fetch from both sides when hybrid; RRF then keeps top_k
+        n_candidates = top_k
+        if snapshot.sparse_index:
+            n_candidates = max(top_k, settings.HYBRID_CANDIDATES)
+
+        allowed = None
+        if categories:
+            partitions = [snapshot.partitions[c] for c in categories]
+            indices, distances = search_partitions(partitions, query_vector, n_candidates)
+            allowed = lambda chunk_ids: np.logical_or.reduce([p.contains(chunk_ids) for p in partitions])
+        else:
+            distances, indices = snapshot.index.search(query_vector, n_candidates)
+            distances, indices = distances[0], indices[0]
+
+        sparse_ids, sparse_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if snapshot.sparse_index:
+            sparse_ids, sparse_scores = snapshot.sparse_index.search(query, n_candidates, allowed=allowed)
+
+        hits = reciprocal_rank_fusion(
+            indices, distances, sparse_ids, sparse_scores, top_k, self.threshold, settings.RRF_K,
+            settings.HYBRID_MIN_BM25, settings.HYBRID_MIN_BM25_RATIO,
+        )
         
+        # Hits only BM25 found get their dense similarity too, so confidence
+        # (the best score) reflects them
+        keyword_only = [hit for hit in hits if hit["score"] is None]
+        for hit, score in zip(keyword_only, dense_scores(snapshot.index, query_vector, [h["id"] for h in keyword_only])):
+            hit["score"] = score
+
         results = []
-        for i, idx in enumerate(indices[0]):
-            score = float(distances[0][i])
-            if idx == -1 or score < self.threshold:
-                continue
-                
+        for hit in hits:
+            idx = hit["id"]
             results.append({
-                "content": self.chunks[idx],
-                "metadata": self.metadata[idx],
-                "score": score
+                "id": idx,
+                "content": snapshot.chunk_store.text(idx),
+                "metadata": snapshot.chunk_store.metadata(idx),
+                "score": hit["score"] if hit["score"] is not None else 0.0,
+                "bm25": hit["bm25"],
             })
             
         return results
 
+    def embed_query(self, query: str) -> np.ndarray:
+        """Returns a normalized (1, dim) query vector; cache hits never reach the model."""
+        if self.model is None:
+            self.load_model()
+        cached = self.query_cache.get(query)
+        if cached is not None:
+            return cached.reshape(1, -1)
+
+        if self.batcher:
+            query_vector = self.batcher.encode(query).reshape(1, -1)
+        else:
+            query_vector = self.model.encode([query]).astype('float32')
+        faiss.normalize_L2(query_vector)
+        self.query_cache.put(query, query_vector[0])
+        return query_vector
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "indexed_chunks": snapshot.index.ntotal if snapshot else 0,
+            "index_version": snapshot.version if snapshot else None,
+            "index_type": snapshot.spec.get("type") if snapshot else None,
+            "index_storage": snapshot.spec.get("storage", "float32") if snapshot else None,
+            "index_recall": snapshot.spec.get("recall") if snapshot else None,
+            "index_load_mode": snapshot.load_mode if snapshot else None,
+            "index_reloads": self.reloads,
+            "index_reload_failures": self.reload_failures,
+            "hybrid_search": bool(snapshot and snapshot.sparse_index),
+            "partitions": {c: p.index.ntotal for c, p in snapshot.partitions.items()} if snapshot else {},
+            "index_search_params": snapshot.search_params if snapshot else {},
+            "embedding_backend": settings.EMBEDDING_BACKEND,
+            "embedding_batcher": self.batcher.stats() if self.batcher else None,
+            "embedding_server": self.model.stats() if isinstance(self.model, EmbeddingClient) else None,
+            "query_cache": self.query_cache.stats() if self.query_cache else None,
+        }
+
 # Global instance
 retriever = Retriever()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    work, callers arriving while it is in flight wait for its result (or its
+    exception) instead of repeating it. Nothing is kept once the call
+    finishes, so a failure is never cached: the next caller tries again.
+
+    Async calls run as a shared task. A cancelled caller (e.g. a client that
+    disconnected) stops waiting without cancelling the work for the others;
+    only when every caller has gone is the task itself cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._async_calls: Dict[Hashable, _AsyncCall] = {}  # only touched from the event loop
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.abandoned = 0
+
+    def run(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """fn()'s result, and whether this caller ran it (False: shared another caller's)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result(), False
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result, True
+
+    async def run_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """run() for coroutines: awaits the in-flight call for `key` or starts fn() as one."""
+        call = self._async_calls.get(key)
+        leader = call is None
+        if leader:
+            call = self._async_calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finish_async(key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # shield: cancelling this caller must not cancel the shared task
+            return await asyncio.shield(call.task), leader
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.abandoned += 1
+                call.task.cancel()
+                # Callers arriving before the cancellation lands start afresh
+                if self._async_calls.get(key) is call:
+                    del self._async_calls[key]
+
+    def _finish_async(self, key: Hashable, call: _AsyncCall):
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": in_flight + len(self._async_calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "abandoned": self.abandoned,
+            "coalesced_ratio": round(self.coalesced / calls, 3) if calls else 0.0,
+        }
@@ -0,0 +1,287 @@
+import json
+import mmap
+import os
+import pickle
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from app.core.logging import logger
+
+# On-disk layout written by rag/ingest.py (see rag/chunk_store.py for the writer)
+INDEX_FILE = "index.faiss"
+INDEX_SPEC_FILE = "index_config.json"
+TEXT_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+META_CODES_FILE = "chunks.meta.npy"
+META_VOCAB_FILE = "chunks.meta.json"
+SPANS_FILE = "chunks.spans.npy"
+LEGACY_CHUNKS_FILE = "chunks.pkl"
+PARTITIONS_DIR = "partitions"
+PARTITIONS_FILE = "partitions.json"
+
+# Versioned layout (rag/versions.py): builds live in versions/<version>/ and
+# CURRENT names the live one. Stores without CURRENT are read flat.
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "CURRENT"
+
+
+def resolve_current(vector_store_path: str) -> Tuple[Optional[str], str]:
+    """
+    Returns (version, directory) of the live build. Legacy flat stores get a
+    version derived from index.faiss's mtime and size.
+    """
+    manifest_file = os.path.join(vector_store_path, MANIFEST_FILE)
+    if os.path.exists(manifest_file):
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+        return manifest["version"], os.path.join(vector_store_path, manifest["path"])
+
+    index_file = os.path.join(vector_store_path, INDEX_FILE)
+    if os.path.exists(index_file):
+        stat = os.stat(index_file)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}", vector_store_path
+    return None, vector_store_path
+
+
+def load_index_spec(vector_store_path: str) -> Dict[str, Any]:
+    """Stores built before index specs existed are plain flat indexes."""
+    spec_file = os.path.join(vector_store_path, INDEX_SPEC_FILE)
+    if not os.path.exists(spec_file):
+        return {"type": "flat", "factory": "Flat", "metric": "inner_product", "params": {}, "search": {}}
+    with open(spec_file, "r") as f:
+        return json.load(f)
+
+
+def search_params(
+    spec: Dict[str, Any], nprobe: Optional[int] = None, ef_search: Optional[int] = None, rescore_factor: Optional[int] = None
+) -> Dict[str, Any]:
+    """Saved search params with any configured override for knobs this index type has."""
+    search = dict(spec.get("search", {}))
+    if "nprobe" in search and nprobe:
+        search["nprobe"] = nprobe
+    if "efSearch" in search and ef_search:
+        search["efSearch"] = ef_search
+    if "k_factor_rf" in search and rescore_factor:
+        search["k_factor_rf"] = rescore_factor
+    return search
+
+
+def apply_search_params(index: faiss.Index, search: Dict[str, Any]):
+    space = faiss.ParameterSpace()
+    for name, value in search.items():
+        if value is not None:
+            space.set_index_parameter(index, name, value)
+
+
+def _mmap_flags(index_type: str) -> int:
+    """
+    IO_FLAG_MMAP_IFC (faiss >= 1.9) maps flat/HNSW/IVF codes in place;
+    older builds can only map IVF inverted lists via IO_FLAG_MMAP.
+    """
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return 0
+
+
+def read_index(index_file: str, spec: Dict[str, Any], mmap: bool = True) -> Tuple[faiss.Index, str]:
+    """
+    Loads the index read-only and memory-mapped when the faiss build supports
+    it for this index type, so every worker on the node shares one copy of the
+    vectors through the page cache. Returns the index and "mmap" or "memory".
+    """
+    flags = _mmap_flags(spec.get("type", "flat")) if mmap else 0
+    if flags:
+        try:
+            return faiss.read_index(index_file, flags), "mmap"
+        except RuntimeError as e:
+            logger.warning(f"Memory-mapped index load failed ({e}); reading into memory.")
+    return faiss.read_index(index_file), "memory"
+
+
+def enable_reconstruct(index: faiss.Index, spec: Dict[str, Any]):
+    """
+    Lets `dense_scores` read vectors back by id. IVF codes are reachable by
+    id only through a direct map (id -> inverted list slot); flat, HNSW and
+    re-scored indexes reconstruct without one.
+    """
+    if spec.get("type") in ("ivf_flat", "ivf_pq") and not spec.get("rescore"):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def dense_scores(index: faiss.Index, query_vector: np.ndarray, ids: List[int]) -> List[Optional[float]]:
+    """
+    Similarity of the query to the stored vector of each of `ids` (None if
+    the index cannot return it), for hits only BM25 found. Approximate when
+    the stored codes are compressed.
+    """
+    scores: List[Optional[float]] = []
+    for i in ids:
+        try:
+            scores.append(float(index.reconstruct(int(i)) @ query_vector[0]))
+        except RuntimeError:
+            scores.append(None)
+    return scores
+
+
+class Partition:
+    """One category's sub-index plus the global chunk id of each of its rows."""
+
+    def __init__(self, index: faiss.Index, ids: np.ndarray, id_mapped: bool = False):
+        self.index = index
+        self.ids = ids
+        # Incrementally built sub-indexes return global chunk ids directly
+        self.id_mapped = id_mapped
+        # Chunk id -> in this category, built once at load for BM25 filtering
+        self.members = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=bool)
+        self.members[np.asarray(ids)] = True
+
+    def contains(self, chunk_ids: np.ndarray) -> np.ndarray:
+        inside = chunk_ids < len(self.members)
+        keep = np.zeros(len(chunk_ids), dtype=bool)
+        keep[inside] = self.members[chunk_ids[inside]]
+        return keep
+
+    def search(self, query_vector: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores, rows = self.index.search(query_vector, min(n, self.index.ntotal))
+        found = rows[0] >= 0
+        if self.id_mapped:
+            return rows[0][found], scores[0][found]
+        return self.ids[rows[0][found]], scores[0][found]
+
+
+def load_partitions(
+    vector_store_path: str,
+    mmap: bool = True,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    rescore_factor: Optional[int] = None,
+) -> Dict[str, Partition]:
+    path = os.path.join(vector_store_path, PARTITIONS_DIR)
+    manifest_file = os.path.join(path, PARTITIONS_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    partitions = {}
+    for category, entry in manifest.items():
+        index, _ = read_index(os.path.join(path, f"{category}.faiss"), entry["spec"], mmap=mmap)
+        apply_search_params(index, search_params(entry["spec"], nprobe, ef_search, rescore_factor))
+        ids = np.load(os.path.join(path, f"{category}.ids.npy"), mmap_mode="r")
+        partitions[category] = Partition(index, ids, entry["spec"].get("id_mapped", False))
+    return partitions
+
+
+def search_partitions(partitions: List[Partition], query_vector: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merged (ids, scores) top-n over several partitions, best first."""
+    results = [p.search(query_vector, n) for p in partitions]
+    ids = np.concatenate([r[0] for r in results])
+    scores = np.concatenate([r[1] for r in results])
+    order = np.argsort(-scores, kind="stable")[:n]
+    return ids[order], scores[order]
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a columnar chunk store. Nothing is
+    decoded until `get` is called, and the pages are shared between
+    processes through the OS page cache.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_VOCAB_FILE), "r") as f:
+            meta = json.load(f)
+        self.columns: List[str] = meta["columns"]
+        self._vocab: List[List[str]] = meta["vocab"]
+        self._decoded: List[Dict[int, Any]] = [{} for _ in self.columns]
+
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, META_CODES_FILE), mmap_mode="r")
+        spans_file = os.path.join(path, SPANS_FILE)
+        self.spans = np.load(spans_file, mmap_mode="r") if os.path.exists(spans_file) else None
+
+        self._file = open(os.path.join(path, TEXT_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._text = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        row = self.codes[i]
+        meta = {}
+        for column, code in enumerate(row):
+            if code < 0:
+                continue
+            cache = self._decoded[column]
+            if code not in cache:
+                cache[code] = json.loads(self._vocab[column][code])
+            meta[self.columns[column]] = cache[code]
+        return meta
+
+    def span(self, i: int) -> Optional[Tuple[int, int]]:
+        """[start, end) character span of chunk `i` in its document, None if not recorded."""
+        if self.spans is None or self.spans[i, 0] < 0:
+            return None
+        return int(self.spans[i, 0]), int(self.spans[i, 1])
+
+    def get(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        return self.text(i), self.metadata(i)
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._file.close()
+
+
+class InMemoryChunkStore:
+    """Same interface over the legacy `chunks.pkl` (chunks, metadata) tuple."""
+
+    def __init__(self, chunks: List[str], metadata: List[Dict[str, Any]]):
+        self.chunks = chunks
+        self.metadata_rows = metadata
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def text(self, i: int) -> str:
+        return self.chunks[i]
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return self.metadata_rows[i]
+
+    def span(self, i: int) -> Optional[Tuple[int, int]]:
+        return None
+
+    def get(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        return self.text(i), self.metadata(i)
+
+    def close(self):
+        pass
+
+
+def chunk_store_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_VOCAB_FILE)) or os.path.exists(os.path.join(path, LEGACY_CHUNKS_FILE))
+
+
+def open_chunk_store(path: str):
+    """Opens the columnar store, falling back to a legacy chunks.pkl; None if neither exists."""
+    if os.path.exists(os.path.join(path, META_VOCAB_FILE)):
+        return ChunkStore(path)
+
+    legacy_file = os.path.join(path, LEGACY_CHUNKS_FILE)
+    if os.path.exists(legacy_file):
+        with open(legacy_file, "rb") as f:
+            chunks, metadata = pickle.load(f)
+        return InMemoryChunkStore(chunks, metadata)
+    return None
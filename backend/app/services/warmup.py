@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# Run once through embedding, search and rerank so the first real request does
+# not pay for lazy kernel init, allocator growth or cold index pages.
+WARMUP_QUERIES = [
+    "What is the tuition fee for the first year?",
+    "hostel accommodation and mess facilities",
+    "admission deadline and eligibility criteria",
+]
+
+# Component states reported by /ready
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+MISSING = "missing"    # nothing to load yet (e.g. no vector store published)
+DISABLED = "disabled"  # turned off in settings / no credentials
+
+
+class WarmUp:
+    """
+    Loads the heavy components in a background thread after the server has
+    bound its port: embedding model, vector store, LLM client, optional
+    reranker, then a few synthetic queries. Chat requests are admitted once
+    the embedding model is up and every step has been attempted; `status`
+    backs the /ready endpoint.
+    """
+
+    COMPONENTS = ("embedding_model", "vector_store", "llm_client", "reranker", "warm_queries")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {name: {"state": PENDING} for name in self.COMPONENTS}
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def run(self):
+        # Imported here so importing this module (from app.main) stays cheap
+        from app.services.chat_orchestrator import orchestrator
+        from app.services.llm_engine import llm_engine
+        from app.services.retriever import retriever
+
+        self._step("embedding_model", lambda: retriever.load_model() or READY)
+        self._step("vector_store", lambda: self._load_vector_store(retriever))
+        self._step("llm_client", lambda: READY if llm_engine.warm_up() else DISABLED)
+        self._step("reranker", lambda: (READY if orchestrator.load_reranker() else FAILED) if settings.RERANK_ENABLED else DISABLED)
+        if self._components["embedding_model"]["state"] == READY:
+            self._step("warm_queries", lambda: self._warm_queries(retriever, orchestrator))
+        else:
+            self._set("warm_queries", DISABLED)
+        self._done.set()
+        logger.info(f"Warm-up finished in {time.time() - self.started_at:.1f}s: {self.status()['components']}")
+
+    @staticmethod
+    def _load_vector_store(retriever) -> str:
+        retriever.reload()
+        # The watcher keeps polling, so a store published later still goes live
+        retriever.start_watcher()
+        return READY if retriever.index is not None else MISSING
+
+    @staticmethod
+    def _warm_queries(retriever, orchestrator) -> str:
+        # Straight to the model and index: synthetic queries stay out of the caches and stats
+        vectors = retriever.model.encode(WARMUP_QUERIES, batch_size=len(WARMUP_QUERIES))
+        if retriever.index is None:
+            return READY
+        for query, vector in zip(WARMUP_QUERIES, vectors):
+            query_vector = vector.reshape(1, -1).astype("float32")
+            query_vector /= max(float((query_vector ** 2).sum()) ** 0.5, 1e-12)
+            docs = retriever.search(query, query_vector=query_vector)
+            if orchestrator.reranker and docs:
+                orchestrator.reranker.model.predict([(query, doc["content"]) for doc in docs])
+        return READY
+
+    def _step(self, name: str, load: Callable[[], str]):
+        self._set(name, WARMING)
+        start = time.perf_counter()
+        try:
+            state, error = load(), None
+        except Exception as e:
+            state, error = FAILED, f"{type(e).__name__}: {e}"
+            logger.error(f"Warm-up of {name} failed: {error}")
+        self._set(name, state, seconds=round(time.perf_counter() - start, 3), error=error)
+
+    def _set(self, name: str, state: str, **details):
+        with self._lock:
+            self._components[name] = {"state": state, **{k: v for k, v in details.items() if v is not None}}
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self._components["embedding_model"]["state"] == READY
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks up to `timeout` seconds for warm-up to finish; True if ready."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(state) for name, state in self._components.items()}
+        return {
+            "ready": self.ready,
+            "warming_up": self._thread is not None and not self._done.is_set(),
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "components": components,
+        }
+
+
+warmup = WarmUp()
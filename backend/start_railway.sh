@@ -31,6 +31,17 @@ echo "  SECRET_KEY: ${SECRET_KEY:0:10}... ✓"
 echo "  PORT: ${PORT:-8000}"
 echo ""
 
+# Optional shared embedding server: one model copy for all uvicorn workers
+if [ -n "$EMBEDDING_SERVER_SOCKET" ]; then
+    echo "🧠 Starting embedding server on $EMBEDDING_SERVER_SOCKET..."
+    python -m app.services.embedding_server --socket "$EMBEDDING_SERVER_SOCKET" &
+    # Let it bind before the workers warm up, or each would load its own fallback copy
+    for i in $(seq 1 120); do
+        [ -S "$EMBEDDING_SERVER_SOCKET" ] && break
+        sleep 1
+    done
+fi
+
 # Start uvicorn
 echo "🎯 Starting Uvicorn on port ${PORT:-8000}..."
 exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}
@@ -0,0 +1,62 @@
+"""Unit tests for the semantic answer cache (run with pytest from backend/)."""
+import numpy as np
+
+from app.services import answer_cache
+from app.services.answer_cache import SemanticAnswerCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype="float32")
+    return vector / np.linalg.norm(vector)
+
+
+def store(cache, vector, answer, version="v1"):
+    cache.store(vector, answer, sources=[{"source": "fees.pdf"}], confidence=0.9, doc_count=1, index_version=version)
+
+
+def test_close_query_hits_and_distant_query_misses():
+    cache = SemanticAnswerCache(max_distance=0.05)
+    store(cache, unit(1, 0, 0), "fees answer")
+    hit = cache.lookup(unit(1, 0.1, 0), "v1")
+    assert hit["answer"] == "fees answer" and hit["sources"] == [{"source": "fees.pdf"}]
+    assert hit["similarity"] > 0.95
+    assert cache.lookup(unit(1, 1, 0), "v1") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_new_index_version_drops_every_answer():
+    cache = SemanticAnswerCache()
+    store(cache, unit(1, 0), "old answer")
+    assert cache.lookup(unit(1, 0), "v2") is None
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 1
+    store(cache, unit(1, 0), "new answer", version="v2")
+    assert cache.lookup(unit(1, 0), "v2")["answer"] == "new answer"
+
+
+def test_expired_answer_is_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    store(cache, unit(1, 0), "answer")
+    now[0] += 61
+    assert cache.lookup(unit(1, 0), "v1") is None
+    assert cache.stats()["size"] == 0 and cache.stats()["evictions"] == 1
+
+
+def test_least_recently_used_answer_is_evicted_and_its_slot_reused():
+    cache = SemanticAnswerCache(max_size=2)
+    store(cache, unit(1, 0, 0), "a")
+    store(cache, unit(0, 1, 0), "b")
+    cache.lookup(unit(1, 0, 0), "v1")
+    store(cache, unit(0, 0, 1), "c")
+    assert cache.lookup(unit(0, 1, 0), "v1") is None
+    assert cache.lookup(unit(1, 0, 0), "v1")["answer"] == "a"
+    assert cache.lookup(unit(0, 0, 1), "v1")["answer"] == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_clears_the_cache():
+    cache = SemanticAnswerCache()
+    store(cache, unit(1, 0), "answer")
+    cache.invalidate()
+    assert cache.lookup(unit(1, 0), "v1") is None
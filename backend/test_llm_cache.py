@@ -0,0 +1,141 @@
+"""Unit tests for the LLM response cache (run with pytest from backend/)."""
+import sqlite3
+
+import pytest
+
+from app.services import llm_cache
+from app.services.llm_cache import (
+    DictRedis,
+    LLMResponseCache,
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+    response_key,
+)
+
+V1 = "20250101T000000-aaaaaa"
+V2 = "20250102T000000-bbbbbb"
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_size=16)
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_size=16)
+    return RedisBackend(DictRedis())
+
+
+def test_response_key_covers_prompt_and_sampling():
+    key = response_key("m", 0.1, 100, "prompt")
+    assert key == response_key("m", 0.1, 100, "prompt")
+    assert key != response_key("m", 0.2, 100, "prompt")
+    assert key != response_key("m", 0.1, 100, "prompt!")
+
+
+def test_hit_counts_tokens_and_cost_saved(backend):
+    cache = LLMResponseCache(backend, cost_per_1k_input=1.0, cost_per_1k_output=2.0)
+    assert cache.get("k", V1) is None
+    cache.put("k", V1, "answer", input_tokens=500, output_tokens=250)
+    assert cache.get("k", V1)["answer"] == "answer"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+    assert stats["cost_saved"] == 1.0
+
+
+def test_entries_are_scoped_to_their_index_version(backend):
+    cache = LLMResponseCache(backend)
+    cache.put("k", V1, "old", 1, 1)
+    assert cache.get("k", V2) is None
+    cache.put("k", V2, "new", 1, 1)
+    assert cache.get("k", V2)["answer"] == "new"
+
+
+def test_newer_version_prunes_older_ones():
+    backend = MemoryBackend()
+    cache = LLMResponseCache(backend)
+    cache.put("k", V1, "old", 1, 1)
+    cache.get("k", V2)
+    assert backend.get(V1, "k") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_workers_on_different_versions_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    lagging, current = LLMResponseCache(SQLiteBackend(path)), LLMResponseCache(SQLiteBackend(path))
+    current.put("k", V2, "new", 1, 1)
+    # A worker that has not polled CURRENT yet writes and reads its own version...
+    lagging.put("k", V1, "old", 1, 1)
+    assert lagging.get("k", V1)["answer"] == "old"
+    # ...without deleting the newer version's rows
+    assert current.get("k", V2)["answer"] == "new"
+    # Once it moves to the newer version, only the older rows go
+    assert lagging.get("k", V2)["answer"] == "new"
+    assert lagging.backend.get(V1, "k") is None
+
+
+def test_worker_without_a_store_does_not_prune(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    loaded, empty = LLMResponseCache(SQLiteBackend(path)), LLMResponseCache(SQLiteBackend(path))
+    loaded.put("k", V1, "answer", 1, 1)
+    assert empty.get("k", None) is None
+    empty.put("k", None, "unscoped", 1, 1)
+    assert loaded.get("k", V1)["answer"] == "answer"
+    assert empty.get("k", None)["answer"] == "unscoped"
+
+
+def test_sqlite_drops_a_table_without_version_column(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE llm_cache (key TEXT PRIMARY KEY, entry TEXT, expires_at REAL, used_at REAL)")
+    conn.execute("INSERT INTO llm_cache VALUES ('x', '{}', 0, 0)")
+    conn.commit()
+    conn.close()
+    backend = SQLiteBackend(path)
+    assert backend.size() == 0
+    backend.set(V1, "k", {"answer": "a"}, 60)
+    assert backend.get(V1, "k") == {"answer": "a"}
+
+
+def test_sqlite_evicts_least_recently_read(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_size=2)
+    backend.set(V1, "a", {"n": 1}, 60)
+    backend.set(V1, "b", {"n": 2}, 60)
+    backend.get(V1, "a")
+    backend.set(V1, "c", {"n": 3}, 60)
+    assert backend.get(V1, "b") is None
+    assert backend.get(V1, "a") == {"n": 1}
+    assert backend.evictions == 1
+
+
+def test_dict_redis_expires_keys(monkeypatch):
+    client = DictRedis()
+    client.set("k", "v", ex=10)
+    assert client.get("k") == b"v"
+    now = llm_cache.time.time()
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now + 11)
+    assert client.get("k") is None
+
+
+def test_backend_errors_count_as_misses():
+    class Broken:
+        shared = True
+        evictions = 0
+
+        def get(self, version, key):
+            raise ConnectionError("down")
+
+        def set(self, version, key, entry, ttl_seconds):
+            raise ConnectionError("down")
+
+        def prune_versions_before(self, version):
+            raise ConnectionError("down")
+
+        def size(self):
+            raise ConnectionError("down")
+
+    cache = LLMResponseCache(Broken())
+    cache.put("k", V1, "answer", 1, 1)
+    assert cache.get("k", V1) is None
+    stats = cache.stats()
+    assert (stats["errors"], stats["misses"], stats["size"]) == (2, 1, None)
@@ -0,0 +1,35 @@
+"""Unit tests for the LLM engine's client and concurrency setup (run with pytest from backend/)."""
+import asyncio
+
+from app.core.config import settings
+from app.services.llm_engine import LLMEngine
+
+
+def test_concurrency_limit_is_created_inside_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 2)
+    engine = LLMEngine()
+    assert engine._semaphore is None
+
+    async def run():
+        async with engine._limiter():
+            assert engine._limiter() is engine._semaphore
+            return engine._semaphore._value
+
+    assert asyncio.run(run()) == 1
+
+
+def test_available_does_not_create_the_client(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", "key")
+    engine = LLMEngine()
+    engine.provider = "mistral"
+    assert engine.available
+    assert not engine._initialized and engine.mistral_client is None
+
+
+def test_available_follows_the_client_once_warmed_up(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", None)
+    engine = LLMEngine()
+    engine.provider = "mistral"
+    assert not engine.available
+    assert engine.warm_up() is False
+    assert not engine.available
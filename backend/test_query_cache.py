@@ -0,0 +1,59 @@
+"""Unit tests for the query embedding cache (run with pytest from backend/)."""
+import numpy as np
+
+from app.services.embedding_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_trivially_different_phrasings_share_a_key():
+    assert normalize_query("What are the hostel fees?") == normalize_query("what are the  hostel fees")
+    assert normalize_query("  Fees,\tplease! ") == "fees please"
+
+
+def test_hit_returns_a_copy_of_the_stored_vector():
+    cache = QueryEmbeddingCache()
+    assert cache.get("Hostel fees?") is None
+    cache.put("Hostel fees?", np.array([[1, 2, 3]]))
+    vector = cache.get("hostel fees")
+    assert vector.dtype == np.float32 and vector.tolist() == [1, 2, 3]
+    vector[0] = 99
+    assert cache.get("hostel fees")[0] == 1
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", np.zeros(2))
+    cache.put("b", np.ones(2))
+    cache.get("a")
+    cache.put("c", np.ones(2))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_spill_warm_starts_a_new_process_in_lru_order(tmp_path):
+    path = str(tmp_path / "cache" / "queries.npz")
+    cache = QueryEmbeddingCache(max_size=3, spill_path=path, model_name="m")
+    for i, query in enumerate(["a", "b", "c"]):
+        cache.put(query, np.full(2, i))
+    cache.get("a")
+    cache.save()
+
+    restarted = QueryEmbeddingCache(max_size=2, spill_path=path, model_name="m")
+    # Only the two most recently used survive the smaller cache
+    assert restarted.get("b") is None
+    assert restarted.get("c").tolist() == [2, 2] and restarted.get("a").tolist() == [0, 0]
+
+
+def test_spill_from_another_model_is_ignored(tmp_path):
+    path = str(tmp_path / "queries.npz")
+    cache = QueryEmbeddingCache(spill_path=path, model_name="old")
+    cache.put("a", np.ones(2))
+    cache.save()
+    assert QueryEmbeddingCache(spill_path=path, model_name="new").stats()["size"] == 0
+
+
+def test_unreadable_spill_is_ignored(tmp_path):
+    path = tmp_path / "queries.npz"
+    path.write_bytes(b"not an npz file")
+    assert QueryEmbeddingCache(spill_path=str(path)).stats()["size"] == 0
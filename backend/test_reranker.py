@@ -0,0 +1,84 @@
+"""Unit tests for cross-encoder reranking and its score cache (run with pytest from backend/)."""
+import sys
+import types
+
+import pytest
+
+from app.services.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words the chunk contains; records every batch."""
+
+    def __init__(self, model_name):
+        self.batches = []
+        self.fail = False
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        if self.fail:
+            raise RuntimeError("model crashed")
+        self.batches.append(len(pairs))
+        return [sum(word in content.split() for word in query.lower().split()) for query, content in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.CrossEncoder = FakeCrossEncoder
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    return CrossEncoderReranker("fake", budget_ms=1000.0, cache_size=4)
+
+
+DOCS = [
+    {"id": 1, "content": "library hours"},
+    {"id": 2, "content": "hostel fees and hostel rules"},
+    {"id": 3, "content": "hostel fees"},
+]
+
+
+def test_docs_are_sorted_by_score_and_cut_to_top_k(reranker):
+    ranked, reranked = reranker.rerank("Hostel fees", DOCS, top_k=2)
+    assert reranked
+    assert [d["id"] for d in ranked] == [2, 3]
+    assert [d["rerank_score"] for d in ranked] == [2.0, 2.0]
+    assert reranker.model.batches == [3]
+
+
+def test_cached_scores_are_reused_for_the_same_normalized_query(reranker):
+    reranker.rerank("Hostel fees?", DOCS[:2], top_k=3, index_version="v1")
+    ranked, _ = reranker.rerank("hostel  fees", DOCS, top_k=3, index_version="v1")
+    # Only the chunk not seen before goes through the model
+    assert reranker.model.batches == [2, 1]
+    assert reranker.stats()["cache_hits"] == 2 and reranker.stats()["cache_misses"] == 3
+    assert {d["id"] for d in ranked} == {1, 2, 3}
+
+
+def test_new_index_version_does_not_reuse_scores(reranker):
+    reranker.rerank("hostel fees", DOCS, top_k=3, index_version="v1")
+    reranker.rerank("hostel fees", DOCS, top_k=3, index_version="v2")
+    assert reranker.model.batches == [3, 3]
+
+
+def test_score_cache_is_bounded(reranker):
+    reranker.rerank("hostel fees", DOCS, top_k=3)
+    reranker.rerank("library", DOCS, top_k=3)
+    assert reranker.stats()["cache_size"] == 4
+    # The two oldest scores were evicted and are computed again
+    reranker.rerank("hostel fees", DOCS, top_k=3)
+    assert reranker.model.batches == [3, 3, 2]
+
+
+def test_over_budget_keeps_vector_order(reranker):
+    reranker.rerank("hostel fees", DOCS[:1], top_k=3)
+    reranker._ms_per_pair = 600.0
+    docs, reranked = reranker.rerank("library", DOCS, top_k=1)
+    assert not reranked and docs == DOCS
+    assert reranker.stats()["skipped_over_budget"] == 1
+    assert reranker._ms_per_pair < 600.0
+
+
+def test_model_failure_keeps_vector_order(reranker):
+    reranker.model.fail = True
+    docs, reranked = reranker.rerank("hostel fees", DOCS, top_k=1)
+    assert not reranked and docs == DOCS
+    assert reranker.stats()["cache_size"] == 0
@@ -0,0 +1,169 @@
+"""Unit tests for request coalescing (run with pytest from backend/)."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+
+def _run_in_thread(flight, key, fn, results):
+    def target():
+        try:
+            results.append(flight.run(key, fn))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_concurrent_calls_share_one_run():
+    flight, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    leader = _run_in_thread(flight, "q", work, results)
+    _wait_for(lambda: calls)
+    follower = _run_in_thread(flight, "q", work, results)
+    _wait_for(lambda: flight.coalesced == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False), ("answer", True)]
+    assert len(calls) == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.run("a", lambda: 1) == (1, True)
+    assert flight.run("b", lambda: 2) == (2, True)
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_error_reaches_every_caller_and_is_not_kept():
+    flight, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("provider down")
+
+    leader = _run_in_thread(flight, "q", work, results)
+    _wait_for(lambda: calls)
+    follower = _run_in_thread(flight, "q", work, results)
+    _wait_for(lambda: flight.coalesced == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert flight.errors == 1
+    # The failure is not cached: the next caller runs the work again
+    assert flight.run("q", lambda: "retried") == ("retried", True)
+
+
+def test_async_calls_share_one_task():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.run_async("q", work) for _ in range(3)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(leader for _, leader in results) == [False, False, True]
+    assert {answer for answer, _ in results} == {"answer"}
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_error_reaches_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("provider down")
+
+        results = await asyncio.gather(*(flight.run_async("q", work) for _ in range(2)), return_exceptions=True)
+        retry = await flight.run_async("q", lambda: asyncio.sleep(0, result="retried"))
+        return flight, results, retry
+
+    flight, results, retry = asyncio.run(scenario())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert flight.errors == 1
+    assert retry == ("retried", True)
+
+
+def test_cancelled_leader_leaves_the_work_running_for_others():
+    async def scenario():
+        flight, release, finished = SingleFlight(), asyncio.Event(), []
+
+        async def work():
+            await release.wait()
+            finished.append(1)
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.run_async("q", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.run_async("q", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return flight, finished, await follower
+
+    flight, finished, result = asyncio.run(scenario())
+    assert result == ("answer", False)
+    assert finished == [1]
+    assert flight.abandoned == 0
+
+
+def test_work_is_cancelled_when_every_caller_is_gone():
+    async def scenario():
+        flight, cancelled = SingleFlight(), []
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        callers = [asyncio.ensure_future(flight.run_async("q", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # A caller arriving afterwards starts afresh instead of joining the cancelled task
+        fresh = await flight.run_async("q", lambda: asyncio.sleep(0, result="fresh"))
+        return flight, cancelled, fresh
+
+    flight, cancelled, fresh = asyncio.run(scenario())
+    assert cancelled == [1]
+    assert flight.abandoned == 1
+    assert fresh == ("fresh", True)
+    assert flight.stats()["in_flight"] == 0
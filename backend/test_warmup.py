@@ -0,0 +1,137 @@
+"""Unit tests for startup warm-up, /ready and request admission (run with pytest from backend/)."""
+import json
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app.main as main
+from app.api import deps
+from app.core.config import settings
+from app.services.warmup import DISABLED, FAILED, MISSING, READY, WarmUp
+
+
+class FakeRetriever:
+    def __init__(self, has_index=True):
+        self.model = None
+        self.index = None
+        self.has_index = has_index
+        self.release = threading.Event()
+        self.release.set()
+        self.searched = []
+
+    def load_model(self):
+        self.release.wait(5)
+        self.model = types.SimpleNamespace(encode=lambda queries, batch_size: np.ones((len(queries), 4)))
+
+    def reload(self):
+        self.index = object() if self.has_index else None
+
+    def start_watcher(self):
+        pass
+
+    def search(self, query, query_vector):
+        self.searched.append(query)
+        return [{"content": "fees"}]
+
+
+@pytest.fixture
+def services(monkeypatch):
+    """Stand-ins for the modules WarmUp.run imports, so no model or index is loaded."""
+    retriever = FakeRetriever()
+    fakes = {
+        "app.services.retriever": {"retriever": retriever},
+        "app.services.llm_engine": {"llm_engine": types.SimpleNamespace(warm_up=lambda: False)},
+        "app.services.chat_orchestrator": {
+            "orchestrator": types.SimpleNamespace(reranker=None, load_reranker=lambda: False)
+        },
+    }
+    for name, attributes in fakes.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        monkeypatch.setitem(sys.modules, name, module)
+    return retriever
+
+
+def states(warmup):
+    return {name: component["state"] for name, component in warmup.status()["components"].items()}
+
+
+def test_every_step_is_attempted_and_the_queries_run(services):
+    warmup = WarmUp()
+    warmup.start()
+    assert warmup.wait(5)
+    assert states(warmup) == {
+        "embedding_model": READY,
+        "vector_store": READY,
+        "llm_client": DISABLED,
+        "reranker": DISABLED,
+        "warm_queries": READY,
+    }
+    assert len(services.searched) == 3
+    assert not warmup.status()["warming_up"]
+
+
+def test_not_ready_while_the_embedding_model_loads(services):
+    services.release.clear()
+    warmup = WarmUp()
+    warmup.start()
+    assert not warmup.wait(0.05)
+    status = warmup.status()
+    assert status["warming_up"] and not status["ready"]
+    services.release.set()
+    assert warmup.wait(5)
+
+
+def test_missing_vector_store_still_serves(services):
+    services.has_index = False
+    warmup = WarmUp()
+    warmup.start()
+    assert warmup.wait(5)
+    assert states(warmup)["vector_store"] == MISSING
+    assert services.searched == []
+
+
+def test_failed_embedding_model_is_reported_and_never_ready(services):
+    def fail():
+        raise RuntimeError("no weights")
+
+    services.load_model = fail
+    warmup = WarmUp()
+    warmup.start()
+    assert not warmup.wait(5)
+    assert not warmup.status()["warming_up"]
+    components = warmup.status()["components"]
+    assert components["embedding_model"]["state"] == FAILED
+    assert components["embedding_model"]["error"] == "RuntimeError: no weights"
+    assert components["warm_queries"]["state"] == DISABLED
+
+
+def test_ready_endpoint_returns_503_until_warm(services, monkeypatch):
+    warmup = WarmUp()
+    monkeypatch.setattr(main, "warmup", warmup)
+    response = main.readiness_check()
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.WARMUP_RETRY_AFTER_SECONDS)
+    assert json.loads(response.body)["components"]["embedding_model"]["state"] == "pending"
+
+    warmup.start()
+    warmup.wait(5)
+    assert main.readiness_check()["ready"]
+
+
+def test_chat_is_admitted_only_once_warm(services, monkeypatch):
+    warmup = WarmUp()
+    monkeypatch.setattr(deps, "warmup", warmup)
+    monkeypatch.setattr(settings, "WARMUP_QUEUE_SECONDS", 0.01)
+    with pytest.raises(HTTPException) as excinfo:
+        deps.require_warm()
+    assert excinfo.value.status_code == 503
+    assert "Retry-After" in excinfo.value.headers
+
+    warmup.start()
+    warmup.wait(5)
+    deps.require_warm()
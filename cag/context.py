@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class ConversationManager:
     def __init__(self, max_history: int = 3):
@@ -14,15 +14,17 @@ class ConversationManager:
         if len(self.history) > self.max_history * 2:
             self.history = self.history[-(self.max_history * 2):]
 
+    def get_history_lines(self) -> List[str]:
+        return [f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in self.history]
+
     def get_history_string(self) -> str:
-        formatted = ""
-        for turn in self.history:
-            role = "User" if turn["role"] == "user" else "Assistant"
-            formatted += f"{role}: {turn['content']}\n"
-        return formatted
+        return "".join(f"{line}\n" for line in self.get_history_lines())
 
     def set_role(self, role: str):
         self.user_role = role
 
-    def get_context_block(self) -> str:
-        return f"User Role: {self.user_role}\nPrevious Conversation:\n{self.get_history_string()}"
+    def get_context_block(self, history_lines: Optional[List[str]] = None) -> str:
+        """`history_lines` replaces the full history (e.g. what fit the prompt budget)."""
+        lines = self.get_history_lines() if history_lines is None else history_lines
+        history = "".join(f"{line}\n" for line in lines)
+        return f"User Role: {self.user_role}\nPrevious Conversation:\n{history}"
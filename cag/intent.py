@@ -1,32 +1,57 @@
-from typing import List, Dict
+import re
+from typing import Tuple
+
+# Keyword map for heuristic classification, shared with the backend's
+# intent router (app/services/intent_router.py).
+# In a real system, this could be a zero-shot classifier or BERT model
+INTENT_KEYWORDS = {
+    "fees": ["fee", "cost", "tuition", "payment", "price"],
+    "admissions": ["admission", "apply", "application", "deadline", "enroll"],
+    "courses": ["course", "syllabus", "curriculum", "subject", "program", "degree"],
+    "eligibility": ["eligible", "criteria", "requirement", "mark", "grade", "score"],
+    "exam": ["exam", "test", "schedule", "date", "midterm", "final"],
+    "faculty": ["faculty", "professor", "teacher", "staff", "dean"],
+    "hostel": ["hostel", "accommodation", "dorm", "room", "mess"],
+    "placement": ["placement", "job", "career", "salary", "package", "recruiter"],
+    "rules": ["rule", "policy", "regulation", "code of conduct", "ragging"],
+    "greeting": ["hi", "hello", "hey", "good morning", "good evening"],
+}
+
+# Whole words, optionally plural: "hi" must not match "history", nor "mark" "marketing"
+_PATTERNS = {
+    intent: [re.compile(r"\b" + re.escape(k) + r"s?\b") for k in keywords]
+    for intent, keywords in INTENT_KEYWORDS.items()
+}
+
+
+def classify_intent(query: str) -> Tuple[str, float]:
+    """
+    Returns (intent, confidence), where confidence is the share of matched
+    keywords that belong to the winning intent. "hostel fees" splits 50/50;
+    "hostel room rent" is all hostel.
+    """
+    query_lower = query.lower()
+    hits = {
+        intent: sum(1 for p in patterns if p.search(query_lower))
+        for intent, patterns in _PATTERNS.items()
+    }
+    total = sum(hits.values())
+    if total == 0:
+        return "general_query", 0.0
+    intent = max(hits, key=hits.get)
+    return intent, hits[intent] / total
+
 
 class IntentClassifier:
     def __init__(self):
-        # Basic keyword maps for heuristic classification
-        # In a real system, this could be a zero-shot classifier or BERT model
-        self.intent_keywords = {
-            "fees": ["fee", "cost", "tuition", "payment", "price"],
-            "admissions": ["admission", "apply", "application", "deadline", "enroll"],
-            "courses": ["course", "syllabus", "curriculum", "subject", "program", "degree"],
-            "eligibility": ["eligible", "criteria", "requirement", "mark", "grade", "score"],
-            "exam": ["exam", "test", "schedule", "date", "midterm", "final"],
-            "faculty": ["faculty", "professor", "teacher", "staff", "dean"],
-            "hostel": ["hostel", "accommodation", "dorm", "room", "mess"],
-            "placement": ["placement", "job", "career", "salary", "package", "recruiter"],
-            "rules": ["rule", "policy", "regulation", "code of conduct", "ragging"],
-            "greeting": ["hi", "hello", "hey", "good morning", "good evening"]
-        }
-        
+        self.intent_keywords = INTENT_KEYWORDS
+
     def detect_intent(self, query: str) -> str:
-        query_lower = query.lower()
-        
-        # Check specific keywords
-        for intent, keywords in self.intent_keywords.items():
-            if any(k in query_lower for k in keywords):
-                return intent
-                
-        # Fallback
-        return "general_query"
+        # Falls back to "general_query" when no keyword matches
+        return classify_intent(query)[0]
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        return classify_intent(query)
 
     def is_safe(self, query: str) -> bool:
         """
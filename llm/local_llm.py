@@ -1,6 +1,8 @@
 import os
 import yaml
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
+
+from llm.prompt_budget import PackedContext, PromptBudget, estimate_tokens
 
 try:
     from llama_cpp import Llama
@@ -16,6 +18,13 @@ class LocalLLM:
         self.context_window = self.config["llm"]["context_window"]
         self.max_tokens = self.config["llm"]["max_new_tokens"]
         self.temp = self.config["llm"]["temperature"]
+        self.budget = PromptBudget(
+            self._count_tokens,
+            self.context_window,
+            self.max_tokens,
+            input_budget=self.config["llm"].get("input_token_budget"),
+            history_budget=self.config["llm"].get("history_token_budget", 512),
+        )
         
         self.llm = None
         # Lazy load or load on init depending on preference.
@@ -34,11 +43,24 @@ class LocalLLM:
             print(f"Warning: LLM model not found at {self.model_path} or llama-cpp-python not installed.")
             print("The system will function in Retrieval-Only mode or fail gracefully.")
 
-    def generate_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+    def _count_tokens(self, text: str) -> int:
         if not self.llm:
-            return "Error: Local LLM is not loaded. Please check your model path and installation."
+            return estimate_tokens(text)
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
 
-        prompt = f"""
+    def pack_context(
+        self, system_prompt: str, user_query: str, history: List[str], chunks: List[str], context: str = ""
+    ) -> PackedContext:
+        """
+        History lines and chunks (best first) that fit the context window next
+        to max_new_tokens. `context` is the context block rendered without
+        history lines, so its header counts against the budget too.
+        """
+        return self.budget.pack(self._build_prompt(system_prompt, user_query, context, ""), history, chunks)
+
+    @staticmethod
+    def _build_prompt(system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+        return f"""
 {system_prompt}
 
 CONTEXT:
@@ -55,6 +77,12 @@ INSTRUCTIONS:
 - Use bullet points if needed
 - Do not guess
 """
+
+    def generate_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+        if not self.llm:
+            return "Error: Local LLM is not loaded. Please check your model path and installation."
+
+        prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
         try:
             output = self.llm(
                 prompt,
@@ -67,5 +95,32 @@ INSTRUCTIONS:
         except Exception as e:
             return f"Error generating response: {str(e)}"
 
+    def stream_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> Iterator[str]:
+        """Like generate_response, but yields the text piece by piece as llama.cpp decodes it."""
+        if not self.llm:
+            yield "Error: Local LLM is not loaded. Please check your model path and installation."
+            return
+
+        prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
+        started = False
+        try:
+            for chunk in self.llm(
+                prompt,
+                max_tokens=self.max_tokens,
+                stop=["Question:", "System:", "User:"],
+                temperature=self.temp,
+                echo=False,
+                stream=True
+            ):
+                text = chunk['choices'][0]['text']
+                if not started:
+                    # generate_response strips the answer; do the same for the leading whitespace
+                    text = text.lstrip()
+                if text:
+                    started = True
+                    yield text
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+
     def is_active(self) -> bool:
         return self.llm is not None
@@ -1,7 +1,10 @@
 import os
 import yaml
+from typing import Iterator, List
 from mistralai import Mistral
 
+from llm.prompt_budget import PackedContext, PromptBudget, mistral_token_counter
+
 class MistralLLM:
     def __init__(self, config_path: str = "config.yaml"):
         with open(config_path, "r") as f:
@@ -9,6 +12,14 @@ class MistralLLM:
             
         self.model = self.config["llm"]["mistral"]["model"]
         self.temp = self.config["llm"]["mistral"]["temperature"]
+        self.max_tokens = self.config["llm"]["mistral"].get("max_new_tokens", 1024)
+        self.budget = PromptBudget(
+            mistral_token_counter(self.model),
+            self.config["llm"]["mistral"].get("context_window", 131072),
+            self.max_tokens,
+            input_budget=self.config["llm"]["mistral"].get("input_token_budget"),
+            history_budget=self.config["llm"].get("history_token_budget", 512),
+        )
         
         api_key = os.environ.get(self.config["llm"]["mistral"]["api_key_env_var"])
         self.client = None
@@ -20,11 +31,18 @@ class MistralLLM:
             print("Warning: MISTRAL_API_KEY not found in environment variables.")
             print("The system will function in Retrieval-Only mode.")
 
-    def generate_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
-        if not self.client:
-            return "Error: Mistral API Key missing. Please set MISTRAL_API_KEY."
+    def pack_context(
+        self, system_prompt: str, user_query: str, history: List[str], chunks: List[str], context: str = ""
+    ) -> PackedContext:
+        """
+        History lines and chunks (best first) that fit the input token budget.
+        `context` is the context block rendered without history lines.
+        """
+        return self.budget.pack(self._build_prompt(system_prompt, user_query, context, ""), history, chunks)
 
-        prompt = f"""
+    @staticmethod
+    def _build_prompt(system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+        return f"""
 {system_prompt}
 
 CONTEXT:
@@ -40,6 +58,12 @@ INSTRUCTIONS:
 - Answer clearly based ONLY on the provided documents.
 - If the answer is not in the documents, state that you don't know.
 """
+
+    def generate_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> str:
+        if not self.client:
+            return "Error: Mistral API Key missing. Please set MISTRAL_API_KEY."
+
+        prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
         try:
             chat_response = self.client.chat.complete(
                 model=self.model,
@@ -47,10 +71,33 @@ INSTRUCTIONS:
                     {"role": "user", "content": prompt}
                 ],
                 temperature=self.temp,
+                max_tokens=self.max_tokens,
             )
             return chat_response.choices[0].message.content
         except Exception as e:
             return f"Error calling Mistral API: {str(e)}"
 
+    def stream_response(self, system_prompt: str, user_query: str, context: str, retrieved_chunks: str) -> Iterator[str]:
+        """Like generate_response, but yields the text piece by piece as the API streams it."""
+        if not self.client:
+            yield "Error: Mistral API Key missing. Please set MISTRAL_API_KEY."
+            return
+
+        prompt = self._build_prompt(system_prompt, user_query, context, retrieved_chunks)
+        try:
+            for event in self.client.chat.stream(
+                model=self.model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=self.temp,
+                max_tokens=self.max_tokens,
+            ):
+                text = event.data.choices[0].delta.content if event.data.choices else None
+                if text:
+                    yield text
+        except Exception as e:
+            yield f"Error calling Mistral API: {str(e)}"
+
     def is_active(self) -> bool:
         return self.client is not None
@@ -0,0 +1,142 @@
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Whitespace after sentence-ending punctuation (same rule as rag/chunking.py)
+_SENTENCE = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+# Used when the model's tokenizer is unavailable. Deliberately few characters
+# per token, so estimates err towards a shorter prompt rather than overflow.
+FALLBACK_CHARS_PER_TOKEN = 3.0
+
+# A chunk is only trimmed to fit when at least this many tokens are left for it
+MIN_TRIMMED_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / FALLBACK_CHARS_PER_TOKEN) + 1
+
+
+def mistral_token_counter(model: str) -> Callable[[str], int]:
+    """Token counter for a Mistral API model (mistral_common, optional); a character estimate without it."""
+    try:
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+        tokenizer = MistralTokenizer.from_model(model, strict=False).instruct_tokenizer.tokenizer
+    except Exception as e:
+        print(f"Warning: no tokenizer for {model} ({e}); estimating prompt tokens from length.")
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, bos=False, eos=False))
+
+
+class PackedContext:
+    """What fit into the prompt: history lines (oldest first), numbered chunks and the token report."""
+
+    __slots__ = ("history", "chunks", "used", "report")
+
+    def __init__(self, history: List[str], chunks: List[str], used: List[int], report: Dict[str, int]):
+        self.history = history
+        self.chunks = chunks
+        self.used = used  # index of each packed chunk in the caller's list
+        self.report = report
+
+    @property
+    def doc_text(self) -> str:
+        return "\n\n".join(f"[{i+1}] {text}" for i, text in enumerate(self.chunks))
+
+
+class PromptBudget:
+    """
+    Fits conversation history and retrieved chunks into a model's input
+    budget, counting with the model's own tokenizer. `max_new_tokens` stays
+    free for the answer inside `context_window`; `input_budget` caps the
+    prompt further (cost). History gets up to `history_budget`, newest turns
+    first; the rest goes to chunks in the order given (best first). A chunk
+    that does not fit whole is cut at a sentence end; chunks that cannot
+    even keep one sentence are dropped.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        context_window: int,
+        max_new_tokens: int,
+        input_budget: Optional[int] = None,
+        history_budget: int = 512,
+    ):
+        self.count_tokens = count_tokens
+        self.context_window = context_window
+        self.max_new_tokens = max_new_tokens
+        self.input_budget = input_budget
+        self.history_budget = history_budget
+
+    @property
+    def input_limit(self) -> int:
+        limit = self.context_window - self.max_new_tokens
+        return min(limit, self.input_budget) if self.input_budget else limit
+
+    def pack(self, fixed_prompt: str, history: Sequence[str], chunks: Sequence[str]) -> PackedContext:
+        """`fixed_prompt` is the prompt rendered with no history and no chunks."""
+        fixed_tokens = self.count_tokens(fixed_prompt)
+        left = max(self.input_limit - fixed_tokens, 0)
+
+        kept_history: List[str] = []
+        history_tokens = 0
+        for line in reversed(history):
+            tokens = self.count_tokens(line) + 1  # newline
+            if history_tokens + tokens > min(self.history_budget, left):
+                break
+            kept_history.insert(0, line)
+            history_tokens += tokens
+        left -= history_tokens
+
+        # Numbering and separators: "[10] " plus the blank line between chunks
+        overhead = self.count_tokens("[10] \n\n")
+        kept: List[str] = []
+        used: List[int] = []
+        chunk_tokens = trimmed = dropped_tokens = 0
+        for i, text in enumerate(chunks):
+            tokens = self.count_tokens(text)
+            if tokens + overhead <= left:
+                kept.append(text)
+            else:
+                text, kept_tokens = self._trim(text, left - overhead)
+                dropped_tokens += tokens - kept_tokens
+                if not text:
+                    continue
+                kept.append(text)
+                tokens = kept_tokens
+                trimmed += 1
+            used.append(i)
+            chunk_tokens += tokens + overhead
+            left -= tokens + overhead
+
+        report = {
+            "input_limit": self.input_limit,
+            "reserved_for_answer": self.max_new_tokens,
+            "prompt_tokens": fixed_tokens + history_tokens + chunk_tokens,
+            "history_tokens": history_tokens,
+            "history_lines_dropped": len(history) - len(kept_history),
+            "chunk_tokens": chunk_tokens,
+            "chunks_used": len(kept),
+            "chunks_trimmed": trimmed,
+            "chunks_dropped": len(chunks) - len(kept),
+            "chunk_tokens_dropped": dropped_tokens,
+        }
+        return PackedContext(kept_history, kept, used, report)
+
+    def _trim(self, text: str, limit: int) -> Tuple[str, int]:
+        """Longest run of leading sentences within `limit` tokens, and its token count ("" if none)."""
+        if limit < MIN_TRIMMED_TOKENS:
+            return "", 0
+        text = text.strip()
+        ends = [m.end() for m in _SENTENCE.finditer(text)] + [len(text)]
+        lo, hi, best = 1, len(ends), ("", 0)
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            candidate = text[:ends[mid - 1]].rstrip()
+            tokens = self.count_tokens(candidate)
+            if tokens <= limit:
+                best, lo = (candidate, tokens), mid + 1
+            else:
+                hi = mid - 1
+        return best
@@ -1,5 +1,6 @@
 import os
 import yaml
+from typing import Iterator
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -35,6 +36,17 @@ class CollegeChatbot:
         """
         Main pipeline: Intent -> Context -> Rule Check -> Retrieval -> LLM/Direct Answer
         """
+        result = None
+        for result in self.stream_query(user_query, history):
+            pass
+        return result
+
+    def stream_query(self, user_query: str, history: list = []) -> Iterator[dict]:
+        """
+        process_query's pipeline, yielding the result each time the answer
+        grows: LLM answers arrive piece by piece as they are generated, rule
+        and retrieval-only answers in one piece. The last result is final.
+        """
         # 0. Update Conversation Context
         # Note: In a stateless API, history might be passed in. 
         # For Gradio, we might manage state there. 
@@ -47,58 +59,75 @@ class CollegeChatbot:
         rule_response = self.rule_engine.get_rule_based_response(intent, user_query)
         if rule_response:
              self.conversation_manager.add_turn(user_query, rule_response)
-             return {
+             yield {
                  "response": rule_response,
                  "source": "Rule Engine",
                  "intent": intent,
                  "retrieved_docs": []
              }
+             return
              
-        # 3. Retrieval (RAG)
-        retrieved_docs = self.retriever.search(user_query)
-        doc_text = "\n\n".join([f"[{i+1}] {d['content']}" for i, d in enumerate(retrieved_docs)])
+        # 3. Retrieval (RAG), routed to the intent's category when it is clear
+        route_intent, route_confidence = self.intent_classifier.classify(user_query)
+        retrieved_docs = self.retriever.search(user_query, intent=route_intent, intent_confidence=route_confidence)
         
         # 4. Decision: LLM vs Direct
         # If no docs found and not a general chat, might be unanswerable
         if not retrieved_docs and intent != "greeting":
              resp = "I'm sorry, I couldn't find any relevant information in the provided college documents."
-             return {
+             yield {
                  "response": resp,
                  "source": "System (No Data)",
                  "intent": intent,
                  "retrieved_docs": []
              }
+             return
 
         # 5. LLM Generation
         system_prompt = "SYSTEM:\nYou are a college information assistant.\nYou must ONLY use the provided documents.\nIf information is missing, say so clearly."
-        context_str = self.conversation_manager.get_context_block()
+        # Only what fits the model's input budget goes in, in retrieval rank order
+        packed = self.llm.pack_context(
+            system_prompt,
+            user_query,
+            self.conversation_manager.get_history_lines(),
+            [d["content"] for d in retrieved_docs],
+            context=self.conversation_manager.get_context_block([]),
+        )
+        doc_text = packed.doc_text
+        context_str = self.conversation_manager.get_context_block(packed.history)
         
+        result = {
+            "source": "Local LLM",
+            "intent": intent,
+            # Only the docs that made it into the prompt, numbered as in doc_text
+            "retrieved_docs": [retrieved_docs[i] for i in packed.used],
+            "prompt_tokens": packed.report
+        }
         if self.llm.is_active():
-            final_response = self.llm.generate_response(
+            pieces = []
+            for piece in self.llm.stream_response(
                 system_prompt=system_prompt,
                 user_query=user_query,
                 context=context_str,
                 retrieved_chunks=doc_text
-            )
-            source = "Local LLM"
+            ):
+                pieces.append(piece)
+                yield {**result, "response": "".join(pieces)}
+            final_response = "".join(pieces).strip()
         else:
             # Fallback if no LLM loaded
             final_response = f"**Top relevant information found:**\n\n{doc_text}\n\n*(LLM not active, showing raw results)*"
-            source = "Retrieval Only"
+            result["source"] = "Retrieval Only"
 
         self.conversation_manager.add_turn(user_query, final_response)
         
-        return {
-            "response": final_response,
-            "source": source,
-            "intent": intent,
-            "retrieved_docs": retrieved_docs
-        }
+        yield {**result, "response": final_response}
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="College Chatbot CLI")
     parser.add_argument("--ingest", action="store_true", help="Run data ingestion and exit")
+    parser.add_argument("--full", action="store_true", help="With --ingest: re-embed every document, not just changed files")
     parser.add_argument("--scrape", type=str, help="URL to scrape (e.g., https://college.edu)")
     args = parser.parse_args()
 
@@ -109,7 +138,7 @@ if __name__ == "__main__":
     elif args.ingest:
         from rag.ingest import Ingestor
         ingestor = Ingestor()
-        ingestor.process_and_index()
+        ingestor.process_and_index(full=args.full)
     else:
         bot = CollegeChatbot()
         print("Chatbot started. Type 'exit' to quit.")
@@ -118,8 +147,12 @@ if __name__ == "__main__":
                 q = input("\nUser: ")
                 if q.lower() in ["exit", "quit"]:
                     break
-                res = bot.process_query(q)
-                print(f"Bot: {res['response']}")
+                print("Bot: ", end="", flush=True)
+                shown = 0
+                for res in bot.stream_query(q):
+                    print(res["response"][shown:], end="", flush=True)
+                    shown = len(res["response"])
+                print()
                 print(f"Debug: Intent={res['intent']}, Source={res['source']}")
             except KeyboardInterrupt:
                 break
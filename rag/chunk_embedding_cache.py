@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Persistent cache of chunk embeddings, one directory per embedding model
+# under paths.embeddings_cache:
+#   vectors.npy   float16/float32[n, dim]  normalized chunk embeddings (mmapped)
+#   keys.npy      V16[n]                   blake2b digest of the normalized chunk text
+#   stamps.npy    int32[n]                 generation in which the row was last used
+#   meta.json     model, dim, dtype, generation
+VECTORS_FILE = "vectors.npy"
+KEYS_FILE = "keys.npy"
+STAMPS_FILE = "stamps.npy"
+META_FILE = "meta.json"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def chunk_key(text: str) -> bytes:
+    """Whitespace-insensitive digest, so re-chunking that only moves spaces still hits."""
+    return hashlib.blake2b(_WHITESPACE.sub(" ", text).strip().encode("utf-8"), digest_size=16).digest()
+
+
+class ChunkEmbeddingCache:
+    """
+    Maps chunk text to its embedding across ingestion runs, so a rebuild (new
+    chunking, a fresh crawl, a full re-index) only encodes chunks never seen
+    before. Rows are memory-mapped; the digest -> row index is rebuilt on open.
+
+    Size is bounded by `max_mb`: on `save`, rows unused for the most runs are
+    dropped first.
+    """
+
+    def __init__(self, root: str, model_name: str, dim: int, dtype: str = "float16", max_mb: float = 512):
+        self.path = os.path.join(root, model_name.replace("/", "__"))
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_rows = max(1, int(max_mb * 2 ** 20 // (dim * self.dtype.itemsize + 16 + 4)))
+
+        self.generation = 1
+        self._vectors = np.zeros((0, dim), dtype=self.dtype)
+        self._keys = np.zeros(0, dtype="V16")
+        self._stamps = np.zeros(0, dtype=np.int32)
+        self._rows: Dict[bytes, int] = {}
+        self._new_keys: List[bytes] = []
+        self._new_vectors: List[np.ndarray] = []
+        self.hits = 0
+        self.misses = 0
+        self._open()
+
+    def _open(self):
+        meta_file = os.path.join(self.path, META_FILE)
+        if not os.path.exists(meta_file):
+            return
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        if meta["model"] != self.model_name or meta["dim"] != self.dim or meta["dtype"] != self.dtype.name:
+            print(f"Ignoring chunk embedding cache at {self.path} (model or format changed).")
+            return
+
+        self.generation = meta["generation"] + 1
+        self._vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r")
+        self._keys = np.load(os.path.join(self.path, KEYS_FILE))
+        self._stamps = np.load(os.path.join(self.path, STAMPS_FILE))
+        if not len(self._vectors) == len(self._keys) == len(self._stamps):
+            # Interrupted save; start over rather than serve mismatched rows
+            print(f"Chunk embedding cache at {self.path} is inconsistent; starting empty.")
+            self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+            self._keys = np.zeros(0, dtype="V16")
+            self._stamps = np.zeros(0, dtype=np.int32)
+            self._rows = {}
+            return
+        self._rows = {key: row for row, key in enumerate(self._keys.tolist())}
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._new_keys)
+
+    @property
+    def pending(self) -> int:
+        """Rows added since the last `save` (held in memory until then)."""
+        return len(self._new_keys)
+
+    def lookup(self, chunks: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Returns (float32[len(chunks), dim] embeddings, positions not cached).
+        Rows at the missing positions are zero until filled by the caller.
+        """
+        out = np.zeros((len(chunks), self.dim), dtype=np.float32)
+        missing = []
+        pending = {key: i for i, key in enumerate(self._new_keys)}
+        for i, text in enumerate(chunks):
+            key = chunk_key(text)
+            row = self._rows.get(key)
+            if row is not None:
+                out[i] = self._vectors[row]
+                self._stamps[row] = self.generation
+            elif key in pending:
+                out[i] = self._new_vectors[pending[key]]
+            else:
+                missing.append(i)
+        self.hits += len(chunks) - len(missing)
+        self.misses += len(missing)
+        return out, missing
+
+    def add(self, chunks: List[str], embeddings: np.ndarray):
+        for text, vector in zip(chunks, embeddings):
+            self._new_keys.append(chunk_key(text))
+            self._new_vectors.append(np.asarray(vector, dtype=self.dtype))
+
+    def save(self):
+        """Merges new rows, drops least recently used rows beyond max_mb and swaps the files in."""
+        if not self._new_keys and self.generation not in self._stamps:
+            return
+
+        # Deduplicate: a chunk added twice in one run keeps one row
+        new_rows: Dict[bytes, int] = {}
+        for i, key in enumerate(self._new_keys):
+            if key not in self._rows:
+                new_rows.setdefault(key, i)
+        n_new = len(new_rows)
+
+        keys = np.concatenate([self._keys, np.array(list(new_rows), dtype="V16")])
+        stamps = np.concatenate([self._stamps, np.full(n_new, self.generation, dtype=np.int32)])
+        order = np.arange(len(keys))
+        if len(keys) > self.max_rows:
+            # Newest generations first; ties keep insertion order
+            order = np.sort(np.argsort(-stamps, kind="stable")[: self.max_rows])
+            print(f"Chunk embedding cache over {self.max_rows} rows; dropping {len(keys) - self.max_rows} least recently used.")
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_vectors = os.path.join(self.path, VECTORS_FILE + ".tmp")
+        vectors = np.lib.format.open_memmap(tmp_vectors, mode="w+", dtype=self.dtype, shape=(len(order), self.dim))
+        # `order` is ascending, so surviving old rows come before new ones
+        n_kept_old = int(np.searchsorted(order, len(self._keys)))
+        vectors[:n_kept_old] = self._vectors[order[:n_kept_old]]
+        if n_kept_old < len(order):
+            new_vectors = np.stack([self._new_vectors[i] for i in new_rows.values()])
+            vectors[n_kept_old:] = new_vectors[order[n_kept_old:] - len(self._keys)]
+        vectors.flush()
+        del vectors
+        # Release our own mapping before replacing the file (required on Windows)
+        self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+
+        self._save_array(KEYS_FILE, keys[order])
+        self._save_array(STAMPS_FILE, stamps[order])
+        os.replace(tmp_vectors, os.path.join(self.path, VECTORS_FILE))
+        tmp_meta = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name, "generation": self.generation}, f)
+        os.replace(tmp_meta, os.path.join(self.path, META_FILE))
+
+        self._new_keys, self._new_vectors = [], []
+        self._open()
+
+    def _save_array(self, name: str, array: np.ndarray):
+        tmp_file = os.path.join(self.path, name + ".tmp")
+        with open(tmp_file, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_file, os.path.join(self.path, name))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "rows": len(self),
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
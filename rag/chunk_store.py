@@ -0,0 +1,199 @@
+import json
+import mmap
+import os
+import pickle
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Columnar chunk store layout (all files live in the vector store directory):
+#   chunks.bin          concatenated UTF-8 chunk text
+#   chunks.offsets.npy  int64[n + 1] byte offsets into chunks.bin
+#   chunks.meta.npy     int32[n, n_columns] dictionary codes, -1 = key absent
+#   chunks.meta.json    column names and the value vocabulary of each column
+#   chunks.spans.npy    int64[n, 2] [start, end) character span of each chunk in
+#                       its document, -1 where unknown (kept out of the metadata
+#                       so the vocabulary does not grow with the corpus)
+TEXT_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+META_CODES_FILE = "chunks.meta.npy"
+META_VOCAB_FILE = "chunks.meta.json"
+SPANS_FILE = "chunks.spans.npy"
+LEGACY_CHUNKS_FILE = "chunks.pkl"
+
+
+class ChunkStoreWriter:
+    """
+    Appends chunks to a columnar store. Text is streamed straight to disk;
+    only offsets and small metadata codes are held until `close()`.
+
+    Every file is written under a temporary name and renamed into place on
+    close, so readers that have the previous store mmapped are unaffected.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._text = open(self._tmp(TEXT_FILE), "wb")
+        self._offsets: List[int] = [0]
+        self._columns: List[str] = []
+        self._column_ids: Dict[str, int] = {}
+        self._vocab: Dict[str, Dict[str, int]] = {}
+        self._codes: List[Dict[int, int]] = []
+
+    def append(self, chunks: Iterable[str], metadata: Iterable[Dict[str, Any]]):
+        for text, meta in zip(chunks, metadata):
+            data = text.encode("utf-8")
+            self._text.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+            self._codes.append({self._column(key): self._code(key, value) for key, value in meta.items()})
+
+    def _column(self, key: str) -> int:
+        if key not in self._column_ids:
+            self._column_ids[key] = len(self._columns)
+            self._columns.append(key)
+            self._vocab[key] = {}
+        return self._column_ids[key]
+
+    def _code(self, key: str, value: Any) -> int:
+        # Values are dictionary-encoded by their JSON form so lists/dicts work too
+        encoded = json.dumps(value, sort_keys=True)
+        vocab = self._vocab[key]
+        if encoded not in vocab:
+            vocab[encoded] = len(vocab)
+        return vocab[encoded]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _tmp(self, name: str) -> str:
+        return os.path.join(self.path, name + ".tmp")
+
+    def close(self):
+        self._text.close()
+        with open(self._tmp(OFFSETS_FILE), "wb") as f:
+            np.save(f, np.asarray(self._offsets, dtype=np.int64))
+
+        codes = np.full((len(self._codes), len(self._columns)), -1, dtype=np.int32)
+        for row, row_codes in enumerate(self._codes):
+            for column, code in row_codes.items():
+                codes[row, column] = code
+        with open(self._tmp(META_CODES_FILE), "wb") as f:
+            np.save(f, codes)
+
+        with open(self._tmp(META_VOCAB_FILE), "w") as f:
+            json.dump({
+                "count": len(self),
+                "columns": self._columns,
+                "vocab": [list(self._vocab[column].keys()) for column in self._columns],
+            }, f)
+
+        for name in (TEXT_FILE, OFFSETS_FILE, META_CODES_FILE, META_VOCAB_FILE):
+            os.replace(self._tmp(name), os.path.join(self.path, name))
+
+
+def write_chunk_store(path: str, chunks: List[str], metadata: List[Dict[str, Any]]):
+    writer = ChunkStoreWriter(path)
+    writer.append(chunks, metadata)
+    writer.close()
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a columnar chunk store. Nothing is
+    decoded until `get` is called, and the pages are shared between
+    processes through the OS page cache.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_VOCAB_FILE), "r") as f:
+            meta = json.load(f)
+        self.columns: List[str] = meta["columns"]
+        self._vocab: List[List[str]] = meta["vocab"]
+        self._decoded: List[Dict[int, Any]] = [{} for _ in self.columns]
+
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, META_CODES_FILE), mmap_mode="r")
+        spans_file = os.path.join(path, SPANS_FILE)
+        self.spans = np.load(spans_file, mmap_mode="r") if os.path.exists(spans_file) else None
+
+        self._file = open(os.path.join(path, TEXT_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._text = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        row = self.codes[i]
+        meta = {}
+        for column, code in enumerate(row):
+            if code < 0:
+                continue
+            cache = self._decoded[column]
+            if code not in cache:
+                cache[code] = json.loads(self._vocab[column][code])
+            meta[self.columns[column]] = cache[code]
+        return meta
+
+    def span(self, i: int) -> Optional[Tuple[int, int]]:
+        """[start, end) character span of chunk `i` in its document, None if not recorded."""
+        if self.spans is None or self.spans[i, 0] < 0:
+            return None
+        return int(self.spans[i, 0]), int(self.spans[i, 1])
+
+    def get(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        return self.text(i), self.metadata(i)
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._file.close()
+
+
+class InMemoryChunkStore:
+    """Same interface over the legacy `chunks.pkl` (chunks, metadata) tuple."""
+
+    def __init__(self, chunks: List[str], metadata: List[Dict[str, Any]]):
+        self.chunks = chunks
+        self.metadata_rows = metadata
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def text(self, i: int) -> str:
+        return self.chunks[i]
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return self.metadata_rows[i]
+
+    def span(self, i: int) -> Optional[Tuple[int, int]]:
+        return None
+
+    def get(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        return self.text(i), self.metadata(i)
+
+    def close(self):
+        pass
+
+
+def chunk_store_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_VOCAB_FILE)) or os.path.exists(os.path.join(path, LEGACY_CHUNKS_FILE))
+
+
+def open_chunk_store(path: str) -> Optional[Any]:
+    """Opens the columnar store, falling back to a legacy chunks.pkl; None if neither exists."""
+    if os.path.exists(os.path.join(path, META_VOCAB_FILE)):
+        return ChunkStore(path)
+
+    legacy_file = os.path.join(path, LEGACY_CHUNKS_FILE)
+    if os.path.exists(legacy_file):
+        with open(legacy_file, "rb") as f:
+            chunks, metadata = pickle.load(f)
+        return InMemoryChunkStore(chunks, metadata)
+    return None
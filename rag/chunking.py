@@ -0,0 +1,173 @@
+import re
+from typing import Any, List, Optional
+
+import numpy as np
+
+# A paragraph break, or whitespace after sentence-ending punctuation
+_PARAGRAPH = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+_WORD = re.compile(r"\S+")
+
+
+class Chunk:
+    """A span of a document: its text, [start, end) character offsets and, when
+    chunked by the model's tokenizer, the token ids (without special tokens)."""
+
+    __slots__ = ("text", "start", "end", "token_ids")
+
+    def __init__(self, text: str, start: int, end: int, token_ids: Optional[List[int]] = None):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.token_ids = token_ids
+
+
+def word_chunks(text: str, size: int, overlap: int) -> List[Chunk]:
+    """The original whitespace chunker: `size`-word windows every `size - overlap` words."""
+    words = [(m.start(), m.end()) for m in _WORD.finditer(text)]
+    chunks = []
+    for i in range(0, len(words), size - overlap):
+        start, end = words[i][0], words[min(i + size, len(words)) - 1][1]
+        chunks.append(Chunk(" ".join(text[s:e] for s, e in words[i : i + size]), start, end))
+    return chunks
+
+
+class TokenChunker:
+    """
+    Splits documents into chunks of at most `max_tokens` tokens of the
+    embedding model's own (fast) tokenizer, so nothing is cut off at encode
+    time. Cuts prefer a paragraph break, then a sentence end, and only fall
+    back to a plain token boundary inside an overlong sentence. Consecutive
+    chunks share about `overlap_tokens` tokens, starting on a sentence where
+    one is close.
+
+    While chunking it also measures what the word chunker (`legacy_words`,
+    `legacy_overlap`) would have lost to truncation at `window` tokens; see
+    `legacy_report`.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        max_tokens: int,
+        overlap_tokens: int,
+        window: int,
+        legacy_words: int = 0,
+        legacy_overlap: int = 0,
+    ):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.window = window
+        self.legacy_words = legacy_words
+        self.legacy_overlap = legacy_overlap
+        self.legacy_report = {"chunks": 0, "truncated_chunks": 0, "tokens": 0, "truncated_tokens": 0}
+
+    @classmethod
+    def for_model(cls, model: Any, max_tokens: Optional[int] = None, overlap_tokens: int = 32, **legacy) -> Optional["TokenChunker"]:
+        """None when the model has no fast tokenizer (character offsets need one)."""
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+            return None
+        # Room left in the model's window after [CLS] ... [SEP] (or the model's equivalent)
+        window = model.get_max_seq_length() - tokenizer.num_special_tokens_to_add(pair=False)
+        if max_tokens and max_tokens > window:
+            print(f"chunking.max_tokens={max_tokens} exceeds the model window; using {window}.")
+        return cls(tokenizer, min(max_tokens or window, window), overlap_tokens, window, **legacy)
+
+    def chunk(self, text: str) -> List[Chunk]:
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        ids = encoding["input_ids"]
+        if not ids:
+            return []
+        offsets = np.asarray(encoding["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+        starts = offsets[:, 0]
+        if self.legacy_words:
+            self._measure_legacy(text, starts)
+
+        # Token positions where a paragraph / sentence begins
+        paragraphs = np.unique(np.searchsorted(starts, [m.end() for m in _PARAGRAPH.finditer(text)]))
+        sentences = np.union1d(paragraphs, np.searchsorted(starts, [m.end() for m in _SENTENCE.finditer(text)]))
+
+        chunks = []
+        n = len(ids)
+        pos = 0
+        while True:
+            limit = pos + self.max_tokens
+            if limit >= n:
+                end = n
+            else:
+                end = (
+                    self._last_in(paragraphs, pos + self.max_tokens // 2, limit)
+                    or self._last_in(sentences, pos + self.max_tokens // 4, limit)
+                    or limit
+                )
+            chunks.append(Chunk(text[offsets[pos, 0] : offsets[end - 1, 1]], int(offsets[pos, 0]), int(offsets[end - 1, 1]), ids[pos:end]))
+            if end == n:
+                return chunks
+            # Overlap from the first sentence start within the last `overlap_tokens`
+            overlap_start = end - self.overlap_tokens
+            i = np.searchsorted(sentences, overlap_start)
+            next_pos = int(sentences[i]) if i < len(sentences) and sentences[i] < end else overlap_start
+            pos = max(next_pos, pos + 1)
+
+    @staticmethod
+    def _last_in(positions: np.ndarray, low: int, high: int) -> int:
+        """Largest position in (low, high], or 0."""
+        i = np.searchsorted(positions, high, side="right")
+        return int(positions[i - 1]) if i and positions[i - 1] > low else 0
+
+    def legacy_summary(self) -> Optional[str]:
+        report = self.legacy_report
+        if not report["chunks"]:
+            return None
+        share = report["truncated_tokens"] / max(report["tokens"], 1)
+        return (
+            f"Old {self.legacy_words}-word chunking would have truncated {report['truncated_chunks']} of "
+            f"{report['chunks']} chunks at the model's {self.window}-token window, dropping "
+            f"{report['truncated_tokens']} of {report['tokens']} tokens ({share:.1%})."
+        )
+
+    def _measure_legacy(self, text: str, token_starts: np.ndarray):
+        words = np.array([(m.start(), m.end()) for m in _WORD.finditer(text)], dtype=np.int64).reshape(-1, 2)
+        if not len(words):
+            return
+        first = np.arange(0, len(words), self.legacy_words - self.legacy_overlap)
+        last = np.minimum(first + self.legacy_words, len(words)) - 1
+        tokens = np.searchsorted(token_starts, words[last, 1]) - np.searchsorted(token_starts, words[first, 0])
+        truncated = np.maximum(tokens - self.window, 0)
+        report = self.legacy_report
+        report["chunks"] += len(tokens)
+        report["truncated_chunks"] += int(np.count_nonzero(truncated))
+        report["tokens"] += int(tokens.sum())
+        report["truncated_tokens"] += int(truncated.sum())
+
+
+def encode_token_ids(model: Any, token_ids: List[List[int]], batch_size: int = 32) -> np.ndarray:
+    """
+    Sentence-transformers forward pass over pre-tokenized chunks (ids without
+    special tokens), so chunk text is not tokenized a second time. Returns
+    float32[len(token_ids), dim] in input order. Models with their own
+    `encode_token_ids` (the ONNX backend) are delegated to.
+    """
+    if hasattr(model, "encode_token_ids"):
+        return model.encode_token_ids(token_ids, batch_size)
+    import torch
+
+    tokenizer = model.tokenizer
+    out = np.zeros((len(token_ids), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    # Longest first, like SentenceTransformer.encode, to keep padding low
+    order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+    model.eval()
+    for i in range(0, len(order), batch_size):
+        rows = order[i : i + batch_size]
+        features = tokenizer.pad(
+            {"input_ids": [tokenizer.build_inputs_with_special_tokens(token_ids[row]) for row in rows]},
+            padding=True,
+            return_tensors="pt",
+        )
+        features = {key: value.to(model.device) for key, value in features.items()}
+        with torch.no_grad():
+            out[rows] = model(features)["sentence_embedding"].float().cpu().numpy()
+    return out
+
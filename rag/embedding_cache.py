@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Folds case, punctuation and whitespace so trivially different phrasings
+    ("What are the hostel fees?" / "what are the  hostel fees") share a key.
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings keyed on normalized query text.
+    Optionally spills to an .npz file so a restarted process starts warm;
+    the spill is tagged with the model name and ignored if the model changes.
+    """
+
+    def __init__(self, max_size: int = 2048, spill_path: Optional[str] = None, model_name: str = ""):
+        self.max_size = max(1, max_size)
+        self.spill_path = spill_path
+        self.model_name = model_name
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.spill_path:
+            self.load()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.copy()
+
+    def put(self, query: str, vector: np.ndarray):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = np.asarray(vector, dtype="float32").reshape(-1).copy()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self):
+        """Writes the cache to `spill_path` (oldest first, so LRU order survives a reload)."""
+        if not self.spill_path:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            keys = np.array(list(self._entries.keys()))
+            vectors = np.stack(list(self._entries.values()))
+
+        os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+        tmp_path = self.spill_path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, vectors=vectors, model_name=np.array(self.model_name))
+        os.replace(tmp_path, self.spill_path)
+
+    def load(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        try:
+            with np.load(self.spill_path) as data:
+                keys, vectors = data["keys"], data["vectors"]
+                model_name = str(data["model_name"])
+        except Exception as e:
+            print(f"Ignoring unreadable query cache {self.spill_path}: {e}")
+            return
+        if model_name != self.model_name:
+            print(f"Ignoring query cache built for {model_name!r}.")
+            return
+
+        with self._lock:
+            for key, vector in zip(keys[-self.max_size:], vectors[-self.max_size:]):
+                self._entries[str(key)] = vector.astype("float32")
+        print(f"Warm-started query cache with {len(self._entries)} embeddings.")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,195 @@
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from rag.chunking import encode_token_ids
+from rag.onnx_embedder import embedder_id, load_embedding_model
+
+# Client for the shared embedding server run by the backend
+# (python -m app.services.embedding_server), used by both ingestion and the
+# backend's retriever. Wire format, both directions:
+# !II header length, payload length, then a UTF-8 JSON header and the raw
+# payload; encode responses carry float32[n, dim], errors {"error": message}.
+_FRAME = struct.Struct("!II")
+
+
+def send_frame(sock: socket.socket, header: Dict[str, Any], payload: bytes = b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(data), len(payload)) + data + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(min(n - len(buf), 1 << 20))
+        if not part:
+            raise ConnectionError("embedding server closed the connection")
+        buf += part
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_len))
+    return header, _recv_exact(sock, payload_len) if payload_len else b""
+
+
+class EmbeddingClient:
+    """
+    SentenceTransformer-shaped client for the shared embedding server. When
+    the server is unreachable, times out or serves a different model/backend
+    than `expected_id`, it encodes in-process with the model from `load_local`
+    (loaded on first need) and tries the server again after `retry_seconds`.
+
+    The tokenizer (for token chunking) is loaded on its own from the path the
+    server announces, so a client that never falls back never loads weights.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        expected_id: str,
+        load_local: Callable[[], Any],
+        timeout: float = 120.0,
+        retry_seconds: float = 30.0,
+    ):
+        self.socket_path = socket_path
+        self.expected_id = expected_id
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._load_local = load_local
+        self._local = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self._pool: "queue.LifoQueue[socket.socket]" = queue.LifoQueue()
+        self._hello: Optional[Dict[str, Any]] = None
+        self._retry_at = 0.0
+        self.remote_calls = 0
+        self.local_calls = 0
+        self.failures = 0
+
+    @property
+    def local(self) -> Any:
+        with self._lock:
+            if self._local is None:
+                print("Embedding server unavailable; loading the model in-process.")
+                self._local = self._load_local()
+            return self._local
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            send_frame(sock, {"op": "hello"})
+            hello, _ = recv_frame(sock)
+        except Exception:
+            sock.close()
+            raise
+        if hello.get("embedder_id") != self.expected_id:
+            sock.close()
+            raise ConnectionError(f"embedding server serves {hello.get('embedder_id')}, expected {self.expected_id}")
+        self._hello = hello
+        return sock
+
+    def _remote(self, request: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Vectors from the server, or None if it cannot be used right now."""
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            sock = self._pool.get_nowait()
+        except queue.Empty:
+            sock = None
+        try:
+            if sock is None:
+                sock = self._connect()
+            send_frame(sock, request)
+            header, payload = recv_frame(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            if sock is not None:
+                sock.close()
+            self.failures += 1
+            self._retry_at = time.monotonic() + self.retry_seconds
+            print(f"Embedding server at {self.socket_path} unavailable ({e}); encoding in-process.")
+            return None
+        self._pool.put(sock)
+        if "error" in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        self.remote_calls += 1
+        return np.frombuffer(payload, dtype=np.float32).reshape(header["n"], header["dim"]).copy()
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = self._remote({"op": "encode", "texts": texts})
+        if out is None:
+            self.local_calls += 1
+            out = np.asarray(self.local.encode(texts, batch_size=batch_size), dtype=np.float32)
+        return out[0] if single else out
+
+    def encode_token_ids(self, token_ids: List[List[int]], batch_size: int = 32) -> np.ndarray:
+        out = self._remote({"op": "encode_ids", "token_ids": token_ids, "batch_size": batch_size})
+        if out is None:
+            self.local_calls += 1
+            out = encode_token_ids(self.local, token_ids, batch_size)
+        return out
+
+    def _describe(self, key: str) -> Optional[Any]:
+        if self._hello is None and time.monotonic() >= self._retry_at:
+            try:
+                self._pool.put(self._connect())
+            except (OSError, ConnectionError, ValueError):
+                self._retry_at = time.monotonic() + self.retry_seconds
+        return self._hello[key] if self._hello is not None else None
+
+    @property
+    def tokenizer(self) -> Any:
+        if self._tokenizer is None:
+            source = self._describe("tokenizer")
+            if source is None:
+                self._tokenizer = getattr(self.local, "tokenizer", None)
+            else:
+                from transformers import AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(source)
+        return self._tokenizer
+
+    def get_sentence_embedding_dimension(self) -> int:
+        dim = self._describe("dim")
+        return dim if dim is not None else self.local.get_sentence_embedding_dimension()
+
+    def get_max_seq_length(self) -> int:
+        length = self._describe("max_seq_length")
+        return length if length is not None else self.local.get_max_seq_length()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.socket_path,
+            "connected": self._hello is not None and time.monotonic() >= self._retry_at,
+            "remote_calls": self.remote_calls,
+            "local_calls": self.local_calls,
+            "failures": self.failures,
+        }
+
+
+def connect_embedding_model(model_name: str, backend_config: Dict[str, Any], server_config: Dict[str, Any]) -> Any:
+    """An EmbeddingClient when `rag.embedding_server.socket_path` is set, else the in-process model."""
+
+    def load_local():
+        return load_embedding_model(model_name, backend_config)
+
+    if server_config.get("socket_path"):
+        return EmbeddingClient(
+            server_config["socket_path"],
+            embedder_id(model_name, backend_config.get("type", "torch")),
+            load_local,
+            timeout=server_config.get("timeout_seconds", 120),
+            retry_seconds=server_config.get("retry_seconds", 30),
+        )
+    return load_local()
@@ -0,0 +1,165 @@
+import hashlib
+import multiprocessing
+import os
+import signal
+import threading
+from collections import deque
+from typing import Iterable, Iterator, Optional, Set, Tuple
+
+import pypdf
+import docx
+
+
+def read_pdf(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        reader = pypdf.PdfReader(f)
+        return "\n".join((page.extract_text() or "") for page in reader.pages) + "\n"
+
+
+def read_docx(file_path: str) -> str:
+    doc = docx.Document(file_path)
+    return "\n".join(para.text for para in doc.paragraphs)
+
+
+def read_txt(file_path: str) -> str:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+READERS = {"txt": read_txt, "pdf": read_pdf, "docx": read_docx}
+
+
+def _alarm(signum, frame):
+    raise TimeoutError("extraction timed out")
+
+
+def extract_text(file_path: str, doc_type: str, timeout: Optional[float] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pool worker: returns (text, error). Where SIGALRM exists the worker
+    interrupts itself after `timeout`, so a pathological PDF frees its slot
+    (signals only work on the main thread; elsewhere no timeout applies).
+    """
+    use_alarm = timeout and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return READERS[doc_type](file_path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ExtractionCache:
+    """
+    Extracted text keyed on (path, mtime, size), one file per entry, so a
+    full rebuild never parses an unchanged PDF/DOCX twice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.hits = 0
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        stat = os.stat(file_path)
+        ident = f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+        return hashlib.blake2b(ident.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = os.path.join(self.path, key + ".txt")
+        if not os.path.exists(entry):
+            return None
+        with open(entry, "r", encoding="utf-8") as f:
+            self.hits += 1
+            return f.read()
+
+    def put(self, key: str, text: str):
+        entry = os.path.join(self.path, key + ".txt")
+        with open(entry + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(entry + ".tmp", entry)
+
+    def prune(self, live_keys: Set[str]):
+        """Drops entries of files that changed or no longer exist."""
+        for name in os.listdir(self.path):
+            if name.split(".", 1)[0] not in live_keys:
+                os.remove(os.path.join(self.path, name))
+
+
+def extract_documents(
+    files: Iterable[Tuple[str, str]],
+    workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    timeout: float = 60.0,
+    cache: Optional[ExtractionCache] = None,
+) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """
+    Yields (file_path, doc_type, text or None). PDF and DOCX files are parsed
+    in a process pool with at most `max_in_flight` files queued; TXT files and
+    cache hits are served in-process right away, so they may come out ahead of
+    earlier pooled files (the order is still deterministic). A file whose
+    result has not arrived `timeout` seconds after it reached the head of
+    the queue is reported as failed and the pool is restarted, so a stuck
+    worker cannot hang the run.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(1, max_in_flight or 2 * workers)
+    pool = None
+    in_flight: deque = deque()
+
+    def submit(file_path: str, doc_type: str, key: Optional[str]):
+        nonlocal pool
+        if pool is None:
+            pool = multiprocessing.Pool(workers, maxtasksperchild=100)
+        result = pool.apply_async(extract_text, (file_path, doc_type, timeout))
+        in_flight.append((file_path, doc_type, key, result))
+
+    def finish_oldest() -> Tuple[str, str, Optional[str]]:
+        nonlocal pool
+        file_path, doc_type, key, result = in_flight.popleft()
+        try:
+            # Small grace over the worker's own alarm
+            text, error = result.get(timeout + 5.0)
+        except multiprocessing.TimeoutError:
+            text, error = None, f"no result after {timeout:.0f}s"
+            # The stuck worker cannot be reclaimed; restart the pool and requeue the rest
+            pending = list(in_flight)
+            in_flight.clear()
+            pool.terminate()
+            pool = None
+            for path, kind, k, _ in pending:
+                submit(path, kind, k)
+        if error:
+            print(f"Error reading {doc_type.upper()} {file_path}: {error}")
+        elif cache is not None and key is not None:
+            cache.put(key, text)
+        return file_path, doc_type, text
+
+    try:
+        for file_path, doc_type in files:
+            key = cache.key(file_path) if cache is not None and doc_type != "txt" else None
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                yield file_path, doc_type, cached
+                continue
+            if doc_type == "txt" or workers <= 1:
+                text, error = extract_text(file_path, doc_type, timeout if doc_type != "txt" else None)
+                if error:
+                    print(f"Error reading {doc_type.upper()} {file_path}: {error}")
+                elif key is not None:
+                    cache.put(key, text)
+                yield file_path, doc_type, text
+                continue
+
+            submit(file_path, doc_type, key)
+            while len(in_flight) >= max_in_flight:
+                yield finish_oldest()
+        while in_flight:
+            yield finish_oldest()
+    finally:
+        if pool is not None:
+            pool.terminate()
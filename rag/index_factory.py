@@ -0,0 +1,405 @@
+import json
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+STORAGE_TYPES = ("float32", "float16", "sq8", "pq")
+INDEX_SPEC_FILE = "index_config.json"
+
+# "auto" thresholds on chunk count
+AUTO_FLAT_MAX = 20_000      # exact search stays ~1 ms up to here
+AUTO_HNSW_MAX = 1_000_000   # beyond this HNSW graph memory dominates; use IVF-PQ
+
+# Below this many training points per IVF cell k-means is unreliable
+MIN_POINTS_PER_CENTROID = 39
+
+# Vectors are added (and sampled for training) in slices of this many rows,
+# so a memory-mapped embedding matrix is never loaded whole
+ADD_BATCH = 65_536
+MAX_TRAIN_POINTS = 256 * 1024
+
+# Vector codecs for `rag.index.storage` (bytes per vector at dim d):
+#   float32  d * 4, exact
+#   float16  d * 2 (SQfp16), scores change in the 3rd-4th decimal
+#   sq8      d     (8-bit scalar quantizer, per-dimension ranges)
+#   pq       pq_m  (product quantizer); the k * rescore_factor best candidates
+#            are re-scored against the float vectors kept beside the codes
+#            (faiss Refine(Flat), memory-mapped with the index, so only the
+#            rescored rows are paged in)
+SQ_CODECS = {"float16": "SQfp16", "sq8": "SQ8"}
+
+# Float32 copy of every vector (row = chunk id; rows of deleted ids go stale),
+# written beside indexes whose stored codes are lossy. Rebuilds start from it
+# instead of decoded codes, which would add quantization error every update.
+EXACT_VECTORS_FILE = "vectors.npy"
+
+# Recall@k of the built index against exact search, over this many stored
+# vectors used as queries (their own row excluded from both result lists)
+RECALL_K = 10
+RECALL_QUERIES = 500
+
+
+def resolve_index_type(requested: str, n_vectors: int) -> str:
+    requested = (requested or "auto").lower()
+    if requested == "auto":
+        if n_vectors <= AUTO_FLAT_MAX:
+            return "flat"
+        if n_vectors <= AUTO_HNSW_MAX:
+            return "hnsw"
+        return "ivf_pq"
+    if requested not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{requested}'. Options: auto, {', '.join(INDEX_TYPES)}")
+    return requested
+
+
+def _default_nlist(n_vectors: int, requested: Optional[int]) -> int:
+    nlist = requested or int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    """Largest divisor of `dim` not above `requested` (PQ needs dim % m == 0)."""
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def resolve_storage(requested: str, index_type: str) -> str:
+    storage = (requested or "float32").lower()
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage '{requested}'. Options: {', '.join(STORAGE_TYPES)}")
+    if index_type == "ivf_pq" and storage in SQ_CODECS:
+        print(f"ivf_pq already stores PQ codes; ignoring storage '{storage}'.")
+        return "float32"
+    if index_type == "hnsw" and storage == "pq":
+        # Graph rebuilds on update need vectors back from the index; PQ codes are too lossy for that
+        print("PQ storage is not supported for HNSW; using sq8.")
+        return "sq8"
+    return storage
+
+
+def _row_slices(embeddings: np.ndarray, rows: Optional[np.ndarray]):
+    """Yields (start, contiguous float32 slice) over `rows` of `embeddings` (all rows if None)."""
+    n_vectors = len(embeddings) if rows is None else len(rows)
+    for start in range(0, n_vectors, ADD_BATCH):
+        end = min(start + ADD_BATCH, n_vectors)
+        part = embeddings[start:end] if rows is None else embeddings[rows[start:end]]
+        yield start, np.ascontiguousarray(part, dtype=np.float32)
+
+
+def _training_sample(embeddings: np.ndarray, rows: Optional[np.ndarray], n_vectors: int) -> np.ndarray:
+    if n_vectors <= MAX_TRAIN_POINTS:
+        picked = np.arange(n_vectors)
+    else:
+        picked = np.sort(np.random.default_rng(0).choice(n_vectors, MAX_TRAIN_POINTS, replace=False))
+    return np.ascontiguousarray(embeddings[picked if rows is None else rows[picked]], dtype=np.float32)
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_config: Dict[str, Any],
+    ids: Optional[np.ndarray] = None,
+    rows: Optional[np.ndarray] = None,
+) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Builds and fills a FAISS inner-product index over L2-normalized `embeddings`
+    according to the `rag.index` config section. Returns the index and the spec
+    that `save_index_spec` writes next to it.
+
+    With `ids`, search returns those labels instead of row numbers and the
+    index can later be edited in place with `update_index`. `rows` restricts
+    the build to those rows of `embeddings` (`ids` then lines up with `rows`).
+    `embeddings` may be memory-mapped: it is only read in ADD_BATCH slices.
+    """
+    n_vectors = len(embeddings) if rows is None else len(rows)
+    dim = embeddings.shape[1]
+    index_type = resolve_index_type(index_config.get("type", "auto"), n_vectors)
+    storage = resolve_storage(index_config.get("storage", "float32"), index_type)
+    params: Dict[str, Any] = {}
+    search: Dict[str, Any] = {}
+
+    # Degrade gracefully when the corpus is too small to train the requested type
+    if index_type == "ivf_pq" and n_vectors < MIN_POINTS_PER_CENTROID * 2 ** index_config.get("pq_bits", 8):
+        print(f"Too few vectors ({n_vectors}) to train PQ codebooks; using ivf_flat instead.")
+        index_type = "ivf_flat"
+    if index_type in ("ivf_flat", "ivf_pq") and n_vectors < MIN_POINTS_PER_CENTROID * 2:
+        print(f"Too few vectors ({n_vectors}) to train IVF centroids; using flat instead.")
+        index_type = "flat"
+    if storage == "pq" and index_type != "ivf_pq" and n_vectors < MIN_POINTS_PER_CENTROID * 2 ** index_config.get("pq_bits", 8):
+        print(f"Too few vectors ({n_vectors}) to train PQ codebooks; using sq8 storage instead.")
+        storage = "sq8"
+
+    codec = SQ_CODECS.get(storage, "Flat")
+    if storage == "pq" or index_type == "ivf_pq":
+        params["pq_m"] = _pq_subquantizers(dim, index_config.get("pq_m", 16))
+        params["pq_bits"] = index_config.get("pq_bits", 8)
+        codec = f"PQ{params['pq_m']}x{params['pq_bits']}"
+    if index_type == "flat":
+        factory = codec
+    elif index_type == "hnsw":
+        params.update({"M": index_config.get("hnsw_m", 32), "efConstruction": index_config.get("ef_construction", 200)})
+        search = {"efSearch": index_config.get("ef_search", 64)}
+        factory = f"HNSW{params['M']}" if codec == "Flat" else f"HNSW{params['M']},{codec}"
+    else:
+        params["nlist"] = _default_nlist(n_vectors, index_config.get("nlist"))
+        search = {"nprobe": min(index_config.get("nprobe", 16), params["nlist"])}
+        factory = f"IVF{params['nlist']},{codec}"
+    rescore = storage == "pq"
+    if index_type == "ivf_pq":
+        storage = "pq"
+    if rescore:
+        factory += ",Refine(Flat)"
+        search["k_factor_rf"] = index_config.get("rescore_factor", 4)
+
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = params["efConstruction"]
+    # IVF stores arbitrary labels natively; flat/HNSW (and the refine wrapper) need an id map around them
+    if ids is not None and (index_type in ("flat", "hnsw") or rescore):
+        index = faiss.IndexIDMap2(index)
+    if not index.is_trained:
+        sample = _training_sample(embeddings, rows, n_vectors)
+        print(f"Training {factory} index on {len(sample)} of {n_vectors} vectors...")
+        index.train(sample)
+        del sample
+    for start, part in _row_slices(embeddings, rows):
+        if ids is not None:
+            index.add_with_ids(part, np.asarray(ids[start:start + len(part)], dtype=np.int64))
+        else:
+            index.add(part)
+    apply_search_params(index, search)
+
+    spec = {
+        "type": index_type,
+        "factory": factory,
+        "storage": storage,
+        "rescore": rescore,
+        "metric": "inner_product",
+        "dim": dim,
+        "ntotal": int(index.ntotal),
+        "params": params,
+        "search": search,
+        "id_mapped": ids is not None,
+    }
+    if factory != "Flat":
+        spec["recall"] = measure_recall(
+            index,
+            embeddings,
+            ids,
+            rows,
+            k=index_config.get("recall_k", RECALL_K),
+            n_queries=index_config.get("recall_queries", RECALL_QUERIES),
+        )
+        if spec["recall"]:
+            print(f"{factory}: recall@{spec['recall']['k']} vs exact search {spec['recall']['recall']:.3f} ({spec['recall']['queries']} queries).")
+    return index, spec
+
+
+def measure_recall(
+    index: faiss.Index,
+    embeddings: np.ndarray,
+    ids: Optional[np.ndarray] = None,
+    rows: Optional[np.ndarray] = None,
+    k: int = RECALL_K,
+    n_queries: int = RECALL_QUERIES,
+) -> Optional[Dict[str, Any]]:
+    """
+    Share of the exact top-`k` neighbours (brute-force inner product over
+    `embeddings`, read in ADD_BATCH slices) that `index` also returns in its
+    top `k`, for a sample of stored vectors used as queries. None if disabled
+    or the index is too small to say anything.
+    """
+    n_vectors = len(embeddings) if rows is None else len(rows)
+    if not n_queries or n_vectors <= k:
+        return None
+    picked = np.random.default_rng(0).choice(n_vectors, min(n_queries, n_vectors), replace=False)
+    queries = np.ascontiguousarray(embeddings[picked if rows is None else rows[picked]], dtype=np.float32)
+
+    depth = k + 1  # the query's own row comes back too
+    best_scores = np.full((len(queries), depth), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), depth), dtype=np.int64)
+    for start, part in _row_slices(embeddings, rows):
+        part_scores, part_rows = faiss.knn(queries, part, min(depth, len(part)), metric=faiss.METRIC_INNER_PRODUCT)
+        scores = np.concatenate([best_scores, part_scores], axis=1)
+        candidates = np.concatenate([best_rows, part_rows + start], axis=1)
+        top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(candidates, top, axis=1)
+
+    labels = np.arange(n_vectors) if ids is None else np.asarray(ids)
+    _, found = index.search(queries, depth)
+    hits = 0
+    for query_row, exact, approx in zip(picked, labels[best_rows], found):
+        own = labels[query_row]
+        exact = set(exact[exact != own][:k].tolist())
+        hits += len(exact.intersection(approx[approx != own][:k].tolist()))
+    return {"k": k, "queries": len(queries), "recall": round(hits / (k * len(queries)), 4)}
+
+
+def has_exact_codes(spec: Dict[str, Any]) -> bool:
+    """Whether the index gives its vectors back unchanged (float32 codes, or a re-scored index's float copy)."""
+    return spec.get("storage", "float32") == "float32" or bool(spec.get("rescore"))
+
+
+def reconstruct_vectors(
+    index: faiss.Index, spec: Dict[str, Any], ids: np.ndarray, exact: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Exact float32 vectors stored under `ids` in an id-mapped index: read back
+    from the index when its codes are lossless, else the rows of `exact`
+    (the version's EXACT_VECTORS_FILE).
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if has_exact_codes(spec):
+        enable_reconstruct(index, spec)
+        return index.reconstruct_batch(ids)
+    if exact is None:
+        raise ValueError(f"{spec.get('factory', spec['type'])} stores lossy codes; rebuilding it needs {EXACT_VECTORS_FILE}")
+    return np.ascontiguousarray(exact[ids], dtype=np.float32)
+
+
+def update_index(
+    index: faiss.Index,
+    spec: Dict[str, Any],
+    remove_ids: np.ndarray,
+    embeddings: np.ndarray,
+    ids: np.ndarray,
+    index_config: Dict[str, Any],
+    rows: Optional[np.ndarray] = None,
+    exact: Optional[np.ndarray] = None,
+) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Deletes `remove_ids` from an id-mapped index (loaded in memory, not mmapped)
+    and adds `embeddings` (or just its `rows`) under `ids`. Flat and IVF
+    indexes are edited in place; HNSW graphs cannot delete, so they are
+    rebuilt from their exact vectors (`exact`, row = chunk id, when the
+    stored codes are lossy). IVF centroids are not retrained; a full
+    rebuild refreshes them.
+
+    PQ storage with re-scoring (faiss cannot delete from a refine index) is
+    rebuilt from its exact float vectors, retraining the codebooks.
+    """
+    if len(remove_ids) == 0 and len(ids) == 0:
+        return index, spec
+
+    if spec["type"] == "hnsw" or spec.get("rescore"):
+        kept_ids = faiss.vector_to_array(index.id_map)
+        kept_ids = kept_ids[~np.isin(kept_ids, remove_ids)]
+        kept = reconstruct_vectors(index, spec, kept_ids, exact)
+        new = embeddings[:] if rows is None else embeddings[rows]
+        return build_index(
+            np.vstack([kept, new]).astype(np.float32),
+            {**index_config, "type": spec["type"], "storage": spec.get("storage", "float32")},
+            ids=np.concatenate([kept_ids, ids]),
+        )
+
+    if len(remove_ids):
+        index.remove_ids(faiss.IDSelectorBatch(np.asarray(remove_ids, dtype=np.int64)))
+    for start, part in _row_slices(embeddings, rows):
+        index.add_with_ids(part, np.asarray(ids[start:start + len(part)], dtype=np.int64))
+    # Recall was measured on the build; it no longer describes the edited index
+    spec = {key: value for key, value in spec.items() if key != "recall"}
+    return index, {**spec, "ntotal": int(index.ntotal)}
+
+
+def apply_search_params(index: faiss.Index, search: Dict[str, Any]):
+    """Sets search-time knobs (nprobe / efSearch) that apply to this index type."""
+    space = faiss.ParameterSpace()
+    for name, value in search.items():
+        if value is not None:
+            space.set_index_parameter(index, name, value)
+
+
+def search_overrides(spec: Dict[str, Any], index_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merges the search params saved at build time with the current config,
+    keeping only the knobs the saved index type understands.
+    """
+    search = dict(spec.get("search", {}))
+    if "nprobe" in search and index_config.get("nprobe"):
+        search["nprobe"] = index_config["nprobe"]
+    if "efSearch" in search and index_config.get("ef_search"):
+        search["efSearch"] = index_config["ef_search"]
+    if "k_factor_rf" in search and index_config.get("rescore_factor"):
+        search["k_factor_rf"] = index_config["rescore_factor"]
+    return search
+
+
+def _mmap_flags(index_type: str) -> int:
+    """
+    IO_FLAG_MMAP_IFC (faiss >= 1.9) maps flat/HNSW/IVF codes in place;
+    older builds can only map IVF inverted lists via IO_FLAG_MMAP.
+    """
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return 0
+
+
+def read_index(index_file: str, spec: Dict[str, Any], mmap: bool = True) -> Tuple[faiss.Index, str]:
+    """
+    Loads an index read-only and memory-mapped when this faiss build supports
+    it for the index type, so processes on one node share its pages.
+    Returns the index and the load mode used ("mmap" or "memory").
+    """
+    flags = _mmap_flags(spec.get("type", "flat")) if mmap else 0
+    if flags:
+        try:
+            return faiss.read_index(index_file, flags), "mmap"
+        except RuntimeError as e:
+            print(f"Memory-mapped load failed ({e}); reading index into memory.")
+    return faiss.read_index(index_file), "memory"
+
+
+def enable_reconstruct(index: faiss.Index, spec: Dict[str, Any]):
+    """
+    Lets `dense_scores` read vectors back by id. IVF codes are reachable by
+    id only through a direct map (id -> inverted list slot); flat, HNSW and
+    re-scored indexes reconstruct without one.
+    """
+    if spec.get("type") in ("ivf_flat", "ivf_pq") and not spec.get("rescore"):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def dense_scores(index: faiss.Index, query_vector: np.ndarray, ids: List[int]) -> List[Optional[float]]:
+    """
+    Similarity of the query to the stored vector of each of `ids` (None if
+    the index cannot return it), for hits only BM25 found. Approximate when
+    the stored codes are compressed.
+    """
+    scores: List[Optional[float]] = []
+    for i in ids:
+        try:
+            scores.append(float(index.reconstruct(int(i)) @ query_vector[0]))
+        except RuntimeError:
+            scores.append(None)
+    return scores
+
+
+def write_index(index: faiss.Index, index_file: str):
+    """Write-then-rename, so processes that mmap the old file keep a valid mapping."""
+    tmp_file = index_file + ".tmp"
+    faiss.write_index(index, tmp_file)
+    os.replace(tmp_file, index_file)
+
+
+def save_index_spec(vector_store_path: str, spec: Dict[str, Any]):
+    with open(os.path.join(vector_store_path, INDEX_SPEC_FILE), "w") as f:
+        json.dump(spec, f, indent=2)
+
+
+def load_index_spec(vector_store_path: str) -> Dict[str, Any]:
+    """Stores built before index specs existed are plain flat indexes."""
+    spec_file = os.path.join(vector_store_path, INDEX_SPEC_FILE)
+    if not os.path.exists(spec_file):
+        return {"type": "flat", "factory": "Flat", "metric": "inner_product", "params": {}, "search": {}}
+    with open(spec_file, "r") as f:
+        return json.load(f)
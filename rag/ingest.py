@@ -1,136 +1,646 @@
 import os
 import glob
-from typing import List, Dict
+import shutil
+from typing import List, Dict, Iterator, Optional, Tuple
 import yaml
 
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
-import pickle
-import pypdf
-import docx
+
+from rag.index_factory import (
+    EXACT_VECTORS_FILE, ADD_BATCH, build_index, update_index, read_index, reconstruct_vectors, resolve_index_type,
+    has_exact_codes, load_index_spec, save_index_spec, write_index,
+)
+from rag.chunk_store import SPANS_FILE, ChunkStoreWriter, open_chunk_store
+from rag.sparse_index import build_sparse_index
+from rag.partitions import build_partitions, update_partitions, infer_category, PARTITIONS_DIR, PARTITIONS_FILE
+from rag.versions import new_version, publish_version, prune_versions, resolve_current
+from rag.ingest_manifest import file_hash, load_ingest_manifest, save_ingest_manifest, live_chunk_count
+from rag.chunk_embedding_cache import ChunkEmbeddingCache
+from rag.extract import ExtractionCache, extract_documents
+from rag.ingest_staging import IngestStaging
+from rag.chunking import Chunk, TokenChunker, encode_token_ids, word_chunks
+from rag.near_duplicates import MINHASH_FILE, NearDuplicateIndex
+from rag.onnx_embedder import embedder_id
+from rag.embedding_client import connect_embedding_model
+
+# Compact (full rebuild) once more than this share of chunk ids are deleted
+MAX_DEAD_ID_RATIO = 0.5
+
+DOC_TYPES = ("txt", "pdf", "docx")
+
+# Never shrink embedding batches below this under memory pressure
+MIN_BATCH_SIZE = 16
+# Write pending chunk-cache rows to disk once this many are held in memory
+CACHE_FLUSH_ROWS = 65_536
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process; 0 where it cannot be read (no ceiling enforced)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
 
 class Ingestor:
     def __init__(self, config_path: str = "config.yaml"):
         with open(config_path, "r") as f:
             self.config = yaml.safe_load(f)
-        
+
         self.chunk_size = self.config["rag"]["chunk_size"]
         self.chunk_overlap = self.config["rag"]["chunk_overlap"]
         self.model_name = self.config["rag"]["embedding_model"]
+        self.backend_config = self.config["rag"].get("embedding_backend", {})
+        # Vectors from different backends are kept apart in caches and builds
+        self.embedder_id = embedder_id(self.model_name, self.backend_config.get("type", "torch"))
         self.vector_store_path = self.config["paths"]["vector_store"]
-        
-        print(f"Loading embedding model: {self.model_name}...")
-        self.model = SentenceTransformer(self.model_name)
-        
+        self.index_config = self.config["rag"].get("index", {})
+        self.hybrid_config = self.config["rag"].get("hybrid", {})
+        self.routing_config = self.config["rag"].get("routing", {})
+        self.keep_versions = self.config["rag"].get("keep_versions", 2)
+        self.extraction_config = self.config["rag"].get("extraction", {})
+        self.pipeline_config = self.config["rag"].get("pipeline", {})
+        self.chunking_config = self.config["rag"].get("chunking", {})
+        self.dedup_config = self.config["rag"].get("dedup", {})
+
+        print(f"Loading embedding model: {self.model_name} ({self.backend_config.get('type', 'torch')})...")
+        self.model = connect_embedding_model(
+            self.model_name, self.backend_config, self.config["rag"].get("embedding_server", {})
+        )
+
+        self.chunker = None
+        if self.chunking_config.get("unit", "tokens") == "tokens":
+            self.chunker = TokenChunker.for_model(
+                self.model,
+                max_tokens=self.chunking_config.get("max_tokens"),
+                overlap_tokens=self.chunking_config.get("overlap_tokens", 32),
+                legacy_words=self.chunk_size,
+                legacy_overlap=self.chunk_overlap,
+            )
+            if self.chunker is None:
+                print(f"{self.model_name} has no fast tokenizer; chunking by words.")
+
+        cache_config = self.config["rag"].get("embedding_cache", {})
+        self.embedding_cache = None
+        self.cache_hits = self.cache_misses = 0
+        if cache_config.get("enabled", True) and self.config["paths"].get("embeddings_cache"):
+            self.embedding_cache = ChunkEmbeddingCache(
+                self.config["paths"]["embeddings_cache"],
+                self.embedder_id,
+                self.model.get_sentence_embedding_dimension(),
+                dtype=cache_config.get("dtype", "float16"),
+                max_mb=cache_config.get("max_mb", 512),
+            )
+
     def load_documents(self) -> List[Dict]:
         """
         Loads document from data/raw.
         Returns a list of dicts: {'content': str, 'metadata': dict}
         """
-        raw_path = self.config["paths"]["data_raw"]
-        documents = []
-        
-        # 1. TXT files
-        for file_path in glob.glob(os.path.join(raw_path, "**", "*.txt"), recursive=True):
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                documents.append({
-                    "content": content,
-                    "metadata": {"source": os.path.basename(file_path), "type": "txt"}
-                })
-        
-        # 2. PDF files (Placeholder for pypdf logic)
-        # 2. PDF files
-        for file_path in glob.glob(os.path.join(raw_path, "**", "*.pdf"), recursive=True):
-            try:
-                content = self._read_pdf(file_path)
-                if content.strip():
-                    documents.append({
-                        "content": content,
-                        "metadata": {"source": os.path.basename(file_path), "type": "pdf"}
-                    })
-            except Exception as e:
-                print(f"Error reading PDF {file_path}: {e}")
-
-        # 3. DOCX files
-        for file_path in glob.glob(os.path.join(raw_path, "**", "*.docx"), recursive=True):
-            try:
-                content = self._read_docx(file_path)
-                if content.strip():
-                    documents.append({
-                        "content": content,
-                        "metadata": {"source": os.path.basename(file_path), "type": "docx"}
-                    })
-            except Exception as e:
-                print(f"Error reading DOCX {file_path}: {e}")
-
+        documents = [doc for _, _, doc in self._read_documents(self._scan_files()) if doc and doc["content"]]
         print(f"Loaded {len(documents)} documents.")
         return documents
 
-    def _read_pdf(self, file_path: str) -> str:
-        text = ""
-        with open(file_path, 'rb') as f:
-            reader = pypdf.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+    def _scan_files(self) -> List[Tuple[str, str]]:
+        """(path, type) of every TXT, PDF and DOCX file under data/raw."""
+        raw_path = self.config["paths"]["data_raw"]
+        files = []
+        for doc_type in DOC_TYPES:
+            for file_path in glob.glob(os.path.join(raw_path, "**", f"*.{doc_type}"), recursive=True):
+                files.append((file_path, doc_type))
+        return sorted(files)
+
+    def _read_documents(self, files: List[Tuple[str, str]]) -> Iterator[Tuple[str, str, Optional[Dict]]]:
+        """
+        Yields (path, type, document or None) for `files`, extracting PDF/DOCX
+        text in a process pool and reusing text cached by mtime and size.
+        The document is None when extraction failed or timed out; a PDF/DOCX
+        without text gets empty content.
+        """
+        cache = None
+        if self.extraction_config.get("cache_path"):
+            cache = ExtractionCache(self.extraction_config["cache_path"])
 
-    def _read_docx(self, file_path: str) -> str:
-        doc = docx.Document(file_path)
-        text = []
-        for para in doc.paragraphs:
-            text.append(para.text)
-        return "\n".join(text)
+        documents = extract_documents(
+            files,
+            workers=self.extraction_config.get("workers"),
+            max_in_flight=self.extraction_config.get("max_in_flight"),
+            timeout=self.extraction_config.get("timeout_seconds", 60),
+            cache=cache,
+        )
+        for file_path, doc_type, content in documents:
+            if content is None:
+                yield file_path, doc_type, None
+                continue
+            if doc_type != "txt" and not content.strip():
+                content = ""
+            yield file_path, doc_type, {"content": content, "metadata": self._metadata(file_path, content, doc_type)}
 
-    def chunk_text(self, text: str) -> List[str]:
+        if cache is not None:
+            print(f"Extraction cache: {cache.hits} of {sum(t != 'txt' for _, t in files)} PDF/DOCX files reused.")
+
+    def _prune_extraction_cache(self, files: List[Tuple[str, str]]):
+        if self.extraction_config.get("cache_path") and os.path.isdir(self.extraction_config["cache_path"]):
+            cache = ExtractionCache(self.extraction_config["cache_path"])
+            cache.prune({cache.key(path) for path, doc_type in files if doc_type != "txt"})
+
+    def _metadata(self, file_path: str, content: str, doc_type: str) -> Dict:
+        return {
+            "source": os.path.basename(file_path),
+            "type": doc_type,
+            "category": infer_category(file_path, content, self.config["paths"]["data_raw"]),
+        }
+
+    def chunk_text(self, text: str) -> List[Chunk]:
         """
-        Splits text into chunks with overlap.
+        Splits text into overlapping chunks that fit the embedding model's
+        window (token-sized, at sentence/paragraph breaks), or into
+        `chunk_size`-word windows when chunking by words.
         """
-        tokens = text.split() # Naive whitespace tokenization for speed
-        chunks = []
-        for i in range(0, len(tokens), self.chunk_size - self.chunk_overlap):
-            chunk = " ".join(tokens[i : i + self.chunk_size])
-            chunks.append(chunk)
-        return chunks
+        if self.chunker is not None:
+            return self.chunker.chunk(text)
+        return word_chunks(text, self.chunk_size, self.chunk_overlap)
+
+    def _build_settings(self) -> Dict:
+        """A change to any of these invalidates every stored vector or chunk id."""
+        return {
+            "embedding_model": self.embedder_id,
+            "chunking": (
+                {"unit": "tokens", "max_tokens": self.chunker.max_tokens, "overlap_tokens": self.chunker.overlap_tokens}
+                if self.chunker is not None
+                else {"unit": "words", "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+            ),
+            "index": self.index_config,
+            "routing": bool(self.routing_config.get("enabled", True)),
+            "dedup": self.dedup_config if self.dedup_config.get("enabled", True) else False,
+        }
+
+    def _full_rebuild_reason(self, previous: Optional[Dict], previous_path: str) -> Optional[str]:
+        if previous is None:
+            return "no ingest manifest in the current vector store"
+        if previous["settings"] != self._build_settings():
+            return "model, chunking or index settings changed"
+        spec = load_index_spec(previous_path)
+        if not spec.get("id_mapped"):
+            return "current index is not id-mapped"
+        if self._keeps_exact_vectors(spec) and not os.path.exists(os.path.join(previous_path, EXACT_VECTORS_FILE)):
+            return "exact vectors of the compressed index missing"
+        if previous["settings"]["routing"] and not os.path.exists(os.path.join(previous_path, PARTITIONS_DIR, PARTITIONS_FILE)):
+            return "category sub-indexes missing"
+        if previous["settings"].get("dedup") and not os.path.exists(os.path.join(previous_path, MINHASH_FILE)):
+            return "near-duplicate signatures missing"
+        if previous["next_id"] and 1 - live_chunk_count(previous) / previous["next_id"] > MAX_DEAD_ID_RATIO:
+            return "compacting deleted chunk ids"
+        return None
 
-    def process_and_index(self):
+    def process_and_index(self, full: bool = False):
         """
         Main workflow: Load -> Chunk -> Embed -> Index -> Save
+
+        Only files whose content hash differs from the current version are
+        read and embedded; chunks of changed or removed files are deleted from
+        the id-mapped indexes. `full` (or a settings change) rebuilds everything.
         """
-        documents = self.load_documents()
-        all_chunks = []
-        all_metadata = []
-
-        for doc in documents:
-            chunks = self.chunk_text(doc["content"])
-            for chunk in chunks:
-                all_chunks.append(chunk)
-                all_metadata.append(doc["metadata"])
-        
-        if not all_chunks:
+        raw_path = self.config["paths"]["data_raw"]
+        files = self._scan_files()
+        hashes = {os.path.relpath(path, raw_path): file_hash(path) for path, _ in files}
+
+        previous_version, previous_path = resolve_current(self.vector_store_path)
+        previous = load_ingest_manifest(previous_path)
+        reason = "requested" if full else self._full_rebuild_reason(previous, previous_path)
+        if reason:
+            print(f"Full rebuild: {reason}.")
+            previous = None
+
+        previous_files = previous["files"] if previous else {}
+        # Files whose extraction failed are read again even when unchanged
+        kept = {
+            rel: entry for rel, entry in previous_files.items() if hashes.get(rel) == entry["hash"] and not entry.get("error")
+        }
+        stale = [entry for rel, entry in previous_files.items() if rel not in kept]
+        # A file whose duplicate chunks were collapsed into chunks now being
+        # removed has to be read again (and so on, transitively)
+        removed_ids = {chunk_id for entry in stale for chunk_id in range(*entry["ids"])}
+        orphaned = [rel for rel, entry in kept.items() if removed_ids.intersection(entry.get("dups", ()))]
+        while orphaned:
+            for rel in orphaned:
+                stale.append(kept.pop(rel))
+                removed_ids.update(range(*stale[-1]["ids"]))
+            orphaned = [rel for rel, entry in kept.items() if removed_ids.intersection(entry.get("dups", ()))]
+        to_embed = [(path, doc_type) for path, doc_type in files if os.path.relpath(path, raw_path) not in kept]
+        if previous and not stale and not to_embed:
+            print("Vector store is up to date; nothing to ingest.")
+            return
+        removed = [rel for rel in previous_files if rel not in hashes]
+        print(f"{len(kept)} files unchanged, {len(to_embed)} new or changed, {len(removed)} removed.")
+
+        # Each file gets a contiguous range of chunk ids; ids are never reused.
+        # New chunks and their vectors are staged on disk batch by batch, so
+        # memory stays flat and a crashed run resumes where it stopped.
+        first_id = previous["next_id"] if previous else 0
+        staging = IngestStaging(
+            self.vector_store_path,
+            {"base_version": previous_version if previous else None, "settings": self._build_settings(), "first_id": first_id},
+            self.model.get_sentence_embedding_dimension(),
+            hashes,
+            signature_width=self.dedup_config.get("num_perm", 64) if self.dedup_config.get("enabled", True) else 0,
+        )
+        if staging.resumed:
+            print(f"Resuming: {len(staging.files)} files ({staging.committed} chunks) already embedded.")
+        near_duplicates = self._near_duplicate_index(previous_path if previous else None, kept, staging)
+        self._embed_files(
+            [(path, doc_type) for path, doc_type in to_embed if os.path.relpath(path, raw_path) not in staging.files],
+            staging,
+            hashes,
+            near_duplicates,
+        )
+        del near_duplicates
+        staging.close()
+
+        manifest_files = {**kept, **staging.files}
+        next_id = first_id + staging.committed
+        live_count = sum(end - start for start, end in (entry["ids"] for entry in manifest_files.values()))
+        if live_count == 0:
+            staging.discard()
             print("No documents found to process.")
             return
 
-        print(f"Generated {len(all_chunks)} chunks. Embedding...")
-        embeddings = self.model.encode(all_chunks, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype('float32')
+        # Crossing an index type threshold needs a new index over every live
+        # chunk; unchanged ones are read back from the current build, not re-embedded
+        retype = False
+        if previous and self.index_config.get("type", "auto") == "auto":
+            retype = resolve_index_type("auto", live_chunk_count(previous)) != resolve_index_type("auto", live_count)
+            if retype:
+                print("Corpus size crossed an index type threshold; rebuilding the index.")
 
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension) # Cosine similarity = Inner Product with normalized vectors
-        faiss.normalize_L2(embeddings)
-        index.add(embeddings)
+        new_ids = np.arange(first_id, next_id, dtype=np.int64)
+        remove_ids = np.concatenate(
+            [np.arange(*entry["ids"], dtype=np.int64) for entry in stale] or [np.zeros(0, dtype=np.int64)]
+        )
+        embeddings = staging.vectors()
 
-        # Save index and metadata
+        exact = None
+        if previous and os.path.exists(os.path.join(previous_path, EXACT_VECTORS_FILE)):
+            exact = np.load(os.path.join(previous_path, EXACT_VECTORS_FILE), mmap_mode="r")
+        if retype:
+            vectors, live_ids = self._live_vectors(previous_path, exact, kept, first_id, staging)
+            index, spec = build_index(vectors, self.index_config, ids=live_ids, rows=live_ids)
+            print(f"Built {spec['type']} index ({spec['factory']}, {spec['storage']} vectors).")
+        elif previous:
+            spec = load_index_spec(previous_path)
+            index, _ = read_index(os.path.join(previous_path, "index.faiss"), spec, mmap=False)
+            index, spec = update_index(index, spec, remove_ids, embeddings, new_ids, self.index_config, exact=exact)
+            print(f"Updated {spec['type']} index: -{len(remove_ids)} +{len(new_ids)} chunks.")
+        else:
+            index, spec = build_index(embeddings, self.index_config, ids=new_ids)
+            print(f"Built {spec['type']} index ({spec['factory']}, {spec['storage']} vectors).")
+
+        # Every build goes to a fresh version directory; running retrievers keep
+        # serving the previous one until CURRENT is switched below.
         os.makedirs(self.vector_store_path, exist_ok=True)
-        faiss.write_index(index, os.path.join(self.vector_store_path, "index.faiss"))
-        
-        with open(os.path.join(self.vector_store_path, "chunks.pkl"), "wb") as f:
-            pickle.dump((all_chunks, all_metadata), f)
-            
-        print(f"Index saved to {self.vector_store_path}")
+        version, output_path = new_version(self.vector_store_path)
+        try:
+            write_index(index, os.path.join(output_path, "index.faiss"))
+            save_index_spec(output_path, spec)
+            print(f"index.faiss: {os.path.getsize(os.path.join(output_path, 'index.faiss')) / 2 ** 20:.1f} MB for {spec['ntotal']} vectors.")
+            del index
+            if self._keeps_exact_vectors(spec):
+                # A retype reads the previous build back into `vectors`; a lossless
+                # previous build has no vectors.npy to copy from
+                self._write_exact_vectors(output_path, first_id, vectors if retype else exact, staging)
+
+            self._write_chunk_store(output_path, first_id, manifest_files, previous_path if previous else None, staging)
+            self._write_spans(output_path, first_id, previous_path if previous else None, staging)
+            if staging.signature_width:
+                self._write_signatures(output_path, first_id, previous_path if previous else None, staging)
+            chunk_store = open_chunk_store(output_path)
+            vocab_size = build_sparse_index(
+                (chunk_store.text(i) for i in range(len(chunk_store))),
+                output_path,
+                k1=self.hybrid_config.get("bm25_k1", 1.2),
+                b=self.hybrid_config.get("bm25_b", 0.75),
+            )
+            chunk_store.close()
+            print(f"BM25 index built ({vocab_size} terms).")
+
+            if self.routing_config.get("enabled", True):
+                if retype:
+                    categories = self._categories(manifest_files, live_ids)
+                    counts = build_partitions(vectors, categories, output_path, self.index_config, ids=live_ids, rows=live_ids)
+                elif previous:
+                    categories = self._categories(staging.files, new_ids)
+                    counts = update_partitions(
+                        previous_path, output_path, remove_ids, embeddings, new_ids, categories, self.index_config, exact=exact
+                    )
+                else:
+                    categories = self._categories(staging.files, new_ids)
+                    counts = build_partitions(embeddings, categories, output_path, self.index_config, ids=new_ids)
+                print(f"Category sub-indexes: {counts}")
+
+            # The manifest is part of the version, so index, chunks and manifest go live together
+            save_ingest_manifest(output_path, {"settings": self._build_settings(), "next_id": next_id, "files": manifest_files})
+        except BaseException:
+            # Leave no half-built version behind; staging keeps the embeddings for a retry
+            shutil.rmtree(output_path, ignore_errors=True)
+            raise
+        del embeddings, exact
+        if retype:
+            del vectors
+
+        publish_version(self.vector_store_path, version, {"chunks": live_count, "index_type": spec["type"]})
+        prune_versions(self.vector_store_path, keep=self.keep_versions)
+        staging.discard()
+        if self.embedding_cache is not None:
+            self.embedding_cache.save()
+        self._prune_extraction_cache(files)
+
+        print(f"Index version {version} saved to {output_path}")
+
+    def _near_duplicate_index(
+        self, previous_path: Optional[str], kept: Dict[str, Dict], staging: IngestStaging
+    ) -> Optional[NearDuplicateIndex]:
+        """LSH index over the signatures of every chunk that stays live (kept files and already staged ones)."""
+        if not self.dedup_config.get("enabled", True):
+            return None
+        stored = None
+        if previous_path:
+            stored = np.load(os.path.join(previous_path, MINHASH_FILE), mmap_mode="r")
+        near_duplicates = NearDuplicateIndex(
+            num_perm=self.dedup_config.get("num_perm", 64),
+            bands=self.dedup_config.get("bands", 16),
+            shingle=self.dedup_config.get("shingle", 3),
+            threshold=self.dedup_config.get("threshold", 0.85),
+            stored=stored,
+        )
+        if stored is not None:
+            for entry in kept.values():
+                near_duplicates.add_stored(*entry["ids"])
+        staged = staging.signatures()
+        first_id = staging.run["first_id"]
+        for entry in staging.files.values():
+            start, end = entry["ids"]
+            near_duplicates.add_range(start, staged[start - first_id : end - first_id])
+        return near_duplicates
+
+    def _embed_files(
+        self,
+        files: List[Tuple[str, str]],
+        staging: IngestStaging,
+        hashes: Dict[str, str],
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+    ):
+        """
+        Streams load -> chunk -> dedup -> embed -> stage. Chunks are embedded in
+        batches of `rag.pipeline.batch_size` and each batch is committed together
+        with the files it completes. Every stage pulls from the previous one, so
+        at most one batch plus one document's chunks are in memory; past
+        `memory_limit_mb` the batch size is halved.
+
+        A chunk that near-duplicates a live or earlier chunk gets no id of its
+        own; the file records the surviving chunk's id under "dups" instead.
+        """
+        raw_path = self.config["paths"]["data_raw"]
+        batch_size = self.pipeline_config.get("batch_size", 256)
+        memory_limit_mb = self.pipeline_config.get("memory_limit_mb")
+        buffer: List[Chunk] = []
+        signature_buffer: List[np.ndarray] = []
+        duplicates_removed = 0
+        failed = 0
+        self.cache_hits = self.cache_misses = 0
+        waiting: List[Tuple[str, Dict]] = []
+
+        def release_finished():
+            while waiting and waiting[0][1]["ids"][1] <= staging.next_id:
+                staging.add_file(*waiting.pop(0))
+
+        def flush(n: int):
+            nonlocal batch_size
+            batch = buffer[:n]
+            signatures = np.stack(signature_buffer[:n]) if near_duplicates is not None else None
+            staging.append([c.text for c in batch], self.embed_chunks(batch), [(c.start, c.end) for c in batch], signatures)
+            del buffer[:n]
+            del signature_buffer[:n]
+            release_finished()
+            staging.commit()
+            if self.embedding_cache is not None and self.embedding_cache.pending >= CACHE_FLUSH_ROWS:
+                self.embedding_cache.save()
+            if memory_limit_mb and batch_size > MIN_BATCH_SIZE and current_rss_mb() > memory_limit_mb:
+                batch_size = max(MIN_BATCH_SIZE, batch_size // 2)
+                print(f"RSS above {memory_limit_mb} MB; embedding batch size lowered to {batch_size}.")
+
+        for file_path, doc_type, doc in self._read_documents(files):
+            rel = os.path.relpath(file_path, raw_path)
+            chunks = self.chunk_text(doc["content"]) if doc and doc["content"] else []
+            start = staging.next_id + len(buffer)
+            duplicate_of = set()
+            if near_duplicates is not None and chunks:
+                unique = []
+                for chunk, signature in zip(chunks, near_duplicates.signatures([c.text for c in chunks])):
+                    canonical = near_duplicates.find(signature)
+                    if canonical is None:
+                        near_duplicates.add(start + len(unique), signature)
+                        unique.append(chunk)
+                        signature_buffer.append(signature)
+                    else:
+                        duplicate_of.add(canonical)
+                duplicates_removed += len(chunks) - len(unique)
+                chunks = unique
+            # Empty files are recorded too, so they are not re-read every run;
+            # files that could not be extracted are flagged for a retry
+            entry = {"hash": hashes[rel], "ids": [start, start + len(chunks)], "metadata": doc["metadata"] if doc else {}}
+            if doc is None:
+                entry["error"] = True
+                failed += 1
+            if duplicate_of:
+                entry["dups"] = sorted(duplicate_of)
+            waiting.append((rel, entry))
+            buffer.extend(chunks)
+            while len(buffer) >= batch_size:
+                flush(batch_size)
+            release_finished()
+
+        if buffer:
+            flush(len(buffer))
+        release_finished()
+        staging.commit()
+        print(f"Embedded {staging.committed} new chunks.")
+        if failed:
+            print(f"{failed} files could not be extracted; they are retried on the next run.")
+        if self.embedding_cache is not None:
+            print(f"Embedding cache: {self.cache_hits} hits, {self.cache_misses} encoded.")
+        if near_duplicates is not None:
+            print(f"Near-duplicate chunks removed: {duplicates_removed}.")
+        if self.chunker is not None and self.chunker.legacy_summary():
+            print(self.chunker.legacy_summary())
+
+    def embed_chunks(self, chunks: List[Chunk]) -> np.ndarray:
+        """
+        L2-normalized float32 embeddings of `chunks`. Chunks already in the
+        persistent embedding cache are not re-encoded; token-chunked ones are
+        encoded from their token ids without re-tokenizing.
+        """
+        if self.embedding_cache is not None:
+            embeddings, missing = self.embedding_cache.lookup([c.text for c in chunks])
+            self.cache_hits += len(chunks) - len(missing)
+            self.cache_misses += len(missing)
+        else:
+            embeddings = np.zeros((len(chunks), self.model.get_sentence_embedding_dimension()), dtype='float32')
+            missing = list(range(len(chunks)))
+
+        if missing:
+            texts = [chunks[i].text for i in missing]
+            if all(chunks[i].token_ids is not None for i in missing):
+                encoded = encode_token_ids(self.model, [chunks[i].token_ids for i in missing])
+            else:
+                encoded = np.array(self.model.encode(texts)).astype('float32')
+            # Create FAISS index (cosine similarity = inner product with normalized vectors)
+            faiss.normalize_L2(encoded)
+            embeddings[missing] = encoded
+            if self.embedding_cache is not None:
+                self.embedding_cache.add(texts, encoded)
+        # Cached rows may be float16; renormalize so inner product stays cosine
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def _write_chunk_store(
+        self, output_path: str, first_id: int, files: Dict[str, Dict], previous_path: Optional[str], staging: IngestStaging
+    ):
+        """
+        Streams one row per chunk id into the version's chunk store so row
+        number == id: live rows below `first_id` are copied from the previous
+        version, deleted ids become empty rows, and the staged chunks follow
+        with their file's metadata. A chunk that near-duplicates chunks of other
+        files lists every file under `sources`. Character spans go to their own
+        fixed-width column (`_write_spans`), not the dictionary-encoded metadata.
+        """
+        file_metadata: List[Dict] = [{} for _ in range(first_id + staging.committed)]
+        duplicate_sources: Dict[int, set] = {}
+        for entry in files.values():
+            start, end = entry["ids"]
+            file_metadata[start:end] = [entry["metadata"]] * (end - start)
+            for chunk_id in entry.get("dups", ()):
+                duplicate_sources.setdefault(chunk_id, set()).add(entry["metadata"]["source"])
+
+        def merge_sources(chunk_id: int, meta: Dict) -> Dict:
+            meta = {key: value for key, value in meta.items() if key != "sources"}
+            sources = duplicate_sources.get(chunk_id, set()) | {meta["source"]}
+            if len(sources) > 1:
+                meta["sources"] = sorted(sources)
+            return meta
+
+        previous_store = open_chunk_store(previous_path) if previous_path else None
+
+        def texts():
+            for chunk_id in range(first_id):
+                yield previous_store.text(chunk_id) if file_metadata[chunk_id] else ""
+            yield from staging.texts()
+
+        def metadata():
+            for chunk_id in range(first_id):
+                yield merge_sources(chunk_id, previous_store.metadata(chunk_id)) if file_metadata[chunk_id] else {}
+            for chunk_id in range(first_id, first_id + staging.committed):
+                yield merge_sources(chunk_id, file_metadata[chunk_id])
+
+        writer = ChunkStoreWriter(output_path)
+        writer.append(texts(), metadata())
+        writer.close()
+        if previous_store:
+            previous_store.close()
+
+    def _write_spans(self, output_path: str, first_id: int, previous_path: Optional[str], staging: IngestStaging):
+        """Per-id character spans of this version (rows of deleted ids are left stale, -1 where unknown)."""
+        out = np.lib.format.open_memmap(
+            os.path.join(output_path, SPANS_FILE), mode="w+", dtype=np.int64, shape=(first_id + staging.committed, 2)
+        )
+        out[:first_id] = -1
+        if previous_path and first_id and os.path.exists(os.path.join(previous_path, SPANS_FILE)):
+            previous = np.load(os.path.join(previous_path, SPANS_FILE), mmap_mode="r")
+            out[:first_id] = previous[:first_id]
+        out[first_id:] = staging.spans()
+        out.flush()
+        del out
+
+    def _live_vectors(
+        self,
+        previous_path: str,
+        exact: Optional[np.ndarray],
+        kept: Dict[str, Dict],
+        first_id: int,
+        staging: IngestStaging,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (vectors by chunk id, live ids) for a rebuild: kept files' vectors read
+        back from the current build, new ones from staging. The array is
+        memory-mapped in the staging directory; rows of deleted ids stay zero.
+        """
+        kept_ids = np.sort(np.concatenate(
+            [np.arange(*entry["ids"], dtype=np.int64) for entry in kept.values()] or [np.zeros(0, dtype=np.int64)]
+        ))
+        spec = load_index_spec(previous_path)
+        index, _ = read_index(os.path.join(previous_path, "index.faiss"), spec)
+        vectors = np.lib.format.open_memmap(
+            os.path.join(staging.path, "live_vectors.npy"), mode="w+", dtype=np.float32, shape=(first_id + staging.committed, staging.dim)
+        )
+        for start in range(0, len(kept_ids), ADD_BATCH):
+            batch = kept_ids[start:start + ADD_BATCH]
+            vectors[batch] = reconstruct_vectors(index, spec, batch, exact)
+        del index
+        new = staging.vectors()
+        for start in range(0, staging.committed, ADD_BATCH):
+            vectors[first_id + start:first_id + start + ADD_BATCH] = new[start:start + ADD_BATCH]
+        vectors.flush()
+        return vectors, np.concatenate([kept_ids, np.arange(first_id, first_id + staging.committed, dtype=np.int64)])
+
+    @staticmethod
+    def _categories(files: Dict[str, Dict], ids: np.ndarray) -> List[str]:
+        """Category of each of the (sorted) chunk `ids`, taken from the files they belong to."""
+        categories = [""] * len(ids)
+        for entry in files.values():
+            start, end = entry["ids"]
+            if end > start:
+                offset = int(np.searchsorted(ids, start))
+                categories[offset:offset + end - start] = [entry["metadata"]["category"]] * (end - start)
+        return categories
+
+    def _keeps_exact_vectors(self, spec: Dict) -> bool:
+        # Sub-indexes can fall back to a different codec than the global index,
+        # so the configured storage decides too
+        return not has_exact_codes(spec) or self.index_config.get("storage", "float32") != "float32"
+
+    def _write_exact_vectors(
+        self, output_path: str, first_id: int, previous: Optional[np.ndarray], staging: IngestStaging
+    ):
+        """Float32 vectors of this version by chunk id, so compressed indexes are rebuilt from exact values."""
+        out = np.lib.format.open_memmap(
+            os.path.join(output_path, EXACT_VECTORS_FILE), mode="w+", dtype=np.float32, shape=(first_id + staging.committed, staging.dim)
+        )
+        for start in range(0, first_id, ADD_BATCH):
+            out[start:min(start + ADD_BATCH, first_id)] = previous[start:min(start + ADD_BATCH, first_id)]
+        vectors = staging.vectors()
+        for start in range(0, staging.committed, ADD_BATCH):
+            out[first_id + start:first_id + start + ADD_BATCH] = vectors[start:start + ADD_BATCH]
+        out.flush()
+        del out
+
+    def _write_signatures(self, output_path: str, first_id: int, previous_path: Optional[str], staging: IngestStaging):
+        """Per-id near-duplicate signatures of this version (rows of deleted ids are left stale)."""
+        out = np.lib.format.open_memmap(
+            os.path.join(output_path, MINHASH_FILE), mode="w+", dtype=np.uint32, shape=(first_id + staging.committed, staging.signature_width)
+        )
+        if previous_path and first_id:
+            out[:first_id] = np.load(os.path.join(previous_path, MINHASH_FILE), mmap_mode="r")[:first_id]
+        out[first_id:] = staging.signatures()
+        out.flush()
+        del out
+
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or update the vector store")
+    parser.add_argument("--full", action="store_true", help="Re-embed every document, not just changed files")
+    args = parser.parse_args()
+
     ingestor = Ingestor()
-    ingestor.process_and_index()
+    ingestor.process_and_index(full=args.full)
@@ -0,0 +1,38 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+# Written into each vector store version next to the index, so the two can
+# never disagree:
+#   settings   model / chunking / index config the build was made with
+#   next_id    first chunk id not yet handed out (ids are never reused)
+#   files      source path (relative to data/raw) -> {hash, ids: [start, end), metadata}
+INGEST_MANIFEST_FILE = "ingest_manifest.json"
+
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_ingest_manifest(vector_store_path: str) -> Optional[Dict[str, Any]]:
+    manifest_file = os.path.join(vector_store_path, INGEST_MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def save_ingest_manifest(vector_store_path: str, manifest: Dict[str, Any]):
+    tmp_file = os.path.join(vector_store_path, INGEST_MANIFEST_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, os.path.join(vector_store_path, INGEST_MANIFEST_FILE))
+
+
+def live_chunk_count(manifest: Dict[str, Any]) -> int:
+    return sum(end - start for start, end in (entry["ids"] for entry in manifest["files"].values()))
@@ -0,0 +1,182 @@
+import json
+import mmap
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Work area of an ingestion run, under <vector_store>/staging/:
+#   progress.json      run identity + files committed so far
+#   new.vectors.f32    float32[n, dim] embeddings of the new chunks, appended per batch
+#   new.text.bin       their UTF-8 text, appended per batch
+#   new.offsets.i64    int64 end offset of each chunk in new.text.bin
+#   new.spans.i64      int64[n, 2] [start, end) character span of each chunk in its document
+#   new.minhash.u32    uint32[n, signature_width] near-duplicate signatures (when dedup is on)
+# Only data covered by progress.json counts; anything after it (a batch in
+# flight when the process died) is truncated away when the run resumes.
+STAGING_DIR = "staging"
+PROGRESS_FILE = "progress.json"
+VECTORS_FILE = "new.vectors.f32"
+TEXT_FILE = "new.text.bin"
+OFFSETS_FILE = "new.offsets.i64"
+SPANS_FILE = "new.spans.i64"
+SIGNATURES_FILE = "new.minhash.u32"
+
+
+class IngestStaging:
+    """
+    Append-only store for the chunks and embeddings an ingestion run produces.
+    Commits happen at file boundaries, so a resumed run skips every file
+    whose chunks were committed and redoes at most one batch.
+    """
+
+    def __init__(
+        self, vector_store_path: str, run: Dict[str, Any], dim: int, hashes: Dict[str, str], signature_width: int = 0
+    ):
+        """
+        `run` identifies the build (base version, settings, first chunk id);
+        staged work from a different run, or covering a file that has since
+        changed, is discarded.
+        """
+        self.path = os.path.join(vector_store_path, STAGING_DIR)
+        self.dim = dim
+        self.signature_width = signature_width
+        progress = self._load_progress()
+        resumable = (
+            progress is not None
+            and progress["run"] == run
+            and progress["dim"] == dim
+            and all(hashes.get(rel) == entry["hash"] for rel, entry in progress["files"].items())
+        )
+        if not resumable:
+            shutil.rmtree(self.path, ignore_errors=True)
+            progress = {"run": run, "dim": dim, "files": {}, "chunks": 0, "text_bytes": 0}
+        os.makedirs(self.path, exist_ok=True)
+
+        self.run = run
+        self.files: Dict[str, Dict[str, Any]] = progress["files"]
+        self.committed = progress["chunks"]
+        self.committed_text_bytes = progress["text_bytes"]
+        self.resumed = resumable and self.committed + len(self.files) > 0
+
+        # Drop whatever was appended after the last commit
+        for name, size in (
+            (VECTORS_FILE, self.committed * dim * 4),
+            (TEXT_FILE, self.committed_text_bytes),
+            (OFFSETS_FILE, self.committed * 8),
+            (SPANS_FILE, self.committed * 16),
+            (SIGNATURES_FILE, self.committed * signature_width * 4),
+        ):
+            with open(os.path.join(self.path, name), "ab") as f:
+                f.truncate(size)
+        self._vectors = open(os.path.join(self.path, VECTORS_FILE), "ab")
+        self._text = open(os.path.join(self.path, TEXT_FILE), "ab")
+        self._offsets = open(os.path.join(self.path, OFFSETS_FILE), "ab")
+        self._spans = open(os.path.join(self.path, SPANS_FILE), "ab")
+        self._signatures = open(os.path.join(self.path, SIGNATURES_FILE), "ab")
+
+        self.count = self.committed
+        self._text_end = self.committed_text_bytes
+        self._pending_ends: List[int] = []
+        self._pending_files: Dict[str, Dict[str, Any]] = {}
+
+    def _load_progress(self) -> Optional[Dict[str, Any]]:
+        progress_file = os.path.join(self.path, PROGRESS_FILE)
+        if not os.path.exists(progress_file):
+            return None
+        with open(progress_file, "r") as f:
+            return json.load(f)
+
+    @property
+    def next_id(self) -> int:
+        return self.run["first_id"] + self.count
+
+    def append(self, chunks: List[str], embeddings: np.ndarray, spans: np.ndarray, signatures: Optional[np.ndarray] = None):
+        """Stages one batch of chunks; not durable until a later `commit`."""
+        ends = []
+        for text in chunks:
+            data = text.encode("utf-8")
+            self._text.write(data)
+            self._text_end += len(data)
+            ends.append(self._text_end)
+        self._offsets.write(np.asarray(ends, dtype=np.int64).tobytes())
+        self._vectors.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        self._spans.write(np.asarray(spans, dtype=np.int64).reshape(-1, 2).tobytes())
+        if self.signature_width:
+            self._signatures.write(np.ascontiguousarray(signatures, dtype=np.uint32).tobytes())
+        self._pending_ends.extend(ends)
+        self.count += len(chunks)
+
+    def add_file(self, rel: str, entry: Dict[str, Any]):
+        """Marks a file as done once all of its chunks have been appended."""
+        self._pending_files[rel] = entry
+
+    def commit(self):
+        """Makes every finished file (and the chunks up to its end) durable."""
+        if not self._pending_files:
+            return
+        first_id = self.run["first_id"]
+        end = max(first_id + self.committed, max(entry["ids"][1] for entry in self._pending_files.values()))
+        new_committed = end - first_id
+        text_bytes = self._pending_ends[new_committed - self.committed - 1] if new_committed > self.committed else self.committed_text_bytes
+
+        for f in (self._vectors, self._text, self._offsets, self._spans, self._signatures):
+            f.flush()
+            os.fsync(f.fileno())
+
+        files = {**self.files, **self._pending_files}
+        tmp_file = os.path.join(self.path, PROGRESS_FILE + ".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump({"run": self.run, "dim": self.dim, "files": files, "chunks": new_committed, "text_bytes": text_bytes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, os.path.join(self.path, PROGRESS_FILE))
+
+        self._pending_ends = self._pending_ends[new_committed - self.committed:]
+        self.files = files
+        self.committed = new_committed
+        self.committed_text_bytes = text_bytes
+        self._pending_files = {}
+
+    def close(self):
+        for f in (self._vectors, self._text, self._offsets, self._spans, self._signatures):
+            f.close()
+
+    def vectors(self) -> np.ndarray:
+        """Committed embeddings, memory-mapped read-only."""
+        if self.committed == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.committed, self.dim))
+
+    def spans(self) -> np.ndarray:
+        """Committed [start, end) character spans, memory-mapped read-only."""
+        if self.committed == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.memmap(os.path.join(self.path, SPANS_FILE), dtype=np.int64, mode="r", shape=(self.committed, 2))
+
+    def signatures(self) -> np.ndarray:
+        """Committed near-duplicate signatures, memory-mapped read-only."""
+        if self.committed == 0 or not self.signature_width:
+            return np.zeros((self.committed, self.signature_width), dtype=np.uint32)
+        return np.memmap(
+            os.path.join(self.path, SIGNATURES_FILE), dtype=np.uint32, mode="r", shape=(self.committed, self.signature_width)
+        )
+
+    def texts(self) -> Iterator[str]:
+        """Committed chunk texts in id order, read back from disk."""
+        if self.committed == 0:
+            return
+        ends = np.memmap(os.path.join(self.path, OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self.committed,))
+        with open(os.path.join(self.path, TEXT_FILE), "rb") as f:
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.committed_text_bytes else b""
+            start = 0
+            for end in ends:
+                yield text[start:end].decode("utf-8")
+                start = int(end)
+            if isinstance(text, mmap.mmap):
+                text.close()
+
+    def discard(self):
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,127 @@
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Stored next to the index in every vector store version: uint32[next_id, num_perm]
+# MinHash signature per chunk id, so later incremental runs can match new
+# chunks against the existing corpus without re-reading it.
+MINHASH_FILE = "minhash.npy"
+
+_EMPTY = np.iinfo(np.uint32).max
+
+
+class NearDuplicateIndex:
+    """
+    MinHash over word shingles with LSH banding. `find` returns the id of an
+    indexed chunk whose estimated Jaccard similarity to the given signature is
+    at least `threshold`. With the default 16 bands x 4 rows a pair at 0.85
+    shares a band with probability > 0.999 and a pair at 0.3 with ~0.12;
+    band collisions are then checked against the full signatures.
+
+    Signatures live in one uint32[n, num_perm] table indexed by chunk id:
+    `stored` (e.g. a memory-mapped MINHASH_FILE) for ids below its length,
+    then a growable in-memory buffer. Buckets map a band hash to a chunk id.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle: int = 3,
+        threshold: float = 0.85,
+        seed: int = 1,
+        stored: Optional[np.ndarray] = None,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.threshold = threshold
+        # Multiply-shift hash family: h_i(x) = (a_i * x + b_i) >> 32, a_i odd
+        rng = np.random.RandomState(seed)
+        self._a = (rng.randint(0, 2 ** 32, num_perm, dtype=np.uint64) << np.uint64(32)) | rng.randint(0, 2 ** 32, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = (rng.randint(0, 2 ** 32, num_perm, dtype=np.uint64) << np.uint64(32)) | rng.randint(0, 2 ** 32, num_perm, dtype=np.uint64)
+        # Band hash: sum of the band's rows times odd multipliers (wrapping uint64)
+        self._mix = (rng.randint(0, 2 ** 32, self.rows, dtype=np.uint64) << np.uint64(32)) | rng.randint(0, 2 ** 32, self.rows, dtype=np.uint64) | np.uint64(1)
+        self._stored = stored if stored is not None else np.zeros((0, num_perm), dtype=np.uint32)
+        self._buffer = np.full((0, num_perm), _EMPTY, dtype=np.uint32)
+        self._buckets: List[Dict[int, int]] = [{} for _ in range(bands)]
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in text.lower().split()), dtype=np.uint64)
+        if len(words) < self.shingle:
+            return words
+        # Combine `shingle` consecutive word hashes (wrapping uint64 arithmetic)
+        hashes = np.zeros(len(words) - self.shingle + 1, dtype=np.uint64)
+        for k in range(self.shingle):
+            hashes = hashes * np.uint64(0x100000001B3) + words[k : len(words) - self.shingle + 1 + k]
+        return np.unique(hashes)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """uint32[len(texts), num_perm]; a text without words gets an all-max row that never matches."""
+        out = np.full((len(texts), self.num_perm), _EMPTY, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            for i, text in enumerate(texts):
+                shingles = self._shingles(text)
+                if len(shingles):
+                    out[i] = ((self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)).min(axis=1)
+        return out
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        with np.errstate(over="ignore"):
+            return (signature.reshape(self.bands, self.rows).astype(np.uint64) * self._mix).sum(axis=1).tolist()
+
+    def _signature(self, chunk_id: int) -> np.ndarray:
+        if chunk_id < len(self._stored):
+            return self._stored[chunk_id]
+        return self._buffer[chunk_id - len(self._stored)]
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        if signature[0] == _EMPTY:
+            return None
+        best, best_similarity = None, self.threshold
+        for band, key in enumerate(self._band_keys(signature)):
+            chunk_id = self._buckets[band].get(key)
+            if chunk_id is None:
+                continue
+            similarity = float(np.mean(self._signature(chunk_id) == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def _bucket(self, chunk_id: int, signature: np.ndarray):
+        if signature[0] == _EMPTY:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            # First chunk in a bucket stays its representative
+            self._buckets[band].setdefault(key, chunk_id)
+        self._count += 1
+
+    def add(self, chunk_id: int, signature: np.ndarray):
+        """Stores `signature` under `chunk_id` (an id past the stored table) and indexes it."""
+        row = chunk_id - len(self._stored)
+        if row < 0:
+            raise ValueError(f"chunk id {chunk_id} is in the stored signatures; use add_stored")
+        if row >= len(self._buffer):
+            grown = np.full((max(row + 1, 2 * len(self._buffer), 1024), self.num_perm), _EMPTY, dtype=np.uint32)
+            grown[: len(self._buffer)] = self._buffer
+            self._buffer = grown
+        self._buffer[row] = signature
+        self._bucket(chunk_id, signature)
+
+    def add_range(self, start: int, signatures: np.ndarray):
+        """Indexes `signatures` as chunk ids start, start + 1, ..."""
+        for offset, signature in enumerate(signatures):
+            self.add(start + offset, signature)
+
+    def add_stored(self, start: int, end: int):
+        """Indexes chunk ids start..end - 1, whose signatures are already in the stored table."""
+        for chunk_id in range(start, end):
+            self._bucket(chunk_id, self._stored[chunk_id])
@@ -0,0 +1,238 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+# An ONNX export directory holds the tokenizer files, the graph (fp32 and,
+# when quantized, int8) and embedder.json: model name, pooling, normalize,
+# dimension, max_seq_length, the graph file to serve and the parity result.
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+META_FILE = "embedder.json"
+
+# Compared between the PyTorch model and the export before the export is accepted
+PARITY_TEXTS = [
+    "What is the tuition fee for the B.Tech programme?",
+    "Hostel rooms are allotted on a first-come, first-served basis.",
+    "The last date to apply for admission is 30 June.",
+    "Library timings: 8 AM to 10 PM on weekdays, closed on public holidays.",
+    "Scholarships are available for students with a family income below 5 lakh per year.",
+    "Contact the examination cell for re-evaluation of answer scripts.",
+    "placement statistics 2023 average package",
+    "Is there a mess facility for vegetarian students?",
+]
+
+
+def embedder_id(model_name: str, backend: str = "torch") -> str:
+    """Identifies the vectors a model/backend pair produces (cache and build keys)."""
+    return model_name if backend == "torch" else f"{model_name}#onnx"
+
+
+def load_meta(path: str) -> Optional[Dict[str, Any]]:
+    meta_file = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        return json.load(f)
+
+
+class OnnxEmbedder:
+    """
+    Sentence embeddings from an exported ONNX graph run by ONNX Runtime, with
+    the model's pooling and normalization reimplemented in numpy. Provides
+    the parts of the SentenceTransformer interface this project uses, so it
+    can stand in for it without importing torch.
+    """
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.meta = load_meta(path)
+        if self.meta is None:
+            raise FileNotFoundError(f"No ONNX embedding export at {path}")
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(path, self.meta["file"]), options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def get_max_seq_length(self) -> int:
+        return self.meta["max_seq_length"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Same truncation, pooling and output shape as SentenceTransformer.encode (numpy only)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        window = self.get_max_seq_length() - self.tokenizer.num_special_tokens_to_add(pair=False)
+        token_ids = self.tokenizer(texts, add_special_tokens=False, truncation=True, max_length=window, verbose=False)["input_ids"]
+        out = self.encode_token_ids(token_ids, batch_size)
+        return out[0] if single else out
+
+    def encode_token_ids(self, token_ids: List[List[int]], batch_size: int = 32) -> np.ndarray:
+        """float32[len(token_ids), dim] for pre-tokenized inputs (ids without special tokens)."""
+        out = np.zeros((len(token_ids), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Longest first to keep padding low
+        order = np.argsort([-len(ids) for ids in token_ids], kind="stable")
+        for i in range(0, len(order), batch_size):
+            rows = order[i : i + batch_size]
+            features = self.tokenizer.pad(
+                {"input_ids": [self.tokenizer.build_inputs_with_special_tokens(token_ids[row]) for row in rows]},
+                padding=True,
+                return_tensors="np",
+            )
+            out[rows] = self._forward(features)
+        return out
+
+    def _forward(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        mask = features["attention_mask"].astype(np.int64)
+        feed = {}
+        for name in self._input_names:
+            feed[name] = features[name].astype(np.int64) if name in features else np.zeros_like(mask)
+        hidden = self.session.run(None, feed)[0]
+
+        pooling = self.meta["pooling"]
+        if pooling == "cls":
+            pooled = hidden[:, 0]
+        elif pooling == "max":
+            pooled = np.where(mask[:, :, None].astype(bool), hidden, -np.inf).max(axis=1)
+        else:
+            pooled = (hidden * mask[:, :, None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        pooled = pooled.astype(np.float32)
+        if self.meta["normalize"]:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+
+def check_parity(embedder: Any, reference: Any, texts: List[str] = PARITY_TEXTS) -> Dict[str, float]:
+    """Cosine similarity between the two models' embeddings of each text."""
+    a = np.asarray(embedder.encode(texts), dtype=np.float32)
+    b = np.asarray(reference.encode(texts), dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return {"min_cosine": round(float(cosine.min()), 5), "mean_cosine": round(float(cosine.mean()), 5)}
+
+
+def export_onnx(model_name: str, path: str, quantize: bool = True, parity_threshold: float = 0.98) -> Dict[str, Any]:
+    """
+    Exports the transformer of a sentence-transformers model to ONNX,
+    optionally int8-quantizes its weights (dynamic quantization), and accepts
+    the result only if every parity text embeds within `parity_threshold`
+    cosine of the PyTorch model. Needs torch, onnx and onnxruntime; serving
+    the export afterwards needs only onnxruntime and transformers' tokenizer.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    transformer, pooling = model[0], model[1]
+    os.makedirs(path, exist_ok=True)
+    transformer.tokenizer.save_pretrained(path)
+
+    sample = transformer.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer.auto_model),
+            tuple(sample[name] for name in input_names),
+            os.path.join(path, FP32_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(os.path.join(path, FP32_FILE), os.path.join(path, INT8_FILE), weight_type=QuantType.QInt8)
+
+    meta = {
+        "model": model_name,
+        "file": INT8_FILE if quantize else FP32_FILE,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "max" if pooling.pooling_mode_max_tokens else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.get_max_seq_length(),
+    }
+    _write_meta(path, meta)
+
+    parity = check_parity(OnnxEmbedder(path), model)
+    meta["parity"] = {**parity, "threshold": parity_threshold, "passed": parity["min_cosine"] >= parity_threshold}
+    _write_meta(path, meta)
+    if not meta["parity"]["passed"]:
+        raise ValueError(f"ONNX export of {model_name} failed the parity check: {parity} < {parity_threshold}")
+    return meta
+
+
+def _write_meta(path: str, meta: Dict[str, Any]):
+    tmp_file = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+
+
+def load_embedding_model(model_name: str, backend_config: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    The configured embedding model: a SentenceTransformer (`type: torch`,
+    imported only here so the ONNX path never loads torch) or an
+    OnnxEmbedder over an export that passed its parity check.
+    """
+    backend_config = backend_config or {}
+    if backend_config.get("type", "torch") == "onnx":
+        path = backend_config.get("onnx_path")
+        meta = load_meta(path) if path else None
+        if meta is None:
+            raise FileNotFoundError(f"No ONNX export at {path}; create it with `python -m rag.onnx_embedder`")
+        if meta["model"] != model_name:
+            raise ValueError(f"ONNX export at {path} is of {meta['model']}, not {model_name}")
+        if not meta.get("parity", {}).get("passed"):
+            raise ValueError(f"ONNX export at {path} did not pass its parity check")
+        return OnnxEmbedder(path, threads=backend_config.get("threads"))
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to (int8) ONNX and check parity")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights")
+    parser.add_argument("--verify", action="store_true", help="Only re-run the parity check on the existing export")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+    model_name = config["rag"]["embedding_model"]
+    backend_config = config["rag"].get("embedding_backend", {})
+    onnx_path = backend_config.get("onnx_path", "models/onnx")
+    threshold = backend_config.get("parity_threshold", 0.98)
+
+    if args.verify:
+        from sentence_transformers import SentenceTransformer
+
+        parity = check_parity(OnnxEmbedder(onnx_path), SentenceTransformer(model_name, device="cpu"))
+        print(f"Parity vs PyTorch: {parity} (threshold {threshold}): {'ok' if parity['min_cosine'] >= threshold else 'FAILED'}")
+    else:
+        meta = export_onnx(model_name, onnx_path, quantize=not args.no_quantize, parity_threshold=threshold)
+        print(f"Exported {model_name} to {os.path.join(onnx_path, meta['file'])}; parity {meta['parity']}")
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from rag.index_factory import build_index, update_index, read_index, write_index, apply_search_params, search_overrides
+from scraper.utils import get_category_from_url
+
+# Per-category sub-indexes, written under <vector_store>/partitions/:
+#   <category>.faiss     ANN index over that category's chunks
+#   <category>.ids.npy   int64 global chunk ids in this category (row order unless id-mapped)
+#   partitions.json      category -> {count, spec}
+# Id-mapped sub-indexes (spec["id_mapped"]) return global chunk ids directly.
+PARTITIONS_DIR = "partitions"
+PARTITIONS_FILE = "partitions.json"
+
+# Document categories produced by scraper.utils.get_category_from_url
+DOC_CATEGORIES = ("admissions", "courses", "fees", "exams", "hostel", "placements", "policies", "misc")
+
+# cag.intent labels -> document categories that can answer them.
+# Intents missing here (faculty, greeting, general_query) always use the global index.
+INTENT_CATEGORIES = {
+    "fees": ["fees"],
+    "admissions": ["admissions"],
+    "eligibility": ["admissions", "courses"],
+    "courses": ["courses"],
+    "exam": ["exams"],
+    "hostel": ["hostel"],
+    "placement": ["placements"],
+    "rules": ["policies"],
+}
+
+_CATEGORY_HEADER = re.compile(r"^Category:\s*(\w+)", re.MULTILINE)
+
+
+def infer_category(file_path: str, content: str, raw_path: str) -> str:
+    """
+    The scraper saves pages under data/raw/<site>/<category>/ and writes a
+    "Category:" header; hand-added files fall back to filename keywords.
+    """
+    parts = os.path.relpath(file_path, raw_path).split(os.sep)[:-1]
+    for part in reversed(parts):
+        if part in DOC_CATEGORIES:
+            return part
+    match = _CATEGORY_HEADER.search(content[:500])
+    if match and match.group(1) in DOC_CATEGORIES:
+        return match.group(1)
+    return get_category_from_url(os.path.basename(file_path))
+
+
+def build_partitions(
+    embeddings: np.ndarray,
+    categories: List[str],
+    vector_store_path: str,
+    index_config: Dict[str, Any],
+    ids: Optional[np.ndarray] = None,
+    rows: Optional[np.ndarray] = None,
+) -> Dict[str, int]:
+    """
+    Builds one sub-index per category over the already-normalized (possibly
+    memory-mapped) embeddings.
+    `ids` are the global chunk ids of the rows (default: row numbers); passing
+    them makes the sub-indexes id-mapped so `update_partitions` can edit them.
+    `rows` restricts the build to those rows of `embeddings`; `categories` and
+    `ids` then line up with `rows`.
+    """
+    path = os.path.join(vector_store_path, PARTITIONS_DIR)
+    os.makedirs(path, exist_ok=True)
+    labels = np.asarray(categories)
+    manifest: Dict[str, Any] = {}
+
+    for category in sorted(set(categories)):
+        members = np.flatnonzero(labels == category).astype(np.int64)
+        category_rows = members if rows is None else rows[members]
+        category_ids = category_rows if ids is None else ids[members]
+        index, spec = build_index(embeddings, index_config, ids=None if ids is None else category_ids, rows=category_rows)
+        _write_partition(path, category, index, spec, category_ids, manifest)
+
+    _write_manifest(path, manifest)
+    return {category: entry["count"] for category, entry in manifest.items()}
+
+
+def update_partitions(
+    previous_path: str,
+    vector_store_path: str,
+    remove_ids: np.ndarray,
+    embeddings: np.ndarray,
+    ids: np.ndarray,
+    categories: List[str],
+    index_config: Dict[str, Any],
+    exact: Optional[np.ndarray] = None,
+) -> Dict[str, int]:
+    """
+    Writes the previous build's id-mapped sub-indexes to `vector_store_path`
+    with `remove_ids` deleted and the new rows (`embeddings`, `ids`,
+    `categories`) added. Categories left without chunks are dropped.
+    `exact` is the previous version's exact vectors (see update_index).
+    """
+    with open(os.path.join(previous_path, PARTITIONS_DIR, PARTITIONS_FILE), "r") as f:
+        previous = json.load(f)
+    path = os.path.join(vector_store_path, PARTITIONS_DIR)
+    os.makedirs(path, exist_ok=True)
+    labels = np.asarray(categories)
+    manifest: Dict[str, Any] = {}
+
+    for category in sorted(set(previous) | set(categories)):
+        rows = np.flatnonzero(labels == category)
+        new_ids = ids[rows]
+
+        if category not in previous:
+            index, spec = build_index(embeddings, index_config, ids=new_ids, rows=rows)
+            _write_partition(path, category, index, spec, new_ids, manifest)
+            continue
+
+        old_ids = np.load(os.path.join(previous_path, PARTITIONS_DIR, f"{category}.ids.npy"))
+        stale = np.isin(old_ids, remove_ids)
+        category_ids = np.concatenate([old_ids[~stale], new_ids])
+        if len(category_ids) == 0:
+            continue
+        spec = previous[category]["spec"]
+        index, _ = read_index(os.path.join(previous_path, PARTITIONS_DIR, f"{category}.faiss"), spec, mmap=False)
+        index, spec = update_index(index, spec, old_ids[stale], embeddings, new_ids, index_config, rows=rows, exact=exact)
+        _write_partition(path, category, index, spec, category_ids, manifest)
+
+    _write_manifest(path, manifest)
+    return {category: entry["count"] for category, entry in manifest.items()}
+
+
+def _write_partition(path: str, category: str, index: faiss.Index, spec: Dict[str, Any], ids: np.ndarray, manifest: Dict[str, Any]):
+    write_index(index, os.path.join(path, f"{category}.faiss"))
+    tmp_ids = os.path.join(path, f"{category}.ids.npy.tmp")
+    with open(tmp_ids, "wb") as f:
+        np.save(f, np.asarray(ids, dtype=np.int64))
+    os.replace(tmp_ids, os.path.join(path, f"{category}.ids.npy"))
+    manifest[category] = {"count": int(len(ids)), "spec": spec}
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]):
+    tmp_manifest = os.path.join(path, PARTITIONS_FILE + ".tmp")
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, os.path.join(path, PARTITIONS_FILE))
+
+
+class Partition:
+    def __init__(self, index: faiss.Index, ids: np.ndarray, id_mapped: bool = False):
+        self.index = index
+        self.ids = ids
+        self.id_mapped = id_mapped
+        # Chunk id -> in this category, built once at load for BM25 filtering
+        self.members = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=bool)
+        self.members[np.asarray(ids)] = True
+
+    def contains(self, chunk_ids: np.ndarray) -> np.ndarray:
+        inside = chunk_ids < len(self.members)
+        keep = np.zeros(len(chunk_ids), dtype=bool)
+        keep[inside] = self.members[chunk_ids[inside]]
+        return keep
+
+    def search(self, query_vector: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (global chunk ids, scores) of this partition's top-n."""
+        scores, rows = self.index.search(query_vector, min(n, self.index.ntotal))
+        found = rows[0] >= 0
+        if self.id_mapped:
+            return rows[0][found], scores[0][found]
+        return self.ids[rows[0][found]], scores[0][found]
+
+
+def load_partitions(vector_store_path: str, index_config: Dict[str, Any], mmap: bool = True) -> Dict[str, Partition]:
+    path = os.path.join(vector_store_path, PARTITIONS_DIR)
+    manifest_file = os.path.join(path, PARTITIONS_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    partitions = {}
+    for category, entry in manifest.items():
+        index, _ = read_index(os.path.join(path, f"{category}.faiss"), entry["spec"], mmap=mmap)
+        apply_search_params(index, search_overrides(entry["spec"], index_config))
+        ids = np.load(os.path.join(path, f"{category}.ids.npy"), mmap_mode="r")
+        partitions[category] = Partition(index, ids, entry["spec"].get("id_mapped", False))
+    return partitions
+
+
+def route(intent: Optional[str], confidence: float, min_confidence: float, available: Dict[str, Partition]) -> List[str]:
+    """Categories to search for this intent, or [] for the global index."""
+    if not intent or confidence < min_confidence:
+        return []
+    return [c for c in INTENT_CATEGORIES.get(intent, []) if c in available]
+
+
+def search_partitions(partitions: List[Partition], query_vector: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merged (ids, scores) top-n over several partitions, best first."""
+    results = [p.search(query_vector, n) for p in partitions]
+    ids = np.concatenate([r[0] for r in results])
+    scores = np.concatenate([r[1] for r in results])
+    order = np.argsort(-scores, kind="stable")[:n]
+    return ids[order], scores[order]
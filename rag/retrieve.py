@@ -1,10 +1,48 @@
 import os
+import atexit
+import threading
 import yaml
 import faiss
-import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+from rag.embedding_cache import QueryEmbeddingCache
+from rag.index_factory import load_index_spec, search_overrides, apply_search_params, read_index, enable_reconstruct, dense_scores
+from rag.chunk_store import chunk_store_exists, open_chunk_store
+from rag.sparse_index import SparseIndex, reciprocal_rank_fusion
+from rag.partitions import load_partitions, route, search_partitions, Partition
+from rag.versions import resolve_current
+from rag.onnx_embedder import embedder_id
+from rag.embedding_client import connect_embedding_model
+
+
+class IndexSnapshot:
+    """
+    One loaded vector store version: index, chunks, BM25 and sub-indexes.
+    Never mutated after construction; a reload builds a new snapshot and swaps
+    the reference, so a search that already holds the old one finishes on it.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        path: str,
+        index: faiss.Index,
+        spec: Dict,
+        load_mode: str,
+        chunk_store,
+        sparse_index: Optional[SparseIndex],
+        partitions: Dict[str, Partition],
+    ):
+        self.version = version
+        self.path = path
+        self.index = index
+        self.spec = spec
+        self.load_mode = load_mode
+        self.chunk_store = chunk_store
+        self.sparse_index = sparse_index
+        self.partitions = partitions
+
 
 class Retriever:
     def __init__(self, config_path: str = "config.yaml"):
@@ -13,52 +51,143 @@ class Retriever:
             
         self.vector_store_path = self.config["paths"]["vector_store"]
         self.model_name = self.config["rag"]["embedding_model"]
+        self.backend_config = self.config["rag"].get("embedding_backend", {})
         self.top_k = self.config["rag"]["top_k"]
         self.threshold = self.config["rag"]["similarity_threshold"]
+        self.hybrid_config = self.config["rag"].get("hybrid", {})
+        self.routing_config = self.config["rag"].get("routing", {})
 
-        print(f"Loading Retriever with model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        print(f"Loading Retriever with model: {self.model_name} ({self.backend_config.get('type', 'torch')})")
+        self.model = connect_embedding_model(
+            self.model_name, self.backend_config, self.config["rag"].get("embedding_server", {})
+        )
+        self.query_cache = QueryEmbeddingCache(
+            max_size=self.config["rag"].get("query_cache_size", 2048),
+            spill_path=self.config["rag"].get("query_cache_path"),
+            model_name=embedder_id(self.model_name, self.backend_config.get("type", "torch")),
+        )
+        atexit.register(self.query_cache.save)
         
-        self.index = None
-        self.chunks = []
-        self.metadata = []
-        self._load_index()
-
-    def _load_index(self):
-        index_file = os.path.join(self.vector_store_path, "index.faiss")
-        chunks_file = os.path.join(self.vector_store_path, "chunks.pkl")
-
-        if os.path.exists(index_file) and os.path.exists(chunks_file):
-            self.index = faiss.read_index(index_file)
-            with open(chunks_file, "rb") as f:
-                self.chunks, self.metadata = pickle.load(f)
-            print("Vector store loaded successfully.")
-        else:
-            print("Vector store not found. Please run ingestion first.")
+        self.snapshot: Optional[IndexSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        snapshot = self.snapshot
+        return snapshot.index if snapshot else None
 
-    def search(self, query: str) -> List[Dict]:
-        if not self.index:
+    @property
+    def index_version(self) -> Optional[str]:
+        snapshot = self.snapshot
+        return snapshot.version if snapshot else None
+
+    def reload(self) -> bool:
+        """
+        Loads the current vector store version and swaps it in. Searches keep
+        running on the previous snapshot meanwhile. Returns True if a new
+        version was loaded.
+        """
+        with self._reload_lock:
+            version, path = resolve_current(self.vector_store_path)
+            if version is None or not chunk_store_exists(path):
+                print("Vector store not found. Please run ingestion first.")
+                return False
+            if self.snapshot and self.snapshot.version == version:
+                return False
+
+            snapshot = self._load_snapshot(version, path)
+            # Single reference assignment: atomic for concurrent readers. The old
+            # snapshot is released once the last in-flight search drops it.
+            self.snapshot = snapshot
+            print(
+                f"Vector store {version} loaded successfully "
+                f"({snapshot.spec['type']} index, {snapshot.spec.get('storage', 'float32')} vectors, {snapshot.load_mode})."
+            )
+            return True
+
+    def _load_snapshot(self, version: str, path: str) -> IndexSnapshot:
+        index_config = self.config["rag"].get("index", {})
+        spec = load_index_spec(path)
+        index, load_mode = read_index(os.path.join(path, "index.faiss"), spec)
+        apply_search_params(index, search_overrides(spec, index_config))
+        enable_reconstruct(index, spec)
+        sparse_index = SparseIndex.open(path) if self.hybrid_config.get("enabled", True) else None
+        partitions = load_partitions(path, index_config) if self.routing_config.get("enabled", True) else {}
+        return IndexSnapshot(version, path, index, spec, load_mode, open_chunk_store(path), sparse_index, partitions)
+
+    def search(self, query: str, intent: Optional[str] = None, intent_confidence: float = 0.0) -> List[Dict]:
+        """
+        With a confident intent, searches only the matching category sub-index(es);
+        falls back to the global index when routing is off, unsure or finds nothing.
+        """
+        snapshot = self.snapshot
+        if not snapshot:
             return []
 
-        query_vector = self.model.encode([query]).astype('float32')
-        faiss.normalize_L2(query_vector)
-        
-        distances, indices = self.index.search(query_vector, self.top_k)
-        
+        query_vector = self._encode_query(query)
+
+        categories = route(intent, intent_confidence, self.routing_config.get("min_confidence", 0.6), snapshot.partitions)
+        if categories:
+            results = self._search(snapshot, query, query_vector, categories)
+            if results:
+                return results
+        return self._search(snapshot, query, query_vector, [])
+
+    def _search(self, snapshot: IndexSnapshot, query: str, query_vector: np.ndarray, categories: List[str]) -> List[Dict]:
+        # Over-fetch from both sides when hybrid; RRF then keeps top_k
+        n_candidates = self.top_k
+        if snapshot.sparse_index:
+            n_candidates = max(self.top_k, self.hybrid_config.get("candidates", 20))
+
+        allowed = None
+        if categories:
+            partitions = [snapshot.partitions[c] for c in categories]
+            indices, distances = search_partitions(partitions, query_vector, n_candidates)
+            allowed = lambda chunk_ids: np.logical_or.reduce([p.contains(chunk_ids) for p in partitions])
+        else:
+            distances, indices = snapshot.index.search(query_vector, n_candidates)
+            distances, indices = distances[0], indices[0]
+
+        sparse_ids, sparse_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if snapshot.sparse_index:
+            sparse_ids, sparse_scores = snapshot.sparse_index.search(query, n_candidates, allowed=allowed)
+
+        hits = reciprocal_rank_fusion(
+            indices, distances, sparse_ids, sparse_scores,
+            self.top_k, self.threshold, self.hybrid_config.get("rrf_k", 60),
+            self.hybrid_config.get("min_bm25", 1.0), self.hybrid_config.get("min_bm25_ratio", 0.3),
+        )
+
+        # Hits only BM25 found get their dense similarity too, so confidence
+        # (the best score) reflects them
+        keyword_only = [hit for hit in hits if hit["score"] is None]
+        for hit, score in zip(keyword_only, dense_scores(snapshot.index, query_vector, [h["id"] for h in keyword_only])):
+            hit["score"] = score
+
         results = []
-        for i, idx in enumerate(indices[0]):
-            score = distances[0][i]
-            if idx == -1 or score < self.threshold:
-                continue
-                
+        for hit in hits:
+            idx = hit["id"]
             results.append({
-                "content": self.chunks[idx],
-                "metadata": self.metadata[idx],
-                "score": float(score)
+                "content": snapshot.chunk_store.text(idx),
+                "metadata": snapshot.chunk_store.metadata(idx),
+                "score": hit["score"] if hit["score"] is not None else 0.0,
+                "bm25": hit["bm25"],
             })
             
         return results
 
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Returns a normalized (1, dim) query vector, skipping the model on a cache hit."""
+        cached = self.query_cache.get(query)
+        if cached is not None:
+            return cached.reshape(1, -1)
+
+        query_vector = self.model.encode([query]).astype('float32')
+        faiss.normalize_L2(query_vector)
+        self.query_cache.put(query, query_vector[0])
+        return query_vector
+
 if __name__ == "__main__":
     # Test text
     retriever = Retriever()
@@ -0,0 +1,184 @@
+import json
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# BM25 inverted index layout (CSR over terms, next to index.faiss):
+#   sparse.indptr.npy    int64[V + 1]  postings range of each term id
+#   sparse.docs.npy      int32[P]      chunk ids, ascending within a term
+#   sparse.weights.npy   float32[P]    precomputed BM25 impact of the term in that chunk
+#   sparse.vocab.json    term list (position = term id) and build params
+INDPTR_FILE = "sparse.indptr.npy"
+DOCS_FILE = "sparse.docs.npy"
+WEIGHTS_FILE = "sparse.weights.npy"
+VOCAB_FILE = "sparse.vocab.json"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it of on or the to what when where which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def build_sparse_index(chunks: Iterable[str], path: str, k1: float = 1.2, b: float = 0.75) -> int:
+    """
+    Builds a BM25 index over `chunks` (chunk id = position) and writes it to
+    `path`. BM25 term weights are folded into the postings at build time, so
+    query scoring is a single weighted bincount. Returns the vocabulary size.
+    """
+    vocab: Dict[str, int] = {}
+    term_ids: List[np.ndarray] = []
+    doc_ids: List[np.ndarray] = []
+    tfs: List[np.ndarray] = []
+    doc_lengths: List[int] = []
+
+    for doc_id, text in enumerate(chunks):
+        tokens = tokenize(text)
+        doc_lengths.append(len(tokens))
+        counts = Counter(tokens)
+        term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), dtype=np.int64, count=len(counts)))
+        tfs.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        doc_ids.append(np.full(len(counts), doc_id, dtype=np.int32))
+
+    n_docs = len(doc_lengths)
+    terms = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int64)
+    docs = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+    tf = np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.float32)
+
+    # Group postings by term; stable sort keeps chunk ids ascending within a term
+    order = np.argsort(terms, kind="stable")
+    terms, docs, tf = terms[order], docs[order], tf[order]
+    df = np.bincount(terms, minlength=len(vocab))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    lengths = np.asarray(doc_lengths, dtype=np.float32)
+    # Empty rows are deleted chunk ids (incremental builds); keep them out of the average
+    live = lengths[lengths > 0]
+    avg_length = float(live.mean()) if len(live) else 1.0
+    n_docs_live = len(live)
+    idf = np.log1p((n_docs_live - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = k1 * (1.0 - b + b * lengths[docs] / avg_length)
+    weights = (idf[terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    os.makedirs(path, exist_ok=True)
+    _save_array(path, INDPTR_FILE, indptr)
+    _save_array(path, DOCS_FILE, docs)
+    _save_array(path, WEIGHTS_FILE, weights)
+    tmp_vocab = os.path.join(path, VOCAB_FILE + ".tmp")
+    with open(tmp_vocab, "w") as f:
+        json.dump({"n_docs": n_docs, "k1": k1, "b": b, "terms": list(vocab)}, f)
+    os.replace(tmp_vocab, os.path.join(path, VOCAB_FILE))
+    return len(vocab)
+
+
+def _save_array(path: str, name: str, array: np.ndarray):
+    tmp_file = os.path.join(path, name + ".tmp")
+    with open(tmp_file, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_file, os.path.join(path, name))
+
+
+class SparseIndex:
+    """Memory-mapped BM25 index; `search` touches only the query terms' postings."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, VOCAB_FILE), "r") as f:
+            meta = json.load(f)
+        self.n_docs: int = meta["n_docs"]
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(meta["terms"])}
+        self.indptr = np.load(os.path.join(path, INDPTR_FILE), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, DOCS_FILE), mmap_mode="r")
+        self.weights = np.load(os.path.join(path, WEIGHTS_FILE), mmap_mode="r")
+
+    @classmethod
+    def open(cls, path: str) -> Optional["SparseIndex"]:
+        if not os.path.exists(os.path.join(path, VOCAB_FILE)):
+            return None
+        return cls(path)
+
+    def search(
+        self, query: str, n: int, allowed: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (chunk_ids, bm25_scores) of the top-n chunks, best first.
+        `allowed` maps candidate chunk ids to a keep mask (e.g. membership in
+        the routed categories).
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ranges = [(int(self.indptr[t]), int(self.indptr[t + 1])) for t in term_ids]
+        docs = np.concatenate([self.docs[s:e] for s, e in ranges])
+        weights = np.concatenate([self.weights[s:e] for s, e in ranges])
+
+        if len(docs) * 8 > self.n_docs:
+            # Dense accumulator is cheaper once postings cover a good part of the corpus
+            scores = np.bincount(docs, weights=weights, minlength=self.n_docs)
+            candidates = np.flatnonzero(scores)
+            scores = scores[candidates]
+        else:
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+
+        if allowed is not None:
+            keep = allowed(candidates)
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if len(candidates) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order].astype(np.int64), scores[order].astype(np.float32)
+
+
+def reciprocal_rank_fusion(
+    dense_ids: np.ndarray,
+    dense_scores: np.ndarray,
+    sparse_ids: np.ndarray,
+    sparse_scores: np.ndarray,
+    top_k: int,
+    threshold: float,
+    rrf_k: int = 60,
+    min_bm25: float = 0.0,
+    min_bm25_ratio: float = 0.0,
+) -> List[Dict]:
+    """
+    Fuses dense and BM25 rankings with RRF (score = sum of 1 / (rrf_k + rank)).
+    A fused hit is kept if its dense similarity clears `threshold` or BM25
+    ranks it within the top_k with a score of at least `min_bm25` and
+    `min_bm25_ratio` of the best BM25 score, so exact-term matches that
+    MiniLM scores poorly are no longer dropped, while chunks that only share
+    a term common across the corpus are. Returns [{"id", "score", "bm25", "rrf"}].
+    """
+    bm25_floor = max(min_bm25, min_bm25_ratio * float(np.max(sparse_scores))) if len(sparse_scores) else min_bm25
+    fused: Dict[int, Dict] = {}
+    for rank, (idx, score) in enumerate(zip(dense_ids, dense_scores)):
+        if idx == -1:
+            continue
+        fused[int(idx)] = {"id": int(idx), "score": float(score), "bm25": None, "rrf": 1.0 / (rrf_k + rank + 1)}
+    for rank, (idx, score) in enumerate(zip(sparse_ids, sparse_scores)):
+        entry = fused.setdefault(int(idx), {"id": int(idx), "score": None, "bm25": None, "rrf": 0.0})
+        entry["bm25"] = float(score)
+        entry["sparse_rank"] = rank
+        entry["rrf"] += 1.0 / (rrf_k + rank + 1)
+
+    ranked = sorted(fused.values(), key=lambda e: e["rrf"], reverse=True)
+    results = []
+    for entry in ranked:
+        dense_ok = entry["score"] is not None and entry["score"] >= threshold
+        sparse_ok = entry.pop("sparse_rank", top_k) < top_k and entry["bm25"] >= bm25_floor
+        if dense_ok or sparse_ok:
+            results.append(entry)
+        if len(results) == top_k:
+            break
+    return results
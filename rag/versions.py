@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Versioned vector store layout:
+#   <vector_store>/versions/<version>/   one complete build (index, chunk store, BM25, partitions)
+#   <vector_store>/versions/<version>/COMPLETE   marker written when the build is published
+#   <vector_store>/CURRENT               JSON manifest naming the live version
+# CURRENT is replaced atomically, so a reader sees either the old or the new
+# build, never a mix. Stores without CURRENT use the legacy flat layout.
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "CURRENT"
+COMPLETE_FILE = "COMPLETE"
+
+# A build directory without COMPLETE may still be written by a running ingest;
+# it only counts as left behind by a crash once untouched for this long
+INCOMPLETE_GRACE_SECONDS = 24 * 3600
+
+
+def new_version(vector_store_path: str) -> Tuple[str, str]:
+    """Allocates an empty directory for the next build; returns (version, path)."""
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    path = os.path.join(vector_store_path, VERSIONS_DIR, version)
+    os.makedirs(path)
+    return version, path
+
+
+def publish_version(vector_store_path: str, version: str, info: Dict[str, Any]):
+    """Points CURRENT at `version`. Only call once every file of the build is written."""
+    with open(os.path.join(vector_store_path, VERSIONS_DIR, version, COMPLETE_FILE), "w") as f:
+        f.write(version)
+    manifest = {
+        "version": version,
+        "path": os.path.join(VERSIONS_DIR, version),
+        "created_at": datetime.utcnow().isoformat(),
+        **info,
+    }
+    tmp_file = os.path.join(vector_store_path, MANIFEST_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, os.path.join(vector_store_path, MANIFEST_FILE))
+
+
+def read_manifest(vector_store_path: str) -> Optional[Dict[str, Any]]:
+    manifest_file = os.path.join(vector_store_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def resolve_current(vector_store_path: str) -> Tuple[Optional[str], str]:
+    """
+    Returns (version, directory) of the live build. Legacy flat stores get a
+    version derived from index.faiss's mtime and size.
+    """
+    manifest = read_manifest(vector_store_path)
+    if manifest:
+        return manifest["version"], os.path.join(vector_store_path, manifest["path"])
+
+    index_file = os.path.join(vector_store_path, "index.faiss")
+    if os.path.exists(index_file):
+        stat = os.stat(index_file)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}", vector_store_path
+    return None, vector_store_path
+
+
+def _last_modified(path: str) -> float:
+    """Newest mtime of a build directory and the files directly in it."""
+    with os.scandir(path) as entries:
+        return max([os.stat(path).st_mtime] + [entry.stat().st_mtime for entry in entries])
+
+
+def prune_versions(vector_store_path: str, keep: int = 2, grace_seconds: float = INCOMPLETE_GRACE_SECONDS):
+    """
+    Deletes all but the newest `keep` complete builds (always keeping the live
+    one). Directories without COMPLETE are left alone while they were touched
+    within `grace_seconds`, since a concurrent ingest may still be writing
+    them; older ones were left behind by crashed runs and are deleted.
+    Processes that still have an old build mmapped keep their mapping; on
+    platforms that refuse to delete mapped files the directory is simply left
+    for the next prune.
+    """
+    versions_root = os.path.join(vector_store_path, VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return
+    current, _ = resolve_current(vector_store_path)
+    versions = sorted(os.listdir(versions_root), reverse=True)
+    now = time.time()
+    kept = 0
+    for version in versions:
+        path = os.path.join(versions_root, version)
+        if version == current:
+            continue
+        try:
+            if not os.path.exists(os.path.join(path, COMPLETE_FILE)):
+                if now - _last_modified(path) < grace_seconds:
+                    continue
+            elif kept < keep - 1:
+                kept += 1
+                continue
+        except OSError:
+            # Removed by a concurrent prune
+            continue
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,82 @@
+"""Chunker tests with a whitespace stand-in for the model tokenizer (run with pytest from the project root)."""
+import re
+
+from rag.chunking import TokenChunker, word_chunks
+
+
+class WordTokenizer:
+    """Fast-tokenizer-shaped stub: one token per whitespace-separated word."""
+
+    is_fast = True
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=False):
+        words = list(re.finditer(r"\S+", text))
+        return {"input_ids": list(range(len(words))), "offset_mapping": [(m.start(), m.end()) for m in words]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+
+class Model:
+    tokenizer = WordTokenizer()
+
+    def get_max_seq_length(self):
+        return 12
+
+
+def sentence(n: int, word: str = "word") -> str:
+    return " ".join([word] * (n - 1)) + " end."
+
+
+def test_word_chunks_keep_character_spans():
+    text = "alpha  beta\ngamma delta epsilon"
+    chunks = word_chunks(text, size=2, overlap=1)
+    assert [c.text for c in chunks] == ["alpha beta", "beta gamma", "gamma delta", "delta epsilon", "epsilon"]
+    assert all(text[c.start:c.end].split() == c.text.split() for c in chunks)
+
+
+def test_chunks_fit_the_model_window_and_map_back_to_the_text():
+    chunker = TokenChunker.for_model(Model(), overlap_tokens=0)
+    assert chunker.max_tokens == 10
+    text = " ".join(sentence(4) for _ in range(10))
+    chunks = chunker.chunk(text)
+    assert all(len(c.token_ids) <= 10 for c in chunks)
+    assert all(c.text == text[c.start:c.end] for c in chunks)
+    # Cuts land on sentence ends, so no chunk splits a sentence
+    assert all(c.text.endswith("end.") for c in chunks)
+    assert " ".join(c.text for c in chunks) == text
+
+
+def test_paragraph_break_is_preferred_over_a_later_sentence_end():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=10, overlap_tokens=0, window=10)
+    text = sentence(3) + " " + sentence(3) + "\n\n" + sentence(3) + " " + sentence(3)
+    chunks = chunker.chunk(text)
+    assert chunks[0].end == text.index("\n\n")
+
+
+def test_overlap_starts_on_a_sentence():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=8, overlap_tokens=3, window=8)
+    text = " ".join(sentence(4, w) for w in ("a", "b", "c", "d"))
+    chunks = chunker.chunk(text)
+    assert [c.text.split()[0] for c in chunks] == ["a", "b", "c"]
+    assert chunks[1].start < chunks[0].end
+
+
+def test_overlong_sentence_is_cut_at_a_token_boundary():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=5, overlap_tokens=0, window=5)
+    chunks = chunker.chunk(sentence(12))
+    assert [len(c.token_ids) for c in chunks] == [5, 5, 2]
+
+
+def test_legacy_report_counts_what_word_chunks_would_lose():
+    chunker = TokenChunker.for_model(Model(), legacy_words=15, legacy_overlap=0)
+    chunker.chunk(" ".join(["word"] * 30))
+    assert chunker.legacy_report == {"chunks": 2, "truncated_chunks": 2, "tokens": 30, "truncated_tokens": 10}
+    assert "2 of 2 chunks" in chunker.legacy_summary()
+
+
+def test_model_without_fast_tokenizer_gets_no_token_chunker():
+    class Slow:
+        tokenizer = None
+
+    assert TokenChunker.for_model(Slow()) is None
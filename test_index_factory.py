@@ -0,0 +1,97 @@
+"""Index factory tests over random unit vectors (run with pytest from the project root)."""
+import numpy as np
+import pytest
+
+import rag.index_factory as index_factory
+from rag.index_factory import (
+    build_index, load_index_spec, read_index, reconstruct_vectors, resolve_index_type, save_index_spec, update_index,
+    write_index,
+)
+
+
+def unit_vectors(n, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_auto_type_follows_corpus_size(monkeypatch):
+    monkeypatch.setattr(index_factory, "AUTO_FLAT_MAX", 100)
+    monkeypatch.setattr(index_factory, "AUTO_HNSW_MAX", 1000)
+    assert resolve_index_type("auto", 100) == "flat"
+    assert resolve_index_type("auto", 101) == "hnsw"
+    assert resolve_index_type("auto", 1001) == "ivf_pq"
+    assert resolve_index_type("ivf_flat", 5) == "ivf_flat"
+    with pytest.raises(ValueError):
+        resolve_index_type("annoy", 5)
+
+
+def test_small_corpus_degrades_ivf_pq_to_what_it_can_train():
+    config = {"type": "ivf_pq", "recall_queries": 0}
+    _, spec = build_index(unit_vectors(2000), config)
+    # 2000 vectors cannot train 256-centroid PQ codebooks (39 points each)
+    assert spec["type"] == "ivf_flat" and spec["factory"].startswith("IVF")
+    _, spec = build_index(unit_vectors(50), config)
+    assert spec["type"] == "flat" and spec["factory"] == "Flat"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_id_mapped_index_searches_and_updates_by_chunk_id(index_type, tmp_path):
+    vectors = unit_vectors(400)
+    ids = np.arange(1000, 1400)
+    index, spec = build_index(vectors, {"type": index_type, "nlist": 4, "nprobe": 4, "recall_queries": 0}, ids=ids)
+    _, found = index.search(vectors[:1], 1)
+    assert found[0, 0] == 1000
+    assert spec["ntotal"] == 400 and spec["id_mapped"]
+
+    index, spec = update_index(index, spec, np.array([1000]), unit_vectors(5, seed=1), np.arange(1400, 1405), {})
+    assert spec["ntotal"] == 404
+    _, found = index.search(vectors[:1], 1)
+    assert found[0, 0] != 1000
+
+    write_index(index, str(tmp_path / "index.faiss"))
+    save_index_spec(str(tmp_path), spec)
+    loaded, _ = read_index(str(tmp_path / "index.faiss"), load_index_spec(str(tmp_path)))
+    assert loaded.ntotal == 404
+
+
+@pytest.mark.parametrize("storage,factory", [("float16", "SQfp16"), ("sq8", "SQ8")])
+def test_scalar_quantized_storage_stays_close_to_exact(storage, factory):
+    vectors = unit_vectors(500)
+    index, spec = build_index(vectors, {"type": "flat", "storage": storage, "recall_queries": 100})
+    assert spec["factory"] == factory and spec["storage"] == storage
+    assert spec["recall"]["queries"] == 100 and spec["recall"]["recall"] > 0.9
+    assert np.abs(index.reconstruct_n(0, 10) - vectors[:10]).max() < 0.02
+
+
+def test_pq_storage_rescores_from_exact_vectors():
+    vectors = unit_vectors(1000)
+    ids = np.arange(1000)
+    config = {
+        "type": "ivf_flat", "storage": "pq", "pq_m": 8, "pq_bits": 4, "nlist": 8, "nprobe": 8, "rescore_factor": 16,
+        "recall_queries": 100,
+    }
+    index, spec = build_index(vectors, config, ids=ids)
+    assert spec["rescore"] and spec["factory"].endswith("Refine(Flat)")
+    assert spec["recall"]["recall"] > 0.9
+    # The refine stage keeps a float copy, so chunk vectors read back exactly
+    np.testing.assert_allclose(reconstruct_vectors(index, spec, ids[:5]), vectors[:5], atol=1e-6)
+
+
+def test_pq_storage_falls_back_to_sq8_on_a_small_corpus():
+    _, spec = build_index(unit_vectors(200), {"type": "flat", "storage": "pq", "recall_queries": 0})
+    assert spec["storage"] == "sq8" and not spec["rescore"]
+
+
+def test_lossy_codes_need_the_exact_vectors_to_rebuild():
+    vectors = unit_vectors(300)
+    index, spec = build_index(vectors, {"type": "hnsw", "storage": "sq8", "recall_queries": 0}, ids=np.arange(300))
+    with pytest.raises(ValueError):
+        reconstruct_vectors(index, spec, np.arange(3))
+    np.testing.assert_array_equal(reconstruct_vectors(index, spec, np.arange(3), exact=vectors), vectors[:3])
+
+
+def test_in_place_update_drops_the_build_recall():
+    index, spec = build_index(unit_vectors(300), {"type": "ivf_flat", "nlist": 4, "recall_queries": 50}, ids=np.arange(300))
+    assert "recall" in spec
+    _, spec = update_index(index, spec, np.array([0]), unit_vectors(2, seed=1), np.array([300, 301]), {})
+    assert "recall" not in spec
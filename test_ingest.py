@@ -0,0 +1,246 @@
+"""Ingestion tests with a deterministic stand-in embedding model (run with pytest from the project root)."""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import rag.index_factory as index_factory
+import rag.ingest as ingest
+from rag.chunk_store import META_VOCAB_FILE, open_chunk_store
+from rag.index_factory import EXACT_VECTORS_FILE, load_index_spec
+from rag.versions import VERSIONS_DIR, resolve_current
+
+DIM = 32
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+class FakeModel:
+    """Unit vectors seeded by the text, so equal chunks embed equally across runs."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, **kwargs):
+        self.encoded += len(texts)
+        return np.stack([embed(text) for text in texts])
+
+
+def embed(text: str) -> np.ndarray:
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """(raw dir, vector store dir, Ingestor factory) over a 20-words-per-chunk setup."""
+    model = FakeModel()
+    monkeypatch.setattr(ingest, "connect_embedding_model", lambda *args, **kwargs: model)
+    with open(os.path.join(os.path.dirname(__file__), "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    config["paths"] = {
+        "data_raw": str(tmp_path / "raw"),
+        "data_processed": str(tmp_path / "processed"),
+        "vector_store": str(tmp_path / "vector_store"),
+        "embeddings_cache": str(tmp_path / "embeddings"),
+    }
+    config["rag"].update(chunk_size=20, chunk_overlap=0)
+    config["rag"]["chunking"]["unit"] = "words"
+    config["rag"]["index"].update(recall_queries=0, pq_bits=4)
+    config["rag"]["extraction"].update(workers=1, cache_path=None)
+    config["rag"]["embedding_cache"]["enabled"] = False
+    os.makedirs(tmp_path / "raw")
+
+    def make(**index):
+        config["rag"]["index"].update(index)
+        with open(tmp_path / "config.yaml", "w") as f:
+            yaml.safe_dump(config, f)
+        return ingest.Ingestor(str(tmp_path / "config.yaml"))
+
+    return tmp_path / "raw", str(tmp_path / "vector_store"), make
+
+
+def write_docs(raw, names, seed=0, words=400):
+    rng = np.random.default_rng(seed)
+    for name in names:
+        (raw / name).write_text(" ".join(rng.choice(WORDS, words)))
+
+
+def live_ids(version_path):
+    with open(os.path.join(version_path, "ingest_manifest.json")) as f:
+        files = json.load(f)["files"]
+    return np.concatenate([np.arange(*entry["ids"]) for entry in files.values()])
+
+
+def test_retype_from_hnsw_to_ivf_pq_keeps_exact_vectors(corpus, monkeypatch):
+    raw, store, make = corpus
+    monkeypatch.setattr(index_factory, "AUTO_FLAT_MAX", 50)
+    monkeypatch.setattr(index_factory, "AUTO_HNSW_MAX", 300)
+    write_docs(raw, [f"a{i}.txt" for i in range(10)])
+    ingestor = make(type="auto", storage="float32")
+    ingestor.process_and_index()
+    first = resolve_current(store)[1]
+    assert load_index_spec(first)["type"] == "hnsw"
+    # A float32 HNSW build stores its vectors in the index only
+    assert not os.path.exists(os.path.join(first, EXACT_VECTORS_FILE))
+
+    write_docs(raw, [f"b{i}.txt" for i in range(30)], seed=1)
+    ingestor.process_and_index()
+    current = resolve_current(store)[1]
+    spec = load_index_spec(current)
+    assert spec["type"] == "ivf_pq" and spec["ntotal"] == 800
+    exact = np.load(os.path.join(current, EXACT_VECTORS_FILE))
+    chunks = open_chunk_store(current)
+    ids = live_ids(current)
+    expected = np.stack([embed(chunks.text(int(i))) for i in ids])
+    chunks.close()
+    np.testing.assert_allclose(exact[ids], expected, atol=1e-6)
+    assert len(os.listdir(os.path.join(store, VERSIONS_DIR))) == 2
+
+
+def test_failed_build_leaves_no_version_behind(corpus, monkeypatch):
+    raw, store, make = corpus
+    write_docs(raw, ["a.txt"])
+    ingestor = make(type="flat", storage="float32")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ingest, "build_sparse_index", fail)
+    with pytest.raises(OSError):
+        ingestor.process_and_index()
+    assert os.listdir(os.path.join(store, VERSIONS_DIR)) == []
+
+
+def test_chunk_spans_live_in_their_own_column(corpus):
+    raw, store, make = corpus
+    write_docs(raw, ["a.txt", "b.txt"])
+    ingestor = make(type="flat", storage="float32")
+    ingestor.process_and_index()
+    write_docs(raw, ["c.txt"], seed=1)
+    ingestor.process_and_index()
+    current = resolve_current(store)[1]
+    chunks = open_chunk_store(current)
+    for chunk_id in live_ids(current):
+        source = chunks.metadata(int(chunk_id))["source"]
+        start, end = chunks.span(int(chunk_id))
+        # Spans of chunks carried over from the previous version are kept too
+        assert (raw / source).read_text()[start:end] == chunks.text(int(chunk_id))
+    chunks.close()
+    with open(os.path.join(current, META_VOCAB_FILE)) as f:
+        assert "char_start" not in json.load(f)["columns"]
+
+
+def search_ids(version_path, vectors, k=1):
+    index, _ = index_factory.read_index(os.path.join(version_path, "index.faiss"), load_index_spec(version_path))
+    return index.search(np.stack(vectors), k)[1][:, 0].tolist()
+
+
+def test_incremental_ingest_embeds_only_changed_files(corpus):
+    raw, store, make = corpus
+    write_docs(raw, ["a.txt", "b.txt", "c.txt"])
+    ingestor = make(type="flat", storage="float32")
+    ingestor.process_and_index()
+    assert ingestor.model.encoded == 60
+    first = open_chunk_store(resolve_current(store)[1])
+    old_b = first.text(20)
+    first.close()
+
+    write_docs(raw, ["b.txt"], seed=1)
+    os.remove(raw / "c.txt")
+    write_docs(raw, ["d.txt"], seed=2)
+    ingestor.process_and_index()
+    # Only the changed and the new file are embedded again
+    assert ingestor.model.encoded == 100
+    current = resolve_current(store)[1]
+    with open(os.path.join(current, "ingest_manifest.json")) as f:
+        files = json.load(f)["files"]
+    assert sorted(files) == ["a.txt", "b.txt", "d.txt"]
+    assert files["a.txt"]["ids"] == [0, 20] and files["b.txt"]["ids"][0] >= 60
+    assert load_index_spec(current)["ntotal"] == 60
+    # The old version of b.txt is gone from the index; its new chunks are found by id
+    chunks = open_chunk_store(current)
+    new_b = files["b.txt"]["ids"][0]
+    assert search_ids(current, [embed(old_b)]) != [20]
+    assert search_ids(current, [embed(chunks.text(new_b))]) == [new_b]
+    chunks.close()
+
+    ingestor.process_and_index()
+    assert ingestor.model.encoded == 100
+    assert resolve_current(store)[1] == current
+
+
+def test_crashed_ingest_resumes_without_re_embedding(corpus):
+    raw, store, make = corpus
+    write_docs(raw, [f"d{i}.txt" for i in range(5)])
+    ingestor = make(type="flat", storage="float32")
+    ingestor.pipeline_config["batch_size"] = 20
+    encode = ingestor.model.encode
+
+    def crash_on_third_batch(texts, **kwargs):
+        if ingestor.model.encoded >= 40:
+            raise KeyboardInterrupt
+        return encode(texts, **kwargs)
+
+    ingestor.model.encode = crash_on_third_batch
+    with pytest.raises(KeyboardInterrupt):
+        ingestor.process_and_index()
+    assert resolve_current(store)[0] is None
+
+    ingestor.model.encode = encode
+    ingestor.process_and_index()
+    # Two files were committed to staging before the crash; only three are embedded now
+    assert ingestor.model.encoded == 100
+    current = resolve_current(store)[1]
+    assert load_index_spec(current)["ntotal"] == 100
+    chunks = open_chunk_store(current)
+    assert search_ids(current, [embed(chunks.text(i)) for i in range(0, 100, 10)]) == list(range(0, 100, 10))
+    chunks.close()
+
+
+def test_duplicate_file_is_stored_once_and_credited_to_both_sources(corpus):
+    raw, store, make = corpus
+    write_docs(raw, ["a.txt", "b.txt"])
+    (raw / "copy.txt").write_text((raw / "a.txt").read_text())
+    ingestor = make(type="flat", storage="float32")
+    ingestor.process_and_index()
+    current = resolve_current(store)[1]
+    with open(os.path.join(current, "ingest_manifest.json")) as f:
+        files = json.load(f)["files"]
+    assert files["copy.txt"]["ids"][0] == files["copy.txt"]["ids"][1]
+    assert files["copy.txt"]["dups"] == list(range(*files["a.txt"]["ids"]))
+    assert load_index_spec(current)["ntotal"] == 40
+    chunks = open_chunk_store(current)
+    start = files["a.txt"]["ids"][0]
+    assert chunks.metadata(start)["sources"] == ["a.txt", "copy.txt"]
+    assert "sources" not in chunks.metadata(files["b.txt"]["ids"][0])
+    chunks.close()
+
+
+def test_removing_the_original_re_reads_its_duplicates(corpus):
+    raw, store, make = corpus
+    write_docs(raw, ["a.txt", "b.txt"])
+    (raw / "copy.txt").write_text((raw / "a.txt").read_text())
+    ingestor = make(type="flat", storage="float32")
+    ingestor.process_and_index()
+
+    os.remove(raw / "a.txt")
+    ingestor.process_and_index()
+    current = resolve_current(store)[1]
+    with open(os.path.join(current, "ingest_manifest.json")) as f:
+        files = json.load(f)["files"]
+    assert sorted(files) == ["b.txt", "copy.txt"]
+    assert "dups" not in files["copy.txt"]
+    assert load_index_spec(current)["ntotal"] == 40
+    chunks = open_chunk_store(current)
+    copy_ids = range(*files["copy.txt"]["ids"])
+    assert len(copy_ids) == 20
+    assert {chunks.metadata(i)["source"] for i in copy_ids} == {"copy.txt"}
+    assert search_ids(current, [embed(chunks.text(i)) for i in copy_ids]) == list(copy_ids)
+    chunks.close()
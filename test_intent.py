@@ -0,0 +1,25 @@
+"""Keyword intent tests (run with pytest from the project root)."""
+from cag.intent import IntentClassifier, classify_intent
+
+
+def test_keywords_match_whole_words_only():
+    classifier = IntentClassifier()
+    # "hi" is inside "history", "mark" inside "marketing"
+    assert classifier.detect_intent("history of the marketing department") == "general_query"
+    assert classifier.detect_intent("hi there") == "greeting"
+
+
+def test_plural_keywords_match():
+    assert classify_intent("what are the hostel fees") == ("fees", 0.5)
+    assert classify_intent("exams schedule")[0] == "exam"
+
+
+def test_detect_intent_agrees_with_classify():
+    classifier = IntentClassifier()
+    for query in ("hostel room rent", "apply before the deadline", "placement salary package", "weather"):
+        assert classifier.detect_intent(query) == classifier.classify(query)[0]
+
+
+def test_confidence_is_the_winning_share():
+    intent, confidence = classify_intent("hostel room and mess fee")
+    assert intent == "hostel" and confidence == 0.75
@@ -0,0 +1,73 @@
+"""MinHash near-duplicate index tests (run with pytest from the project root)."""
+import numpy as np
+import pytest
+
+from rag.near_duplicates import NearDuplicateIndex
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+def text(seed: int, words: int = 200) -> str:
+    return " ".join(np.random.default_rng(seed).choice(WORDS, words))
+
+
+def edited(source: str, every: int) -> str:
+    words = source.split()
+    return " ".join("changed" if i % every == 0 else w for i, w in enumerate(words))
+
+
+def test_near_duplicate_is_found_and_unrelated_text_is_not():
+    index = NearDuplicateIndex()
+    originals = [text(seed) for seed in range(20)]
+    index.add_range(0, index.signatures(originals))
+    assert len(index) == 20
+
+    # One word in 100 changed: ~0.97 shingle Jaccard, well above the 0.85 threshold
+    close = index.signatures([edited(originals[7], 100)])[0]
+    assert index.find(close) == 7
+    # One word in 4 changed leaves barely any shingle in common
+    far = index.signatures([edited(originals[7], 4)])[0]
+    assert index.find(far) is None
+    assert index.find(index.signatures([text(99)])[0]) is None
+
+
+def test_casing_and_whitespace_do_not_matter():
+    index = NearDuplicateIndex()
+    original = text(1)
+    index.add(0, index.signatures([original])[0])
+    assert index.find(index.signatures(["\n  ".join(original.upper().split())])[0]) == 0
+
+
+def test_text_without_words_never_matches():
+    index = NearDuplicateIndex()
+    empty = index.signatures(["", "   "])
+    index.add_range(0, empty)
+    assert len(index) == 0
+    assert index.find(empty[0]) is None
+
+
+def test_stored_signatures_are_matched_without_re_reading_the_text():
+    first = NearDuplicateIndex()
+    originals = [text(seed) for seed in range(5)]
+    stored = first.signatures(originals)
+
+    index = NearDuplicateIndex(stored=stored)
+    index.add_stored(0, 5)
+    index.add(5, index.signatures([text(50)])[0])
+    assert index.find(index.signatures([originals[3]])[0]) == 3
+    assert index.find(index.signatures([text(50)])[0]) == 5
+    with pytest.raises(ValueError):
+        index.add(2, stored[2])
+
+
+def test_first_indexed_chunk_stays_the_representative():
+    index = NearDuplicateIndex()
+    signature = index.signatures([text(3)])[0]
+    index.add(0, signature)
+    index.add(1, signature)
+    assert index.find(signature) == 0
+
+
+def test_bands_must_divide_the_signature():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=64, bands=10)
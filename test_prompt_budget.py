@@ -0,0 +1,64 @@
+"""Prompt budget tests (run with pytest from the project root)."""
+from cag.context import ConversationManager
+from llm.local_llm import LocalLLM
+from llm.prompt_budget import PromptBudget
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_pack_keeps_everything_that_fits():
+    budget = PromptBudget(count_words, context_window=1000, max_new_tokens=100)
+    packed = budget.pack("fixed prompt", ["user: hi", "bot: hello"], ["one two", "three four"])
+    assert packed.history == ["user: hi", "bot: hello"]
+    assert packed.chunks == ["one two", "three four"]
+    assert packed.used == [0, 1]
+    assert packed.doc_text.startswith("[1] one two")
+    assert packed.report["chunks_dropped"] == 0
+
+
+def test_pack_prefers_newest_history_and_best_chunks():
+    budget = PromptBudget(count_words, context_window=60, max_new_tokens=10, history_budget=4)
+    history = ["old line here", "new line here"]
+    chunks = ["best " * 20, "next " * 20, "last " * 20]
+    packed = budget.pack("fixed", history, chunks)
+    assert packed.history == ["new line here"]
+    assert packed.report["history_lines_dropped"] == 1
+    assert packed.used == [0, 1]
+    assert packed.report["chunks_dropped"] == 1
+    assert packed.report["prompt_tokens"] <= budget.input_limit
+
+
+def test_pack_trims_a_chunk_at_a_sentence_end():
+    budget = PromptBudget(count_words, context_window=60, max_new_tokens=10)
+    sentence = "word " * 9 + "end. "
+    packed = budget.pack("fixed", [], [sentence * 10])
+    assert packed.report["chunks_trimmed"] == 1
+    assert packed.chunks[0].endswith("end.")
+    assert count_words(packed.chunks[0]) % 10 == 0
+    assert packed.report["prompt_tokens"] <= budget.input_limit
+
+
+def test_input_budget_caps_the_prompt():
+    budget = PromptBudget(count_words, context_window=10000, max_new_tokens=100, input_budget=50)
+    assert budget.input_limit == 50
+
+
+def test_context_header_counts_against_the_budget(tmp_path):
+    (tmp_path / "config.yaml").write_text(
+        "llm:\n  context_window: 400\n  max_new_tokens: 100\n  temperature: 0.1\n  model_path: ''\n"
+    )
+    llm = LocalLLM(str(tmp_path / "config.yaml"))
+    llm.budget.count_tokens = count_words
+    conversation = ConversationManager()
+    conversation.add_turn("what are the fees", "one lakh")
+    packed = llm.pack_context(
+        "system", "query", conversation.get_history_lines(), ["four words then end. " * 100],
+        context=conversation.get_context_block([]),
+    )
+    prompt = llm._build_prompt(
+        "system", "query", conversation.get_context_block(packed.history), packed.doc_text
+    )
+    assert count_words(prompt) <= llm.budget.input_limit
+    assert packed.report["prompt_tokens"] >= count_words(prompt)
@@ -0,0 +1,89 @@
+"""BM25 index and hybrid fusion tests (run with pytest from the project root)."""
+import numpy as np
+
+from rag.sparse_index import SparseIndex, build_sparse_index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    "The college hostel has 400 rooms and a mess.",
+    "College fees for B.Tech CSE are 1.5 lakh per year.",
+    "The college library opens at 8 am.",
+    "Placement statistics: 92% of the college batch placed.",
+    "",  # a deleted chunk id
+]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the B.Tech fee?") == ["b", "tech", "fee"]
+
+
+def test_search_ranks_chunks_with_the_query_terms(tmp_path):
+    build_sparse_index(CHUNKS, str(tmp_path))
+    index = SparseIndex.open(str(tmp_path))
+    ids, scores = index.search("hostel rooms", 3)
+    assert ids.tolist() == [0]
+    assert scores[0] > 0
+    ids, _ = index.search("library hours", 3, allowed=lambda chunk_ids: chunk_ids != 2)
+    assert len(ids) == 0
+
+
+def test_off_topic_query_with_a_common_term_returns_nothing(tmp_path):
+    build_sparse_index(CHUNKS, str(tmp_path))
+    sparse_ids, sparse_scores = SparseIndex.open(str(tmp_path)).search("college football scores", 3)
+    # Every live chunk mentions "college", so BM25 alone would return three of them
+    assert len(sparse_ids) == 3
+    hits = reciprocal_rank_fusion(
+        np.array([1, 0, 3]), np.array([0.21, 0.18, 0.15]), sparse_ids, sparse_scores,
+        top_k=3, threshold=0.6, min_bm25=1.0, min_bm25_ratio=0.3,
+    )
+    assert hits == []
+
+
+def test_specific_keyword_hit_survives_the_floor(tmp_path):
+    build_sparse_index(CHUNKS, str(tmp_path))
+    sparse_ids, sparse_scores = SparseIndex.open(str(tmp_path)).search("college placement statistics", 3)
+    hits = reciprocal_rank_fusion(
+        np.array([1, 0]), np.array([0.3, 0.2]), sparse_ids, sparse_scores,
+        top_k=3, threshold=0.6, min_bm25=1.0, min_bm25_ratio=0.3,
+    )
+    assert [hit["id"] for hit in hits] == [3]
+
+
+def test_rrf_ranks_hits_found_by_both_retrievers_first():
+    results = reciprocal_rank_fusion(
+        np.array([1, 2, 3]), np.array([0.9, 0.8, 0.7]),
+        np.array([3, 4]), np.array([12.0, 8.0]),
+        top_k=3, threshold=0.5,
+    )
+    assert [r["id"] for r in results] == [3, 1, 2]
+    assert results[0]["bm25"] == 12.0 and results[0]["score"] == 0.7
+
+
+def test_rrf_keeps_keyword_hits_below_the_dense_threshold():
+    results = reciprocal_rank_fusion(
+        np.array([1, 2, -1]), np.array([0.9, 0.2, 0.0]),
+        np.array([5]), np.array([3.0]),
+        top_k=2, threshold=0.5,
+    )
+    ids = [r["id"] for r in results]
+    # 5 is a BM25 top-k hit with no dense score; 2 only has a weak dense score
+    assert ids == [1, 5]
+    assert results[1]["score"] is None
+
+
+def test_rrf_drops_keyword_hits_below_the_bm25_floor():
+    # Off-topic query: dense finds nothing close, BM25 only matched a common term
+    results = reciprocal_rank_fusion(
+        np.array([1, 2]), np.array([0.3, 0.2]),
+        np.array([1, 7, 8]), np.array([0.4, 0.35, 0.3]),
+        top_k=3, threshold=0.5, min_bm25=1.0,
+    )
+    assert results == []
+
+
+def test_rrf_drops_keyword_hits_far_below_the_best_one():
+    results = reciprocal_rank_fusion(
+        np.array([], dtype=np.int64), np.array([], dtype=np.float32),
+        np.array([4, 5, 6]), np.array([9.0, 5.0, 2.0]),
+        top_k=3, threshold=0.5, min_bm25=1.0, min_bm25_ratio=0.3,
+    )
+    assert [r["id"] for r in results] == [4, 5]
@@ -0,0 +1,88 @@
+"""Versioned vector store tests (run with pytest from the project root)."""
+import itertools
+import os
+import time
+
+import pytest
+
+from rag.versions import COMPLETE_FILE, VERSIONS_DIR, new_version, prune_versions, publish_version, read_manifest, resolve_current
+
+
+@pytest.fixture(autouse=True)
+def one_build_per_second(monkeypatch):
+    # Version names sort by their timestamp; builds in a test run within the same second
+    seconds = itertools.count(1)
+    monkeypatch.setattr(time, "strftime", lambda fmt: f"20250101T{next(seconds):06d}")
+
+
+def build(store, chunks=1):
+    version, path = new_version(store)
+    with open(os.path.join(path, "index.faiss"), "w") as f:
+        f.write("index")
+    publish_version(store, version, {"chunks": chunks})
+    return version
+
+
+def versions(store):
+    return sorted(os.listdir(os.path.join(store, VERSIONS_DIR)))
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    for name in os.listdir(path):
+        os.utime(os.path.join(path, name), (then, then))
+    os.utime(path, (then, then))
+
+
+def test_publish_switches_current(tmp_path):
+    store = str(tmp_path)
+    first = build(store)
+    assert resolve_current(store) == (first, os.path.join(store, VERSIONS_DIR, first))
+    second = build(store, chunks=5)
+    assert resolve_current(store)[0] == second
+    assert read_manifest(store)["chunks"] == 5
+    assert os.path.exists(os.path.join(store, VERSIONS_DIR, second, COMPLETE_FILE))
+
+
+def test_legacy_flat_store_is_read_in_place(tmp_path):
+    store = str(tmp_path)
+    assert resolve_current(store) == (None, store)
+    (tmp_path / "index.faiss").write_text("index")
+    version, path = resolve_current(store)
+    assert version is not None and path == store
+
+
+def test_prune_keeps_the_newest_complete_builds(tmp_path):
+    store = str(tmp_path)
+    built = [build(store) for _ in range(4)]
+    prune_versions(store, keep=2)
+    assert versions(store) == built[-2:]
+
+
+def test_prune_never_removes_the_live_build(tmp_path):
+    store = str(tmp_path)
+    live = build(store)
+    newer = [build(store) for _ in range(2)]
+    # Roll back to the first build
+    publish_version(store, live, {"chunks": 1})
+    prune_versions(store, keep=2)
+    assert versions(store) == [live, newer[-1]]
+
+
+def test_prune_leaves_a_build_still_being_written(tmp_path):
+    store = str(tmp_path)
+    built = [build(store) for _ in range(2)]
+    # A concurrent ingest has allocated its directory but not written index.faiss yet
+    writing, _ = new_version(store)
+    prune_versions(store, keep=1)
+    assert versions(store) == sorted([built[-1], writing])
+
+
+def test_prune_removes_stale_incomplete_builds(tmp_path):
+    store = str(tmp_path)
+    crashed, path = new_version(store)
+    (tmp_path / VERSIONS_DIR / crashed / "index.faiss").write_text("partial")
+    age(path, 2 * 24 * 3600)
+    live = build(store)
+    prune_versions(store, keep=2)
+    assert versions(store) == [live]
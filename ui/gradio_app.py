@@ -15,7 +15,9 @@ def chat_function(message, history):
     # For now, we let the backend manage internal ephemeral context 
     # or just rely on the immediate previous turns if we passed them.
     
-    result = bot.process_query(message)
+    # Yielding the growing answer lets Gradio render it as the LLM produces it
+    for result in bot.stream_query(message):
+        yield result["response"]
     response_text = result["response"]
     
     # Append sources if available and not already in text
@@ -25,7 +27,7 @@ def chat_function(message, history):
             source_name = doc['metadata'].get('source', 'Unknown')
             response_text += f"- {source_name} (Score: {doc['score']:.2f})\n"
             
-    return response_text
+    yield response_text
 
 def ui_setup():
     theme = gr.themes.Soft(primary_hue="blue", neutral_hue="slate")
@@ -57,9 +59,9 @@ def ui_setup():
                     try:
                         ingestor = Ingestor()
                         ingestor.process_and_index()
-                        # Reload retriever
-                        bot.retriever._load_index()
-                        return "Ingestion Complete & Index Reloaded!"
+                        # Swap in the new version; chats in flight finish on the old one
+                        bot.retriever.reload()
+                        return f"Ingestion Complete & Index Reloaded! (version {bot.retriever.index_version})"
                     except Exception as e:
                         return f"Error: {e}"
 